@@ -12,16 +12,21 @@ This file contains the main GUI for the Sapphire application, including login an
 import sys
 import os
 import json
+import multiprocessing
 from pathlib import Path
+# Imported before PyQt6 so the startup report (SAPPHIRE_STARTUP_REPORT=1) times it too
+from sapphire_startup import startup_profiler, lazy_import
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QLineEdit, QPushButton, QListWidget, QMessageBox, QSizePolicy,
     QStackedWidget, QFormLayout, QInputDialog, QListWidgetItem, QDialog,
     QDialogButtonBox, QTextEdit, QComboBox, QScrollArea, QFrame
 )
-from PyQt6.QtWebEngineWidgets import QWebEngineView
 from PyQt6.QtGui import QFont, QIcon, QPixmap, QPainter, QPainterPath, QClipboard
-from PyQt6.QtCore import Qt, QSize, QTimer, QPropertyAnimation, QEasingCurve
+from PyQt6.QtCore import (
+    Qt, QSize, QTimer, QPropertyAnimation, QEasingCurve,
+    QObject, QRunnable, QThreadPool, pyqtSignal
+)
 
 def get_base_path():
     if hasattr(sys, '_MEIPASS'):
@@ -42,16 +47,53 @@ except ImportError as e:
     print(f"Базовый путь: {BASE_PATH}")
     print(f"Путь к source: {source_path}")
     sys.exit(1)
+from sapphire_chart import ChartPage
+
+# Only needed once the main window exists, i.e. after login
+QtWebEngineWidgets = lazy_import("PyQt6.QtWebEngineWidgets")
+sapphire_live = lazy_import("sapphire_live")
 
 ASSETS_PATH = BASE_PATH / "assets"
 APP_ICON_PATH = str(ASSETS_PATH / "icons" / "shg.png")
+CHART_PAGE_PATH = ASSETS_PATH / "chart" / "chart.html"
+
+class WorkerSignals(QObject):
+    """Signals a NetworkWorker uses to report back to the GUI thread."""
+    finished = pyqtSignal(object)
+    error = pyqtSignal(str)
+
+class NetworkWorker(QRunnable):
+    """Runs a blocking call (usually a network request) on a QThreadPool."""
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.cancelled = False
+
+    def cancel(self):
+        """Drop the result: nothing is emitted once the call returns."""
+        self.cancelled = True
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.error.emit(str(e))
+            return
+        if not self.cancelled:
+            self.signals.finished.emit(result)
 
 class LoginWindow(QWidget):
     """Window for login or initial setup."""
-    def __init__(self, hood: SapphireHood, main_window):
+    def __init__(self, hood: SapphireHood, create_main_window):
         super().__init__()
         self.hood = hood
-        self.main_window = main_window
+        # The main window (and QtWebEngine) is only built after a successful login
+        self.create_main_window = create_main_window
+        self.main_window = None
         self.is_first_launch = self.hood.is_first_launch()
         self.initUI()
 
@@ -156,6 +198,7 @@ class LoginWindow(QWidget):
 
         success, message = self.hood.initialize(password)
         if success:
+            self.main_window = self.create_main_window()
             self.main_window.post_login_setup()
             self.main_window.show()
             self.close()
@@ -186,6 +229,13 @@ class MainWindow(QWidget):
     def __init__(self, hood: SapphireHood):
         super().__init__()
         self.hood = hood
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(4)
+        self.workers = set()
+        self.chart_worker = None
+        self.chart_symbol = "BTCUSDT"
+        self.chart_interval = "1h"
+        self.live_feed = None
         self.initUI()
 
     def initUI(self):
@@ -238,8 +288,10 @@ class MainWindow(QWidget):
         chart_container.setStyleSheet("background-color: None; border-radius: 10px; margin: 10px;")
         chart_layout = QVBoxLayout(chart_container)
         
-        self.chart_view = QWebEngineView()
+        self.chart_view = QtWebEngineWidgets.QWebEngineView()
         self.chart_view.setFixedHeight(400)
+        self.chart_page = ChartPage(self.chart_view, CHART_PAGE_PATH, self)
+        self.chart_throttle = sapphire_live.ChartUpdateThrottle(self.chart_page, self)
         
         chart_layout.addWidget(self.chart_view)
         
@@ -436,95 +488,108 @@ class MainWindow(QWidget):
         """Called after successful login"""
         self.load_chart_data()
 
+    def run_in_background(self, fn, *args, on_result=None, on_error=None, **kwargs):
+        """
+        Run a blocking call off the GUI thread.
+        `on_result` / `on_error` are called on the GUI thread, unless the
+        returned worker is cancelled first.
+        """
+        worker = NetworkWorker(fn, *args, **kwargs)
+        # Signals are queued to the GUI thread, so re-check cancellation on arrival
+        if on_result is not None:
+            worker.signals.finished.connect(lambda result: None if worker.cancelled else on_result(result))
+        if on_error is not None:
+            worker.signals.error.connect(lambda message: None if worker.cancelled else on_error(message))
+        worker.signals.finished.connect(lambda _: self.workers.discard(worker))
+        worker.signals.error.connect(lambda _: self.workers.discard(worker))
+        self.workers.add(worker)
+        self.thread_pool.start(worker)
+        return worker
+
+    def cancel_background_work(self):
+        """Cancel every pending or running worker and the live feed."""
+        self.stop_live_chart()
+        for worker in self.workers:
+            worker.cancel()
+        self.workers.clear()
+        self.thread_pool.clear()
+        self.chart_worker = None
+
+    def set_chart_symbol(self, symbol: str, interval: str = None):
+        """Switch the chart to another symbol; an older load in flight is dropped."""
+        self.chart_symbol = symbol
+        if interval is not None:
+            self.chart_interval = interval
+        self.load_chart_data()
+
     def load_chart_data(self):
+        """Show a placeholder and fetch candles on the thread pool."""
+        self.stop_live_chart()
+        if self.chart_worker is not None:
+            self.chart_worker.cancel()
+            self.workers.discard(self.chart_worker)
+        self.chart_page.set_symbol(self.chart_symbol)
+        self.chart_page.show_message(f"Loading {self.chart_symbol}…")
+
         # Получаем данные через hood
-        candle_data = self.hood.get_binance_klines()
-        
-        chart_html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <script src="https://unpkg.com/lightweight-charts@4.2.1/dist/lightweight-charts.standalone.production.js"></script>
-    </head>
-    <body style="margin:0; background-color:#131722;">
-        <div id="chart" style="width:100%; height:100vh;"></div>
-        <script>
-            const chartOptions = {{
-                layout: {{
-                    background: {{ color: '#000000' }},
-                    textColor: '#d1d4dc',
-                }},
-                grid: {{
-                    vertLines: {{ color: 'rgba(43, 43, 67, 0.7)', style: 1 }},
-                    horzLines: {{ color: 'rgba(43, 43, 67, 0.7)', style: 1 }},
-                }},
-                crosshair: {{
-                    mode: LightweightCharts.CrosshairMode.Normal,
-                    vertLine: {{
-                        color: '#555',
-                        width: 1,
-                        style: 1,
-                        labelBackgroundColor: '#131722',
-                    }},
-                    horzLine: {{
-                        color: '#555',
-                        width: 1,
-                        style: 1,
-                        labelBackgroundColor: '#131722',
-                    }},
-                }},
-                timeScale: {{
-                    borderColor: '#2B2B43',
-                    timeVisible: true,
-                    secondsVisible: false,
-                    rightOffset: 12,
-                    barSpacing: 6,
-                }},
-                rightPriceScale: {{
-                    borderColor: '#2B2B43',
-                    scaleMargins: {{
-                        top: 0.1,
-                        bottom: 0.1,
-                    }},
-                }},
-            }};
-            
-            const chart = LightweightCharts.createChart(document.getElementById('chart'), chartOptions);
-            const candlestickSeries = chart.addCandlestickSeries({{
-                upColor: '#26a69a',
-                downColor: '#ef5350',
-                borderVisible: false,
-                wickUpColor: '#26a69a',
-                wickDownColor: '#ef5350',
-                priceFormat: {{ type: 'price', precision: 2, minMove: 0.01 }},
-            }});
-            
-            const data = {json.dumps(candle_data)};
-            candlestickSeries.setData(data);
-            
-            // Автомасштабирование и адаптивность
-            chart.timeScale().fitContent();
-            
-            window.addEventListener('resize', () => {{
-                chart.applyOptions({{
-                    width: window.innerWidth,
-                    height: window.innerHeight
-                }});
-            }});
-        </script>
-    </body>
-    </html>
-    """
-        
-        self.chart_view.setHtml(chart_html)
+        self.chart_worker = self.run_in_background(
+            self.hood.get_binance_klines,
+            self.chart_symbol,
+            self.chart_interval,
+            on_result=self.render_chart,
+            on_error=self.show_chart_error,
+        )
+
+    def show_chart_error(self, message: str):
+        self.chart_worker = None
+        self.chart_page.show_message("Chart data unavailable")
+
+    def start_live_chart(self):
+        """
+        Stream candle updates into the loaded chart page.
+        SAPPHIRE_KLINE_FEED may point to a JSONL recording of Binance kline
+        events to replay instead of the live websocket.
+        """
+        self.stop_live_chart()
+        replay_path = os.environ.get("SAPPHIRE_KLINE_FEED")
+        if replay_path:
+            self.live_feed = sapphire_live.ReplayKlineFeed.from_jsonl(replay_path, parent=self)
+        else:
+            self.live_feed = sapphire_live.BinanceKlineStream(self.chart_symbol, self.chart_interval, parent=self)
+        self.live_feed.candle.connect(self.chart_throttle.push)
+        self.live_feed.start()
+
+    def stop_live_chart(self):
+        if self.live_feed is not None:
+            self.live_feed.stop()
+            self.live_feed.deleteLater()
+            self.live_feed = None
+        self.chart_throttle.clear()
+
+    def closeEvent(self, event):
+        self.cancel_background_work()
+        super().closeEvent(event)
+
+    def render_chart(self, candle_data):
+        self.chart_worker = None
+        self.chart_page.set_data(candle_data)
+        self.start_live_chart()
+
+def report_startup():
+    startup_profiler.mark("login window on screen")
+    startup_profiler.stop()
+    startup_profiler.report()
 
 def main():
+    multiprocessing.freeze_support()  # bulk wallet generation uses worker processes
+    # QtWebEngine is imported after QApplication is created, which requires shared GL contexts
+    QApplication.setAttribute(Qt.ApplicationAttribute.AA_ShareOpenGLContexts)
     app = QApplication(sys.argv)
+    startup_profiler.mark("QApplication created")
     hood = SapphireHood()
-    main_window = MainWindow(hood)
-    login_window = LoginWindow(hood, main_window)
+    login_window = LoginWindow(hood, lambda: MainWindow(hood))
     login_window.show()
+    QTimer.singleShot(0, report_startup)
     sys.exit(app.exec())
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+Session agent for the headless CLI (sapphire_cli), in the spirit of
+ssh-agent: `sapphire_cli.py unlock` runs the password KDF once and hands
+the unwrapped data key to a small background process listening on a
+Unix socket in the data dir. Later commands fetch the key from it in a
+millisecond instead of spending a third of a second on PBKDF2/scrypt.
+
+The key is passed on the agent's stdin, never in argv or the
+environment. The socket is only accessible to its owner, peers with
+another uid are refused where the platform reports them, and the agent
+exits when its lifetime runs out or on `lock`. A changed password record
+(see sapphire_kdf.record_fingerprint) makes the cached key stale, so the
+CLI asks for the password again after a password change.
+
+Protocol: one JSON request line, one JSON response line per connection.
+    {"op": "key", "fingerprint": ...} -> {"data_key": ..., "expires_in": seconds}
+    {"op": "status"}                  -> {"expires_in": seconds, "pid": ...}
+    {"op": "lock"}                    -> {"locked": true}
+"""
+
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SOCKET_NAME = "agent.sock"
+DEFAULT_LIFETIME = 15 * 60
+CONNECT_TIMEOUT = 2.0
+AGENT_AVAILABLE = hasattr(socket, "AF_UNIX") and os.name != 'nt'
+
+
+def _peer_uid(conn):
+    """Uid of the connected process, or None where SO_PEERCRED is missing."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    credentials = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", credentials)[1]
+
+
+def _read_line(conn) -> bytes:
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def request(socket_path, message: dict):
+    """Send one request to the agent. Returns the response, or None if no agent answers."""
+    if not AGENT_AVAILABLE:
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(CONNECT_TIMEOUT)
+            conn.connect(str(socket_path))
+            conn.sendall(json.dumps(message).encode('utf-8') + b"\n")
+            return json.loads(_read_line(conn))
+    except (OSError, ValueError):
+        return None
+
+
+def fetch_key(socket_path, fingerprint: str):
+    """The cached data key if the agent holds one for this password record, else None."""
+    response = request(socket_path, {"op": "key", "fingerprint": fingerprint})
+    if not response or "data_key" not in response:
+        return None
+    return response["data_key"].encode('utf-8')
+
+
+def start(socket_path, data_key: bytes, fingerprint: str, lifetime: int = DEFAULT_LIFETIME) -> int:
+    """
+    Start a detached agent holding `data_key` (replacing a running one).
+    Returns its pid once the socket is listening.
+    """
+    if not AGENT_AVAILABLE:
+        raise OSError("The session agent needs Unix domain sockets")
+    request(socket_path, {"op": "lock"})
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), str(socket_path), str(lifetime)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        start_new_session=True, close_fds=True,
+    )
+    secret = {"data_key": data_key.decode('utf-8'), "fingerprint": fingerprint}
+    process.stdin.write(json.dumps(secret).encode('utf-8') + b"\n")
+    process.stdin.close()
+    ready = process.stdout.readline()
+    process.stdout.close()
+    if ready.strip() != b"ready":
+        process.wait()
+        raise OSError("The session agent did not start")
+    return process.pid
+
+
+def serve(socket_path, data_key: str, fingerprint: str, lifetime: int):
+    """Answer requests on `socket_path` until the lifetime ends or a lock request arrives."""
+    socket_path = Path(socket_path)
+    expires_at = time.monotonic() + lifetime
+    socket_path.unlink(missing_ok=True)
+    old_umask = os.umask(0o177)
+    try:
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(socket_path))
+    finally:
+        os.umask(old_umask)
+    inode = socket_path.stat().st_ino
+    server.listen(16)
+    print("ready", flush=True)
+    sys.stdout.close()
+
+    try:
+        while True:
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                return
+            server.settimeout(remaining)
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                return
+            with conn:
+                conn.settimeout(CONNECT_TIMEOUT)
+                try:
+                    peer_uid = _peer_uid(conn)
+                    if peer_uid is not None and peer_uid != os.getuid():
+                        continue
+                    message = json.loads(_read_line(conn))
+                except (OSError, ValueError):
+                    continue
+                expires_in = max(0, int(expires_at - time.monotonic()))
+                op = message.get("op")
+                if op == "key":
+                    if message.get("fingerprint") == fingerprint:
+                        response = {"data_key": data_key, "expires_in": expires_in}
+                    else:
+                        response = {"error": "stale"}
+                elif op == "status":
+                    response = {"expires_in": expires_in, "pid": os.getpid()}
+                elif op == "lock":
+                    response = {"locked": True}
+                else:
+                    response = {"error": f"unknown op: {op}"}
+                try:
+                    conn.sendall(json.dumps(response).encode('utf-8') + b"\n")
+                except OSError:
+                    pass
+                if op == "lock":
+                    return
+    finally:
+        server.close()
+        try:
+            # A newer agent may already listen on the same path
+            if socket_path.stat().st_ino == inode:
+                socket_path.unlink()
+        except OSError:
+            pass
+
+
+def main():
+    socket_path, lifetime = sys.argv[1], int(sys.argv[2])
+    secret = json.loads(sys.stdin.readline())
+    sys.stdin.close()
+    serve(socket_path, secret["data_key"], secret["fingerprint"], lifetime)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Balance cache for SapphireHood.
+Serves the last known balance of an address at once and refreshes stale
+entries in the background (stale-while-revalidate). Entries are kept per
+currency with their own TTL and persisted to an encrypted file, so a
+restart shows last-known balances without waiting on the public APIs.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Seconds before a cached balance is considered stale
+DEFAULT_TTLS = {
+    "btc": 120,
+    "eth": 60,
+    "tron": 60,
+}
+FALLBACK_TTL = 60
+
+
+class BalanceCache:
+    """
+    TTL cache of address balances keyed by (currency, address).
+    `get` never blocks on the network for an address it has seen before.
+    """
+    def __init__(self, path, ttls: dict = None, max_workers: int = 4):
+        self.path = Path(path)
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_workers = max_workers
+        self.fernet = None
+        self._entries = {}  # (currency, address) -> (balance, fetched_at)
+        self._pending = set()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def ttl_for(self, currency: str) -> float:
+        return self.ttls.get(currency, FALLBACK_TTL)
+
+    def peek(self, currency: str, address: str):
+        """Return (balance, age_seconds) without fetching, or None if unknown."""
+        with self._lock:
+            entry = self._entries.get((currency, address))
+        if entry is None:
+            return None
+        balance, fetched_at = entry
+        return balance, time.time() - fetched_at
+
+    def get(self, currency: str, address: str, fetch):
+        """
+        Return the balance of `address`.
+        Unknown addresses are fetched synchronously with `fetch(address)`.
+        Stale entries are returned as-is while a background refresh runs.
+        """
+        key = (currency, address)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            balance = fetch(address)
+            self.put(currency, address, balance)
+            return balance
+
+        balance, fetched_at = entry
+        if time.time() - fetched_at > self.ttl_for(currency):
+            self._revalidate(key, fetch)
+        return balance
+
+    def put(self, currency: str, address: str, balance):
+        """Store a fresh balance. Failed lookups (None) keep the old value."""
+        if balance is None:
+            return
+        with self._lock:
+            self._entries[(currency, address)] = (balance, time.time())
+            self._dirty = True
+
+    def _revalidate(self, key, fetch):
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="balance-revalidate"
+                )
+        self._executor.submit(self._revalidate_worker, key, fetch)
+
+    def _revalidate_worker(self, key, fetch):
+        currency, address = key
+        try:
+            self.put(currency, address, fetch(address))
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+                idle = not self._pending
+        if idle:
+            self.flush()
+
+    def load(self, fernet):
+        """Attach the session key and read persisted entries, if any."""
+        self.fernet = fernet
+        if fernet is None or not self.path.exists():
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                data = json.loads(fernet.decrypt(f.read()).decode())
+        except Exception:
+            # Unreadable cache is not an error: it will be rebuilt on demand
+            return
+        with self._lock:
+            for currency, address, balance, fetched_at in data.get("entries", []):
+                key = (currency, address)
+                current = self._entries.get(key)
+                if current is None or current[1] < fetched_at:
+                    self._entries[key] = (balance, fetched_at)
+
+    def rekey(self, fernet):
+        """Re-encrypt the persisted cache with a new key."""
+        with self._lock:
+            self.fernet = fernet
+            self._dirty = True
+        self.flush()
+
+    def flush(self):
+        """Write the cache to disk if it changed and a session key is attached."""
+        if self.fernet is None:
+            return False
+        with self._lock:
+            if not self._dirty:
+                return False
+            entries = [
+                [currency, address, balance, fetched_at]
+                for (currency, address), (balance, fetched_at) in self._entries.items()
+            ]
+            self._dirty = False
+        payload = json.dumps({"version": 1, "entries": entries}).encode()
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(self.fernet.encrypt(payload))
+            if os.name != 'nt':
+                os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.path)
+            return True
+        except Exception:
+            with self._lock:
+                self._dirty = True
+            return False
+
+    def close(self):
+        """Wait for background refreshes and persist the cache."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.flush()
+
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry. Thread-safe."""
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_create(self, key, create):
+        """Cached value of `key`, computed with create() on a miss (outside the lock)."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = create()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
@@ -0,0 +1,154 @@
+"""
+Local candle store for SapphireHood.
+Keeps Binance klines per symbol/interval on disk in a compact columnar
+format (one packed array per field), so a chart load only has to fetch
+the candles opened since the last stored one.
+"""
+
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+MAGIC = b"SPCK"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")  # magic, version, row count
+PRICE_FIELDS = ("open", "high", "low", "close")
+
+
+class CandleSeries:
+    """
+    Candles of one symbol/interval stored column-wise.
+    `times` holds open times in milliseconds, sorted ascending.
+    """
+    def __init__(self):
+        self.times = array('q')
+        self.open = array('d')
+        self.high = array('d')
+        self.low = array('d')
+        self.close = array('d')
+
+    def __len__(self):
+        return len(self.times)
+
+    def columns(self):
+        return (self.times, self.open, self.high, self.low, self.close)
+
+    @property
+    def last_open_time(self):
+        return self.times[-1] if self.times else None
+
+    def merge(self, klines):
+        """
+        Merge raw Binance kline rows into the series.
+        Rows overlapping stored candles replace them, so the last (still
+        open) candle is always updated. Rows that do not touch the stored
+        range start a new series, to avoid leaving a gap in the chart.
+        """
+        if not klines:
+            return
+        first_time = int(klines[0][0])
+        if self.times and first_time > self.times[-1]:
+            # Only contiguous when the new rows start right at the stored end
+            self.truncate(0)
+        else:
+            self.truncate(bisect_left(self.times, first_time))
+        for k in klines:
+            self.times.append(int(k[0]))
+            self.open.append(float(k[1]))
+            self.high.append(float(k[2]))
+            self.low.append(float(k[3]))
+            self.close.append(float(k[4]))
+
+    def truncate(self, index: int):
+        """Drop every candle from `index` on."""
+        for column in self.columns():
+            del column[index:]
+
+    def trim(self, max_rows: int):
+        """Keep only the newest `max_rows` candles."""
+        excess = len(self.times) - max_rows
+        if excess > 0:
+            for column in self.columns():
+                del column[:excess]
+
+    def tail(self, limit: int) -> list[dict]:
+        """The newest `limit` candles in the format used by the chart."""
+        start = max(0, len(self.times) - limit)
+        return [
+            {
+                "time": self.times[i] // 1000,  # в секундах
+                "open": self.open[i],
+                "high": self.high[i],
+                "low": self.low[i],
+                "close": self.close[i]
+            }
+            for i in range(start, len(self.times))
+        ]
+
+    def to_bytes(self) -> bytes:
+        chunks = [HEADER.pack(MAGIC, VERSION, len(self.times))]
+        for column in self.columns():
+            if sys.byteorder != "little":
+                column = array(column.typecode, column)
+                column.byteswap()
+            chunks.append(column.tobytes())
+        return b"".join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CandleSeries":
+        magic, version, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Unsupported candle file format")
+        series = cls()
+        offset = HEADER.size
+        for column in series.columns():
+            size = count * column.itemsize
+            column.frombytes(data[offset:offset + size])
+            if sys.byteorder != "little":
+                column.byteswap()
+            offset += size
+        if len(series.close) != count:
+            raise ValueError("Truncated candle file")
+        return series
+
+
+class CandleStore:
+    """
+    One columnar file per symbol/interval under `root_dir`.
+    Keeps at most `max_rows` candles per series.
+    """
+    def __init__(self, root_dir, max_rows: int = 5000):
+        self.root_dir = Path(root_dir)
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+
+    def path_for(self, symbol: str, interval: str) -> Path:
+        # "1M" (month) and "1m" (minute) must not collide on case-insensitive filesystems
+        safe_interval = interval.replace("M", "mo")
+        safe_symbol = re.sub(r'[^\w\-]', '_', symbol.upper())
+        return self.root_dir / f"{safe_symbol}_{safe_interval}.candles"
+
+    def load(self, symbol: str, interval: str) -> CandleSeries:
+        """Read a stored series; a missing or damaged file gives an empty one."""
+        path = self.path_for(symbol, interval)
+        try:
+            with open(path, 'rb') as f:
+                return CandleSeries.from_bytes(f.read())
+        except (OSError, ValueError, struct.error):
+            return CandleSeries()
+
+    def save(self, symbol: str, interval: str, series: CandleSeries):
+        """Atomically replace the stored series."""
+        series.trim(self.max_rows)
+        path = self.path_for(symbol, interval)
+        tmp_path = path.with_suffix(".tmp")
+        with self._lock:
+            self.root_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(series.to_bytes())
+            os.replace(tmp_path, path)
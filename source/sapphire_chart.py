@@ -0,0 +1,75 @@
+"""
+Persistent chart page for Sapphire.
+The page in assets/chart is loaded once per QWebEngineView, with the
+lightweight-charts library bundled next to it. Later data changes go
+through the page's small JS API instead of rebuilding the document.
+"""
+
+import json
+from pathlib import Path
+
+from PyQt6.QtCore import QObject, QUrl
+
+
+def default_chart_page_path() -> Path:
+    return Path(__file__).resolve().parent.parent / "assets" / "chart" / "chart.html"
+
+
+class ChartPage(QObject):
+    """
+    Drives the chart page loaded into a QWebEngineView.
+    Calls made before the page has finished loading are queued; only the
+    latest call of each function but update is kept, and a queued setData
+    or setSymbol also drops the updates queued before it. If the page
+    fails to load, the queue is cleared and calls are dropped until a
+    load succeeds.
+    """
+    # Calls that replace every candle shown, making earlier candle calls moot
+    RESETTING_CALLS = ("setData", "setSymbol")
+    CANDLE_CALLS = ("setData", "update")
+
+    def __init__(self, view, page_path=None, parent=None):
+        super().__init__(parent)
+        self.view = view
+        self.ready = False
+        self.failed = False
+        # (function, script) in call order
+        self.queue = []
+        view.loadFinished.connect(self._on_load_finished)
+        view.setUrl(QUrl.fromLocalFile(str(page_path or default_chart_page_path())))
+
+    def _on_load_finished(self, ok: bool):
+        self.ready = ok
+        self.failed = not ok
+        if ok:
+            for _, script in self.queue:
+                self.view.page().runJavaScript(script)
+        self.queue.clear()
+
+    def call(self, function: str, *args):
+        """Call `sapphireChart.<function>(*args)` in the page."""
+        script = f"sapphireChart.{function}({', '.join(json.dumps(arg) for arg in args)});"
+        if self.ready:
+            self.view.page().runJavaScript(script)
+        elif not self.failed:
+            superseded = self.CANDLE_CALLS if function in self.RESETTING_CALLS else ()
+            if function != "update":
+                self.queue = [queued for queued in self.queue
+                              if queued[0] != function and queued[0] not in superseded]
+            self.queue.append((function, script))
+
+    def set_data(self, candles: list[dict]):
+        """Replace all candles and hide the message overlay."""
+        self.call("setData", candles)
+
+    def update(self, candles):
+        """Update the last candle or append new ones (a dict or a list of dicts)."""
+        self.call("update", candles)
+
+    def set_symbol(self, symbol: str):
+        """Show a new symbol label and clear the candles of the previous one."""
+        self.call("setSymbol", symbol)
+
+    def show_message(self, text: str):
+        """Cover the chart with a text message, e.g. while loading."""
+        self.call("showMessage", text)
@@ -0,0 +1,323 @@
+"""
+Headless command line interface to SapphireHood, for scripts and servers.
+Never imports Qt; results go to stdout as JSON (one object) or JSONL (one
+object per wallet/address), diagnostics and errors to stderr.
+
+    python sapphire_cli.py unlock [--lifetime SECONDS]
+    python sapphire_cli.py list [--currency eth]
+    python sapphire_cli.py create eth "Deposit" [--count 100]
+    python sapphire_cli.py balance [ADDRESS ...] [--currency btc]
+    python sapphire_cli.py export [--file-id ID ...] [--output wallets.jsonl]
+    python sapphire_cli.py qr ADDRESS [--amount 0.1] --output code.png
+    python sapphire_cli.py lock
+
+Fast start: the wallet backend and the chain/QR libraries behind it are
+only imported by the commands that use them, and `unlock` leaves the data
+key with the session agent (sapphire_agent), so the following commands
+skip the password KDF. Without an agent the password comes from
+--password-stdin, $SAPPHIRE_PASSWORD or a terminal prompt.
+
+Exit codes: 0 success, 1 error, 2 locked or wrong password.
+"""
+
+import argparse
+import contextlib
+import getpass
+import json
+import os
+import sys
+from pathlib import Path
+
+import sapphire_agent
+from sapphire_startup import lazy_import
+
+sapphire_hood = lazy_import("sapphire_hood")
+sapphire_kdf = lazy_import("sapphire_kdf")
+sapphire_validate = lazy_import("sapphire_validate")
+
+PASSWORD_ENV = "SAPPHIRE_PASSWORD"
+CURRENCIES = ("eth", "btc", "tron")
+SECRET_FIELDS = ("private_key", "mnemonic", "public_key")
+EXIT_ERROR = 1
+EXIT_LOCKED = 2
+
+
+class CliError(Exception):
+    def __init__(self, message: str, exit_code: int = EXIT_ERROR):
+        super().__init__(message)
+        self.exit_code = exit_code
+
+
+def data_dir() -> Path:
+    return Path.home() / ".sapphire.data"
+
+
+def agent_socket() -> Path:
+    return data_dir() / sapphire_agent.SOCKET_NAME
+
+
+def write_json(out, obj):
+    out.write(json.dumps(obj, ensure_ascii=False) + "\n")
+
+
+def read_password(args, prompt: bool = True):
+    """Password from stdin, the environment or a terminal prompt, in that order."""
+    if args.password_stdin:
+        return sys.stdin.readline().rstrip("\r\n")
+    password = os.environ.get(args.password_env)
+    if password is None and prompt and sys.stdin.isatty():
+        password = getpass.getpass("Sapphire password: ")
+    return password
+
+
+def open_hood(args):
+    """An unlocked SapphireHood: the agent's key if it has one, the password otherwise."""
+    hood = sapphire_hood.SapphireHood()
+    if hood.is_first_launch():
+        raise CliError("No vault yet: create one with the Sapphire app first")
+    fingerprint = sapphire_kdf.record_fingerprint(hood.password_hash_file)
+    data_key = None if args.no_agent else sapphire_agent.fetch_key(agent_socket(), fingerprint)
+    if data_key is not None:
+        success, message = hood.unlock_with_key(data_key)
+    else:
+        password = read_password(args)
+        if not password:
+            raise CliError(f"Locked: run `unlock`, set {args.password_env} or use --password-stdin", EXIT_LOCKED)
+        success, message = hood.initialize(password)
+    if not success:
+        raise CliError(message, EXIT_LOCKED)
+    return hood
+
+
+def guess_currency(address: str):
+    """The only currency whose validator accepts `address`, or None."""
+    matches = [currency for currency in CURRENCIES if sapphire_validate.validate_address(address, currency)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def cmd_unlock(args, out):
+    hood = sapphire_hood.SapphireHood()
+    if hood.is_first_launch():
+        raise CliError("No vault yet: create one with the Sapphire app first")
+    password = read_password(args)
+    if not password:
+        raise CliError(f"No password: set {args.password_env} or use --password-stdin", EXIT_LOCKED)
+    success, message = hood.authenticate_user(password)
+    if not success:
+        raise CliError(message, EXIT_LOCKED)
+    if not sapphire_agent.AGENT_AVAILABLE:
+        write_json(out, {"unlocked": True, "agent": None})
+        return 0
+    fingerprint = sapphire_kdf.record_fingerprint(hood.password_hash_file)
+    pid = sapphire_agent.start(agent_socket(), hood.data_key, fingerprint, args.lifetime)
+    write_json(out, {"unlocked": True, "agent": pid, "expires_in": args.lifetime})
+    return 0
+
+
+def cmd_lock(args, out):
+    response = sapphire_agent.request(agent_socket(), {"op": "lock"})
+    write_json(out, {"locked": True, "agent_stopped": bool(response and response.get("locked"))})
+    return 0
+
+
+def cmd_status(args, out):
+    write_json(out, {
+        "initialized": data_dir().exists(),
+        "agent": sapphire_agent.request(agent_socket(), {"op": "status"}),
+    })
+    return 0
+
+
+def cmd_list(args, out):
+    hood = open_hood(args)
+    for wallet in hood.check_wallets():
+        if args.currency and wallet.get("currency", "eth") != args.currency:
+            continue
+        write_json(out, wallet)
+    return 0
+
+
+def cmd_create(args, out):
+    hood = open_hood(args)
+    if args.count > 1:
+        success, message, stats = hood.create_wallets_bulk(args.currency, args.count, args.name)
+        if not success:
+            raise CliError(message)
+        write_json(out, dict(stats or {}, message=message))
+        return 0
+    create = {
+        "eth": hood.create_new_wallet_eth,
+        "btc": hood.create_new_wallet_btc,
+        "tron": hood.create_new_wallet_tron,
+    }[args.currency]
+    success, message, wallet = create(args.name)
+    if not success:
+        raise CliError(message)
+    result = {"name": args.name, "currency": args.currency, "address": wallet["address"]}
+    if args.show_secrets:
+        result["private_key"] = wallet["private_key"]
+    write_json(out, result)
+    return 0
+
+
+def cmd_balance(args, out):
+    if args.addresses:
+        pairs = []
+        for address in args.addresses:
+            currency = args.currency or guess_currency(address)
+            if currency is None:
+                raise CliError(f"Cannot tell the currency of {address}: use --currency")
+            pairs.append((address, currency))
+        # Explicit addresses are public data: no need to unlock the vault
+        hood = sapphire_hood.SapphireHood()
+    else:
+        hood = open_hood(args)
+        pairs = [
+            (wallet["address"], wallet.get("currency", "eth"))
+            for wallet in hood.check_wallets()
+            if wallet.get("address") and (not args.currency or wallet.get("currency", "eth") == args.currency)
+        ]
+    balances = hood.refresh_balances(pairs, max_workers=args.workers)
+    failed = 0
+    for address, currency in pairs:
+        balance = balances.get((currency, address))
+        failed += balance is None
+        write_json(out, {"address": address, "currency": currency, "balance": balance})
+    return EXIT_ERROR if failed else 0
+
+
+def cmd_export(args, out):
+    hood = open_hood(args)
+    if args.file_id:
+        records = ((file_id, hood.open_wallet(file_id), None) for file_id in args.file_id)
+    else:
+        records = hood.scan_wallets()
+    target = out
+    if args.output and args.output != "-":
+        # Private keys: owner-only from the first byte
+        target = os.fdopen(os.open(args.output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8')
+    errors = 0
+    try:
+        for file_id, wallet_data, error in records:
+            if error is not None:
+                errors += 1
+                print(json.dumps({"file_id": file_id, "error": error}), file=sys.stderr)
+                continue
+            if args.currency and wallet_data.get("currency", "eth") != args.currency:
+                continue
+            if args.redact:
+                wallet_data = {key: value for key, value in wallet_data.items() if key not in SECRET_FIELDS}
+            write_json(target, dict(wallet_data, file_id=file_id))
+    finally:
+        if target is not out:
+            target.close()
+    return EXIT_ERROR if errors else 0
+
+
+def cmd_qr(args, out):
+    if args.all:
+        hood = open_hood(args)
+        items = [
+            (wallet["address"], wallet.get("currency", "eth"), args.amount, wallet.get("name"))
+            for wallet in hood.check_wallets()
+            if wallet.get("address") and (not args.currency or wallet.get("currency", "eth") == args.currency)
+        ]
+    else:
+        if not args.addresses:
+            raise CliError("Give one or more addresses, or --all")
+        hood = sapphire_hood.SapphireHood()
+        items = []
+        for address in args.addresses:
+            currency = args.currency or guess_currency(address)
+            if currency is None:
+                raise CliError(f"Cannot tell the currency of {address}: use --currency")
+            items.append((address, currency, args.amount))
+
+    if len(items) == 1 and not args.all and Path(args.output).suffix.lower() != ".pdf":
+        address, currency, amount = items[0]
+        png = hood.generate_payment_qrcode(wallet=address, currency=currency, amount=amount, logo_path=args.logo)
+        with open(args.output, 'wb') as f:
+            f.write(png.getvalue())
+        write_json(out, {"address": address, "currency": currency, "paths": [args.output]})
+        return 0
+
+    success, message, paths = hood.render_qr_sheets(
+        items, args.output, logo_path=args.logo, columns=args.columns, rows=args.rows, max_workers=args.workers
+    )
+    if not success:
+        raise CliError(message)
+    write_json(out, {"codes": len(items), "paths": [str(path) for path in paths]})
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="sapphire_cli.py", description="Sapphire wallet, headless")
+    parser.add_argument("--password-stdin", action="store_true", help="read the password from the first line of stdin")
+    parser.add_argument("--password-env", default=PASSWORD_ENV, help=f"environment variable with the password (default {PASSWORD_ENV})")
+    parser.add_argument("--no-agent", action="store_true", help="do not use the session agent's cached key")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    unlock = commands.add_parser("unlock", help="check the password and start the session agent")
+    unlock.add_argument("--lifetime", type=int, default=sapphire_agent.DEFAULT_LIFETIME, help="seconds the agent keeps the key")
+    unlock.set_defaults(func=cmd_unlock)
+
+    commands.add_parser("lock", help="stop the session agent").set_defaults(func=cmd_lock)
+    commands.add_parser("status", help="vault and agent state").set_defaults(func=cmd_status)
+
+    list_ = commands.add_parser("list", help="wallet metadata, JSONL (no secrets are decrypted)")
+    list_.add_argument("--currency", choices=CURRENCIES)
+    list_.set_defaults(func=cmd_list)
+
+    create = commands.add_parser("create", help="create a wallet, or --count wallets named NAME0001...")
+    create.add_argument("currency", choices=CURRENCIES)
+    create.add_argument("name")
+    create.add_argument("--count", type=int, default=1)
+    create.add_argument("--show-secrets", action="store_true", help="include the private key in the output")
+    create.set_defaults(func=cmd_create)
+
+    balance = commands.add_parser("balance", help="balances of the given addresses or of every wallet, JSONL")
+    balance.add_argument("addresses", nargs="*")
+    balance.add_argument("--currency", choices=CURRENCIES)
+    balance.add_argument("--workers", type=int, default=8, help="requests in flight")
+    balance.set_defaults(func=cmd_balance)
+
+    export = commands.add_parser("export", help="decrypted wallets, JSONL (contains private keys)")
+    export.add_argument("--file-id", action="append", help="only this wallet (repeatable), as listed by `list`")
+    export.add_argument("--currency", choices=CURRENCIES)
+    export.add_argument("--output", help="file to write (created owner-only) instead of stdout")
+    export.add_argument("--redact", action="store_true", help="leave out private keys and mnemonics")
+    export.set_defaults(func=cmd_export)
+
+    qr = commands.add_parser("qr", help="payment QR code (PNG), or sheets (PDF/PNG) for several addresses")
+    qr.add_argument("addresses", nargs="*")
+    qr.add_argument("--all", action="store_true", help="every wallet in the vault")
+    qr.add_argument("--currency", choices=CURRENCIES)
+    qr.add_argument("--amount", type=float)
+    qr.add_argument("--output", required=True)
+    qr.add_argument("--logo", help="image placed in the middle of each code")
+    qr.add_argument("--columns", type=int, default=3)
+    qr.add_argument("--rows", type=int, default=4)
+    qr.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count)")
+    qr.set_defaults(func=cmd_qr)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    out = sys.stdout
+    try:
+        # Backend diagnostics are printed; keep them out of the JSON stream
+        with contextlib.redirect_stdout(sys.stderr):
+            code = args.func(args, out)
+    except CliError as e:
+        write_json(sys.stderr, {"error": str(e)})
+        return e.exit_code
+    except (PermissionError, FileNotFoundError, ImportError, OSError) as e:
+        write_json(sys.stderr, {"error": str(e)})
+        return EXIT_ERROR
+    out.flush()
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,47 @@
+"""
+Расшифровщик backup файлов Sapphire.
+
+Без аргументов работает интерактивно. Режим проверки без диалогов:
+    SAPPHIRE_PASSWORD=... python sapphire_de.py --verify > report.jsonl
+    python sapphire_de.py --verify --password-stdin < password.txt
+Ключ выводится один раз, затем все backup файлы (*.backup и объекты
+снапшотов) расшифровываются и проверяются параллельно; по каждому файлу
+в stdout пишется строка JSON. Приватные ключи скрыты, если не указан
+--show-secrets.
+"""
+
+import argparse
+import hashlib
 import json
 import os
 import sys
 import getpass
-import hashlib
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-import base64
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+import sapphire_kdf
+import sapphire_keygen
+from sapphire_snapshot import SnapshotStore, VAULT_PREFIX
+
+PASSWORD_ENV = "SAPPHIRE_PASSWORD"
+SECRET_FIELDS = ("private_key", "mnemonic")
+REDACTED = "[redacted]"
 
 class BackupDecryptor:
     """Класс для расшифровки backup файлов"""
     
     def __init__(self):
         self.user_home = Path.home()
-        self.app_data_dir = self.user_home / ".sapphire0.1.0"
+        self.app_data_dir = self.user_home / ".sapphire.data"
         self.password_hash_file = self.app_data_dir / ".password_hash"
-        self.backups_dir = self.app_data_dir / "ethereum_keys" / "backups"
+        self.retired_keys_file = self.app_data_dir / ".retired_keys"
+        self.backups_dir = self.app_data_dir / "ethereum" / "backups"
+        self.snapshots_dir = self.app_data_dir / "snapshots"
         self.encryption_key = None
+        self.data_key = None
+        self.keys = []
     
     def authenticate_and_get_key(self):
         """Аутентификация и получение ключа расшифровки"""
@@ -30,8 +54,7 @@ class BackupDecryptor:
         for attempt in range(3):
             password = getpass.getpass(f"Пароль (попытка {attempt + 1}/3): ")
             
-            if self.verify_password(password):
-                self.encryption_key = self.derive_key(password)
+            if self.unlock(password):
                 print("✅ Пароль верный!")
                 return True
             else:
@@ -39,46 +62,80 @@ class BackupDecryptor:
         
         return False
     
-    def verify_password(self, password):
-        """Проверка пароля"""
+    def unlock(self, password):
+        """Проверка пароля и получение ключа за один прогон KDF"""
         try:
-            with open(self.password_hash_file, 'r') as f:
-                hash_data = json.load(f)
-            
-            salt = base64.b64decode(hash_data["salt"])
-            stored_hash = base64.b64decode(hash_data["hash"])
-            iterations = hash_data.get("iterations", 100000)
-            
-            password_hash = hashlib.pbkdf2_hmac('sha256',
-                                              password.encode('utf-8'),
-                                              salt,
-                                              iterations)
-            
-            return password_hash == stored_hash
-            
+            record = sapphire_kdf.load_record(self.password_hash_file)
         except Exception as e:
-            print(f"❌ Ошибка проверки пароля: {e}")
+            print(f"❌ Ошибка чтения файла пароля: {e}", file=sys.stderr)
             return False
-    
+        data_key = sapphire_kdf.unlock(password, record)
+        if data_key is None:
+            return False
+        self.data_key = data_key
+        # Старые ключи после смены пароля: снапшоты до смены остаются читаемыми
+        self.keys = [data_key] + sapphire_kdf.load_retired_keys(self.retired_keys_file, data_key)
+        self.encryption_key = MultiFernet([Fernet(key) for key in self.keys])
+        return True
+
+    def verify_password(self, password):
+        """Проверка пароля"""
+        return self.unlock(password)
+
     def derive_key(self, password):
         """Создание ключа шифрования из пароля"""
-        try:
-            with open(self.password_hash_file, 'r') as f:
-                hash_data = json.load(f)
-            salt = base64.b64decode(hash_data["salt"])
-        except:
-            print("❌ Не удалось получить соль")
-            return None
-        
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-        return Fernet(key)
-    
+        return self.encryption_key if self.unlock(password) else None
+
+    def backup_items(self):
+        """
+        Все backup объекты для проверки: старые *.backup файлы и уникальные
+        объекты всех снапшотов (одинаковые объекты проверяются один раз).
+        Снапшот с нечитаемым манифестом попадает в список как ошибка.
+        """
+        items = []
+        if self.backups_dir.exists():
+            items.extend(("file", str(path), str(path)) for path in sorted(self.backups_dir.glob("*.backup")))
+        store = SnapshotStore(self.snapshots_dir, self.app_data_dir)
+        seen = set()
+        for snapshot_id in store.snapshot_ids():
+            try:
+                files = store.load(snapshot_id, self.encryption_key)["files"]
+            except (InvalidToken, OSError, ValueError) as e:
+                # Манифест не читается (чужой ключ, повреждение): снапшот в отчёт как ошибка
+                reason = "manifest cannot be decrypted with this password" if isinstance(e, InvalidToken) else str(e)
+                items.append(("unreadable", f"snapshot:{snapshot_id}", reason))
+                continue
+            for path, entry in files.items():
+                # В снапшоте проверяются только записи кошельков
+                if not (path.startswith(VAULT_PREFIX) or path.endswith(".json")):
+                    continue
+                if path.endswith("config.json") or entry["hash"] in seen:
+                    continue
+                seen.add(entry["hash"])
+                items.append((
+                    "object", f"snapshot:{snapshot_id}/{path}",
+                    str(store.packs_dir / entry["pack"]), entry["offset"], entry["length"], entry["hash"]
+                ))
+        return items
+
+    def verify_all(self, out=sys.stdout, max_workers=None, show_secrets=False):
+        """
+        Параллельная проверка всех backup объектов; отчёт JSONL в `out`.
+        Возвращает (ok, failed).
+        """
+        items = self.backup_items()
+        ok = failed = 0
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(self.keys, show_secrets)) as executor:
+            for result in executor.map(_verify_item, items, chunksize=64):
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                if result["status"] == "ok":
+                    ok += 1
+                else:
+                    failed += 1
+        out.flush()
+        return ok, failed
+
     def decrypt_backup_file(self, backup_file_path):
         """Расшифровка backup файла"""
         if not self.encryption_key:
@@ -166,6 +223,112 @@ class BackupDecryptor:
         
         print("="*60)
 
+_worker_fernet = None
+_worker_show_secrets = False
+
+
+def _init_worker(keys, show_secrets):
+    global _worker_fernet, _worker_show_secrets
+    _worker_fernet = MultiFernet([Fernet(key) for key in keys])
+    _worker_show_secrets = show_secrets
+
+
+def key_matches_address(wallet_data):
+    """Проверяет, что приватный ключ даёт адрес кошелька (None — нечего проверять)"""
+    private_key = wallet_data.get("private_key")
+    address = wallet_data.get("address")
+    if not private_key or not address:
+        return None
+    key = bytes.fromhex(private_key[2:] if private_key.startswith("0x") else private_key)
+    currency = wallet_data.get("currency", "eth")
+    if currency == "btc":
+        return address in (
+            sapphire_keygen.btc_address(sapphire_keygen.public_key(key)),
+            sapphire_keygen.btc_address(sapphire_keygen.public_key(key, compressed=True)),
+        )
+    if currency == "tron":
+        return sapphire_keygen.tron_address(sapphire_keygen.public_key(key)) == address
+    return sapphire_keygen.eth_address(sapphire_keygen.public_key(key)).lower() == address.lower()
+
+
+def _verify_item(item):
+    """Расшифровка и проверка одного объекта в рабочем процессе"""
+    kind, label = item[0], item[1]
+    result = {"file": label, "status": "ok"}
+    try:
+        if kind == "unreadable":
+            raise ValueError(item[2])
+        if kind == "file":
+            with open(item[2], 'rb') as f:
+                encrypted = f.read()
+        else:
+            pack_path, offset, length, digest = item[2:]
+            with open(pack_path, 'rb') as f:
+                f.seek(offset)
+                encrypted = zlib.decompress(f.read(length))
+            if hashlib.sha256(encrypted).hexdigest() != digest:
+                raise ValueError("snapshot object hash mismatch")
+        wallet_data = json.loads(_worker_fernet.decrypt(encrypted).decode())
+        result.update(
+            name=wallet_data.get("name"),
+            address=wallet_data.get("address"),
+            currency=wallet_data.get("currency", "eth"),
+            type=wallet_data.get("type"),
+        )
+        for field in SECRET_FIELDS:
+            if field in wallet_data:
+                result[field] = wallet_data[field] if _worker_show_secrets else REDACTED
+        matches = key_matches_address(wallet_data)
+        if matches is False:
+            result["status"] = "key_mismatch"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e) or type(e).__name__
+    return result
+
+
+def read_password(args):
+    """Пароль из stdin или переменной окружения, без диалога"""
+    if args.password_stdin:
+        return sys.stdin.readline().rstrip("\r\n")
+    password = os.environ.get(args.password_env)
+    if password is None and not sys.stdin.isatty():
+        return sys.stdin.readline().rstrip("\r\n")
+    return password
+
+
+def verify_main(args):
+    """Неинтерактивная проверка; код выхода 0 — всё в порядке, 1 — есть ошибки, 2 — нет доступа"""
+    decryptor = BackupDecryptor()
+    if args.data_dir:
+        decryptor.app_data_dir = Path(args.data_dir).expanduser()
+        decryptor.password_hash_file = decryptor.app_data_dir / ".password_hash"
+        decryptor.retired_keys_file = decryptor.app_data_dir / ".retired_keys"
+        decryptor.backups_dir = decryptor.app_data_dir / "ethereum" / "backups"
+        decryptor.snapshots_dir = decryptor.app_data_dir / "snapshots"
+    password = read_password(args)
+    if not password:
+        print(f"❌ Пароль не задан: используйте {args.password_env} или --password-stdin", file=sys.stderr)
+        return 2
+    if not decryptor.unlock(password):
+        print("❌ Неверный пароль", file=sys.stderr)
+        return 2
+    ok, failed = decryptor.verify_all(max_workers=args.workers, show_secrets=args.show_secrets)
+    print(f"Проверено: {ok + failed}, в порядке: {ok}, с ошибками: {failed}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sapphire backup decryptor")
+    parser.add_argument("--verify", action="store_true", help="decrypt and verify every backup, JSONL report to stdout")
+    parser.add_argument("--password-stdin", action="store_true", help="read the password from the first line of stdin")
+    parser.add_argument("--password-env", default=PASSWORD_ENV, help=f"environment variable with the password (default {PASSWORD_ENV})")
+    parser.add_argument("--data-dir", help="data directory (default ~/.sapphire.data)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--show-secrets", action="store_true", help="include private keys and mnemonics in the report")
+    return parser.parse_args(argv)
+
+
 def main():
     """Основная функция"""
     print("🔓 Расшифровщик Sapphire Backup")
@@ -235,6 +398,9 @@ def main():
         print("❌ Неверный выбор")
 
 if __name__ == "__main__":
+    args = parse_args()
+    if args.verify:
+        sys.exit(verify_main(args))
     try:
         main()
     except KeyboardInterrupt:
@@ -0,0 +1,99 @@
+"""
+Gap-limit address discovery for restored seeds.
+Addresses of a BIP44 account are derived in windows and checked for
+activity (transaction history and balance) concurrently. The two stages
+are pipelined: while one window is being queried, the next one is
+already being derived. Scanning stops after `gap_limit` consecutive
+unused addresses, the BIP44 standard being 20. Queries that fail (rate
+limits, timeouts) are retried with backoff before the window is judged.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_GAP_LIMIT = 20
+DEFAULT_RETRIES = 3
+RETRY_DELAY = 1.0
+
+
+class AddressDiscovery:
+    """
+    Finds the used addresses of one account of a mnemonic.
+    `hood` provides the session keychains (hd_wallet) and the activity
+    queries (get_address_activity).
+    """
+    def __init__(self, hood, gap_limit: int = DEFAULT_GAP_LIMIT, window: int = None, max_workers: int = 8,
+                 retries: int = DEFAULT_RETRIES):
+        self.hood = hood
+        self.gap_limit = gap_limit
+        self.window = window or gap_limit
+        self.max_workers = max_workers
+        self.retries = retries
+
+    def _query_window(self, query_pool, currency: str, keypairs: list, cancel_event) -> list:
+        """Activity of each keypair (None where it failed every attempt), retrying failures."""
+        query = lambda keypair: self.hood.get_address_activity(currency, keypair["address"])
+        activities = list(query_pool.map(query, keypairs))
+        wait = (cancel_event or threading.Event()).wait
+        for attempt in range(self.retries):
+            missing = [offset for offset, activity in enumerate(activities) if activity is None]
+            if not missing or wait(RETRY_DELAY * 2 ** attempt):
+                break
+            for offset, activity in zip(missing, query_pool.map(query, [keypairs[offset] for offset in missing])):
+                activities[offset] = activity
+        return activities
+
+    def discover(self, mnemonic: str, currency: str, passphrase: str = "", account: int = 0,
+                 progress=None, cancel_event=None) -> dict:
+        """
+        Scan until the gap limit is reached. Returns
+            {"used": [keypair + {"index", "tx_count", "balance"}],
+             "checked": number of addresses looked at,
+             "failed": indexes whose activity query failed every retry,
+             "complete": False if cancelled or any query failed}
+        A failed query neither counts towards the gap nor resets it, so it
+        cannot shorten the scan, and partial rate limiting cannot keep it
+        going forever.
+        `progress(checked, used)` is called after every window.
+        """
+        keychain = self.hood.hd_wallet(mnemonic, passphrase)
+        used, failed = [], []
+        checked = gap = 0
+        complete = True
+        derive_pool = ThreadPoolExecutor(max_workers=1)
+        query_pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            start = 0
+            pending = derive_pool.submit(keychain.derive_range, currency, start, self.window, account)
+            while gap < self.gap_limit:
+                if cancel_event is not None and cancel_event.is_set():
+                    complete = False
+                    break
+                keypairs = pending.result()
+                # Derive the next window while this one is on the network
+                pending = derive_pool.submit(keychain.derive_range, currency, start + self.window, self.window, account)
+                activities = self._query_window(query_pool, currency, keypairs, cancel_event)
+                for offset, (keypair, activity) in enumerate(zip(keypairs, activities)):
+                    index = start + offset
+                    checked += 1
+                    if activity is None:
+                        failed.append(index)
+                        complete = False
+                    elif activity["tx_count"] or activity["balance"]:
+                        used.append(dict(keypair, index=index, **activity))
+                        gap = 0
+                    else:
+                        gap += 1
+                        if gap >= self.gap_limit:
+                            break
+                if all(activity is None for activity in activities):
+                    # Nothing could be checked; scanning on would never reach the gap
+                    complete = False
+                    break
+                if progress:
+                    progress(checked, len(used))
+                start += self.window
+        finally:
+            derive_pool.shutdown(wait=False, cancel_futures=True)
+            query_pool.shutdown(wait=False, cancel_futures=True)
+        return {"used": used, "checked": checked, "failed": failed, "complete": complete}
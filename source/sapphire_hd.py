@@ -0,0 +1,235 @@
+"""
+BIP39 mnemonics and BIP32/BIP44 key derivation for SapphireHood.
+Addresses follow the usual BIP44 paths:
+    ETH   m/44'/60'/0'/0/i
+    BTC   m/44'/0'/0'/0/i     (compressed P2PKH)
+    TRON  m/44'/195'/0'/0/i
+An HDWallet caches every node it walks through, so once the chain node
+m/44'/coin'/account'/change exists, address i costs one HMAC-SHA512 and
+one public key computation instead of a walk from the seed.
+"""
+
+import hashlib
+import hmac
+import os
+import secrets
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import sapphire_keygen
+from sapphire_keygen import SECP256K1_ORDER
+
+WORDLIST_PATH = Path(__file__).resolve().parent.parent / "assets" / "bip39" / "english.txt"
+PBKDF2_ROUNDS = 2048
+HARDENED = 0x80000000
+MNEMONIC_WORD_COUNTS = (12, 15, 18, 21, 24)
+COIN_TYPES = {"btc": 0, "eth": 60, "tron": 195}
+# derive_range switches to worker processes from this many addresses
+PARALLEL_THRESHOLD = 4096
+
+
+@lru_cache(maxsize=1)
+def load_wordlist(path=WORDLIST_PATH) -> tuple:
+    with open(path, 'r', encoding='utf-8') as f:
+        words = tuple(line.strip() for line in f if line.strip())
+    if len(words) != 2048:
+        raise ValueError(f"BIP39 wordlist must have 2048 words, got {len(words)}")
+    return words
+
+
+@lru_cache(maxsize=1)
+def _word_indexes() -> dict:
+    return {word: i for i, word in enumerate(load_wordlist())}
+
+
+def normalize_mnemonic(mnemonic: str) -> str:
+    return " ".join(unicodedata.normalize("NFKD", mnemonic).lower().split())
+
+
+def generate_mnemonic(strength: int = 128) -> str:
+    """New random mnemonic; 128 bits of entropy give 12 words, 256 give 24."""
+    if strength not in (128, 160, 192, 224, 256):
+        raise ValueError(f"Invalid entropy strength: {strength}")
+    entropy = secrets.token_bytes(strength // 8)
+    checksum_bits = strength // 32
+    checksum = hashlib.sha256(entropy).digest()[0] >> (8 - checksum_bits)
+    bits = (int.from_bytes(entropy, "big") << checksum_bits) | checksum
+    word_count = (strength + checksum_bits) // 11
+    words = load_wordlist()
+    return " ".join(words[(bits >> (11 * (word_count - 1 - i))) & 0x7FF] for i in range(word_count))
+
+
+def validate_mnemonic(mnemonic: str) -> bool:
+    """Word count, wordlist membership and checksum."""
+    words = normalize_mnemonic(mnemonic).split()
+    if len(words) not in MNEMONIC_WORD_COUNTS:
+        return False
+    indexes = _word_indexes()
+    bits = 0
+    for word in words:
+        if word not in indexes:
+            return False
+        bits = (bits << 11) | indexes[word]
+    checksum_bits = len(words) // 3
+    entropy = (bits >> checksum_bits).to_bytes(len(words) * 4 // 3, "big")
+    checksum = hashlib.sha256(entropy).digest()[0] >> (8 - checksum_bits)
+    return checksum == bits & ((1 << checksum_bits) - 1)
+
+
+def mnemonic_to_seed(mnemonic: str, passphrase: str = "") -> bytes:
+    """BIP39 seed: PBKDF2-HMAC-SHA512, 2048 rounds, salt "mnemonic" + passphrase."""
+    salt = "mnemonic" + unicodedata.normalize("NFKD", passphrase)
+    return hashlib.pbkdf2_hmac(
+        'sha512', normalize_mnemonic(mnemonic).encode('utf-8'), salt.encode('utf-8'), PBKDF2_ROUNDS
+    )
+
+
+def parse_path(path: str) -> tuple:
+    """"m/44'/60'/0'/0/5" -> child indexes, hardened ones with the top bit set."""
+    parts = path.strip().split("/")
+    if parts[0] != "m":
+        raise ValueError(f"Derivation path must start with 'm': {path}")
+    indexes = []
+    for part in parts[1:]:
+        hardened = part[-1:] in ("'", "h", "H")
+        index = int(part[:-1] if hardened else part)
+        if not 0 <= index < HARDENED:
+            raise ValueError(f"Invalid path component: {part}")
+        indexes.append(index + HARDENED if hardened else index)
+    return tuple(indexes)
+
+
+def chain_path(currency: str, account: int = 0, change: int = 0) -> str:
+    """BIP44 path of the chain whose children are the addresses."""
+    if currency not in COIN_TYPES:
+        raise ValueError(f"Unsupported currency: {currency}")
+    return f"m/44'/{COIN_TYPES[currency]}'/{account}'/{change}"
+
+
+class HDNode:
+    """A BIP32 extended private key."""
+    __slots__ = ("private_key", "chain_code", "_public_key")
+
+    def __init__(self, private_key: bytes, chain_code: bytes):
+        self.private_key = private_key
+        self.chain_code = chain_code
+        self._public_key = None
+
+    @classmethod
+    def from_seed(cls, seed: bytes):
+        digest = hmac.new(b"Bitcoin seed", seed, hashlib.sha512).digest()
+        key = int.from_bytes(digest[:32], "big")
+        if not 0 < key < SECP256K1_ORDER:
+            raise ValueError("Invalid master key, use another seed")
+        return cls(digest[:32], digest[32:])
+
+    @property
+    def public_key(self) -> bytes:
+        """Compressed public key, computed once."""
+        if self._public_key is None:
+            self._public_key = sapphire_keygen.public_key(self.private_key, compressed=True)
+        return self._public_key
+
+    def child(self, index: int):
+        """CKDpriv. Retries with the next index in the (2^-127) invalid case, as BIP32 says."""
+        while True:
+            if index >= HARDENED:
+                data = b"\x00" + self.private_key + index.to_bytes(4, "big")
+            else:
+                data = self.public_key + index.to_bytes(4, "big")
+            digest = hmac.new(self.chain_code, data, hashlib.sha512).digest()
+            tweak = int.from_bytes(digest[:32], "big")
+            key = (tweak + int.from_bytes(self.private_key, "big")) % SECP256K1_ORDER
+            if tweak < SECP256K1_ORDER and key != 0:
+                return HDNode(key.to_bytes(32, "big"), digest[32:])
+            index += 1
+
+
+class HDWallet:
+    """
+    Keychain of one seed. Every node derived on the way to an address is
+    kept, so repeated derivations under the same account only pay for
+    the last step.
+    """
+    def __init__(self, seed: bytes):
+        self._nodes = {(): HDNode.from_seed(seed)}
+        self._chains = {}
+
+    @classmethod
+    def from_mnemonic(cls, mnemonic: str, passphrase: str = ""):
+        return cls(mnemonic_to_seed(mnemonic, passphrase))
+
+    def node(self, path) -> HDNode:
+        """Node at `path` (a string or parsed indexes), starting from the deepest cached ancestor."""
+        indexes = parse_path(path) if isinstance(path, str) else tuple(path)
+        depth = len(indexes)
+        while indexes[:depth] not in self._nodes:
+            depth -= 1
+        node = self._nodes[indexes[:depth]]
+        for i in range(depth, len(indexes)):
+            node = node.child(indexes[i])
+            self._nodes[indexes[:i + 1]] = node
+        return node
+
+    def chain(self, currency: str, account: int = 0, change: int = 0):
+        """(path, node) of an account chain, cached by its BIP44 coordinates."""
+        coordinates = (currency, account, change)
+        chain = self._chains.get(coordinates)
+        if chain is None:
+            path = chain_path(currency, account, change)
+            chain = self._chains[coordinates] = (path, self.node(path))
+        return chain
+
+    def derive(self, currency: str, index: int, account: int = 0, change: int = 0) -> dict:
+        """
+        Key and address #index of an account, in the same format as the
+        single-wallet generators plus its "derivation_path".
+        """
+        path, node = self.chain(currency, account, change)
+        return _derive_address(currency, path, node, index)
+
+    def derive_range(self, currency: str, start: int, count: int, account: int = 0, change: int = 0,
+                     max_workers: int = None) -> list[dict]:
+        """
+        Addresses start..start+count-1 in order. Large ranges are split
+        across worker processes, each starting from the cached chain node.
+        """
+        path, node = self.chain(currency, account, change)
+        if count < PARALLEL_THRESHOLD:
+            return _derive_chunk(currency, path, node.private_key, node.chain_code, start, count)
+        workers = max_workers or os.cpu_count() or 1
+        step = -(-count // workers)
+        keypairs = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_derive_chunk, currency, path, node.private_key, node.chain_code,
+                                chunk_start, min(step, start + count - chunk_start))
+                for chunk_start in range(start, start + count, step)
+            ]
+            for future in futures:
+                keypairs.extend(future.result())
+        return keypairs
+
+
+def _derive_address(currency: str, path: str, node: HDNode, index: int) -> dict:
+    # Address nodes are leaves: derived from the chain node, not cached
+    key = node.child(index).private_key
+    keypair = {"private_key": key.hex(), "derivation_path": f"{path}/{index}"}
+    if currency == "btc":
+        public_key_bytes = sapphire_keygen.public_key(key, compressed=True)
+        keypair["address"] = sapphire_keygen.btc_address(public_key_bytes)
+        keypair["public_key"] = public_key_bytes.hex()
+    elif currency == "eth":
+        keypair["address"] = sapphire_keygen.eth_address(sapphire_keygen.public_key(key))
+    else:
+        keypair["address"] = sapphire_keygen.tron_address(sapphire_keygen.public_key(key))
+    return keypair
+
+
+def _derive_chunk(currency: str, path: str, private_key: bytes, chain_code: bytes,
+                  start: int, count: int) -> list[dict]:
+    """Entry point for worker processes: one slice of an account chain."""
+    node = HDNode(private_key, chain_code)
+    return [_derive_address(currency, path, node, index) for index in range(start, start + count)]
@@ -9,35 +9,49 @@ Handles:
 - QR code generation for payments
 """
 
-import base64
 import hashlib
 import json
 import os
 import re
 import secrets
 import sys
+import time
 import uuid
-import requests
+from concurrent.futures import (
+    ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+)
 from datetime import datetime
 from pathlib import Path
 from io import BytesIO
 from hashlib import sha256
-import base58
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from ecdsa import SigningKey, SECP256k1
-from tronpy import Tron
-from eth_account import Account
-from tronpy.keys import PrivateKey
-try:
-    import qrcode
-    from qrcode.image.styledpil import StyledPilImage
-    from qrcode.image.styles.moduledrawers import VerticalBarsDrawer
-    from PIL import Image
-    QR_AVAILABLE = True
-except ImportError:
-    QR_AVAILABLE = False
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+import sapphire_kdf
+import sapphire_rekey
+from sapphire_net import SessionPool, SingleFlight
+from sapphire_providers import ProviderRouter, build_providers, DEFAULT_PROVIDERS
+from sapphire_cache import BalanceCache
+from sapphire_candles import CandleSeries, CandleStore
+from sapphire_manifest import WalletManifest
+from sapphire_vault import SqliteVault, RECORD_PREFIX
+from sapphire_startup import lazy_import
+from sapphire_discovery import AddressDiscovery, DEFAULT_GAP_LIMIT
+from sapphire_import import WatchOnlyImporter
+from sapphire_snapshot import SnapshotStore
+import sapphire_hd
+import sapphire_keygen
+import sapphire_validate
+import sapphire_qr
+import sapphire_qrsheet
+from sapphire_qr import QR_AVAILABLE
+
+# Chain and QR backends are heavy; they are imported on first use only
+CHAIN_BACKENDS = {
+    "eth": lazy_import("eth_account"),
+    "tron": lazy_import("tronpy.keys"),
+}
+
+# Keys generated per worker task in create_wallets_bulk
+BULK_CHUNK_SIZE = 256
 
 
 
@@ -56,13 +70,46 @@ class SapphireHood:
         self.btc_wallets_dir = self.btc_dir / "btc_wallets"
         self.tron_wallets_dir = self.tron_dir / "tron_wallets"
         self.backups_dir = self.eth_dir / "backups"
+        self.wallet_dirs = {
+            "eth": self.eth_wallets_dir,
+            "btc": self.btc_wallets_dir,
+            "tron": self.tron_wallets_dir,
+        }
         self.config_file = self.app_data_dir / "config.json"
         self.password_hash_file = self.app_data_dir / ".password_hash"
         self.lock_file = self.app_data_dir / ".locked"
+        self.manifest_file = self.app_data_dir / "manifest.bin"
+        self.vault_file = self.app_data_dir / "vault.sqlite"
+        self.snapshots_dir = self.app_data_dir / "snapshots"
+        self.retired_keys_file = self.app_data_dir / ".retired_keys"
+        self.rekey_journal_file = self.app_data_dir / ".rekey_journal"
         
         # Authentication flag
         self.is_authenticated = False
+        self.data_key = None
         self.encryption_key = None
+        self.index_key = None
+        # Data keys replaced by earlier password changes (still accepted for reading)
+        self.retired_keys = []
+        # Optional single-file backend (config.json: "vault_backend": "sqlite")
+        self.vault = None
+
+        # Keep-alive HTTP sessions shared by all network queries
+        self.http = SessionPool()
+        # Balance backends per chain with rate limits, failover and circuit breakers
+        self.providers = ProviderRouter(self.http, self._load_providers())
+        # Identical queries already in flight (GUI, background refresh, CLI/RPC) share one request
+        self.inflight = SingleFlight()
+        # Last-known balances, persisted encrypted once the vault is unlocked
+        self.balance_cache = BalanceCache(self.app_data_dir / "balance_cache.bin")
+        # Market candles already downloaded, per symbol/interval
+        self.candle_store = CandleStore(self.app_data_dir / "candles")
+        # Non-secret wallet metadata, so listing does not decrypt every wallet
+        self.manifest = WalletManifest(self.manifest_file)
+        # Incremental encrypted backups of the whole data dir
+        self.snapshots = SnapshotStore(self.snapshots_dir, self.app_data_dir)
+        # HD keychains opened this session, so seeds and account nodes are derived once
+        self.hd_wallets = {}
         
         # Initialization should be called explicitly from the GUI
 
@@ -80,6 +127,7 @@ class SapphireHood:
             if authenticated:
                 self.is_authenticated = True
                 self.ensure_directories_exist()
+                self._after_unlock()
                 return True, "Authorization successful!"
             else:
                 return False, message
@@ -88,100 +136,421 @@ class SapphireHood:
             # but initialize needs one password, and setup needs two.
             # The GUI should call setup_new_installation directly.
             return False, "First launch. Use setup_new_installation."
-    def get_btc_balance(self, address):
-        url = f"https://mempool.space/api/address/{address}"
+
+    def unlock_with_key(self, data_key: bytes):
+        """
+        Open the vault with a data key that is already unwrapped (e.g. held
+        by the CLI session agent), without running the password KDF.
+        Returns (is_success, message)
+        """
+        if self.is_first_launch():
+            return False, "First launch. Use setup_new_installation."
+        retired_keys = sapphire_kdf.load_retired_keys(self.retired_keys_file, data_key)
         try:
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                balance_sats = data.get("chain_stats", {}).get("funded_txo_sum", 0) - data.get("chain_stats", {}).get("spent_txo_sum", 0)
-                balance_btc = balance_sats / 1e8
-                return balance_btc
-            else:
-                return None
+            candidate = MultiFernet([Fernet(key) for key in [data_key] + retired_keys])
+            self._check_data_key(candidate)
+        except (InvalidToken, ValueError):
+            # Nothing is touched: a wrong key must not rewrite the manifest
+            return False, "Invalid data key"
+        self._set_data_key(data_key, retired_keys)
+        self.is_authenticated = True
+        self.ensure_directories_exist()
+        self._after_unlock()
+        return True, "Authorization successful!"
+
+    def _check_data_key(self, encryption_key):
+        """
+        Decrypt one existing encrypted item (manifest, vault record or
+        wallet file) with `encryption_key`; raises InvalidToken if it is
+        the wrong key. Passes when there is nothing encrypted yet.
+        """
+        if self.load_config().get("vault_backend") == "sqlite" and self.vault_file.exists():
+            vault = SqliteVault(self.vault_file, encryption_key, None)
+            try:
+                sample = next(iter(vault.iter_records(batch_size=1)), (None, None))[1]
+            finally:
+                vault.close()
+        elif self.manifest_file.exists():
+            sample = self.manifest_file.read_bytes()
+        else:
+            wallet_file = next((path for directory in self.wallet_dirs.values() if directory.exists()
+                                for path in directory.glob("*.json")), None)
+            sample = wallet_file.read_bytes() if wallet_file else None
+        if sample is not None:
+            encryption_key.decrypt(sample)
+
+    def _after_unlock(self):
+        """Load the encrypted state that needs the session key."""
+        journal = self._load_rekey_journal() if self.rekey_journal_file.exists() else None
+        self.balance_cache.load(self.encryption_key)
+        if self.load_config().get("vault_backend") == "sqlite":
+            self.vault = SqliteVault(self.vault_file, self.encryption_key, self.index_key)
+        elif not self.manifest.load(self.encryption_key):
+            self.rebuild_manifest()
+        if journal is not None:
+            self._finish_password_change()
+
+    def _set_data_key(self, data_key: bytes, retired_keys: list = None):
+        """Encrypt with `data_key`; decrypt with it or any retired key."""
+        self.data_key = data_key
+        self.retired_keys = list(retired_keys or [])
+        if self.retired_keys:
+            self.encryption_key = MultiFernet([Fernet(key) for key in [data_key] + self.retired_keys])
+        else:
+            self.encryption_key = Fernet(data_key)
+        self.index_key = sapphire_kdf.derive_subkey(data_key, b"vault index")
+
+    def load_config(self) -> dict:
+        """Read config.json; missing or invalid config is empty."""
+        try:
+            with open(self.config_file, 'r') as f:
+                return json.load(f)
         except Exception:
-            return None
-    
+            return {}
+
+    def save_config(self, config: dict):
+        """Atomically replace config.json."""
+        tmp_path = self.config_file.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(config, f, indent=2)
+        os.replace(tmp_path, self.config_file)
+    def get_btc_balance(self, address):
+        """Cached BTC balance; stale values are refreshed in the background."""
+        return self.balance_cache.get("btc", address, self._fetch_btc_balance)
+
     def get_eth_balance(self, address):
-        url = f'https://api.ethplorer.io/getAddressInfo/{address}?apiKey=freekey'
+        """Cached ETH balance; stale values are refreshed in the background."""
+        return self.balance_cache.get("eth", address, self._fetch_eth_balance)
+
+    def get_tron_balance(self, address):
+        """Cached TRX balance; stale values are refreshed in the background."""
+        return self.balance_cache.get("tron", address, self._fetch_tron_balance)
+
+    def _fetch_btc_balance(self, address):
+        return self.inflight.do(("balance", "btc", address), self.providers.balance, "btc", address)
+
+    def _fetch_eth_balance(self, address):
+        return self.inflight.do(("balance", "eth", address), self.providers.balance, "eth", address)
+
+    def get_binance_klines(self, symbol="BTCUSDT", interval="1h", limit=100) -> list[dict]:
+        """
+        Return the newest `limit` candles of `symbol`.
+        Candles are kept in the local candle store; only the ones opened since
+        the last stored candle are downloaded, and the last (still open)
+        candle is replaced. Falls back to stored candles if Binance is down.
+        Concurrent calls for the same symbol and interval share one update,
+        whatever their limits.
+        """
+        key = ("klines", symbol, interval)
+        series, fetched_for = self.inflight.do(key, self._update_klines, symbol, interval, limit)
+        if len(series) < limit and fetched_for < limit:
+            # Joined an update that asked for fewer candles than this call needs
+            series, _ = self.inflight.do(key, self._update_klines, symbol, interval, limit)
+        return series.tail(limit)
+
+    def _update_klines(self, symbol, interval, limit):
+        """Bring the stored series up to date; returns (series, limit it was fetched for)."""
+        series = self.candle_store.load(symbol, interval)
         try:
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get("ETH", {}).get("balance", 0)
+            if len(series) >= limit:
+                klines = self._fetch_binance_klines(symbol, interval, limit=1000, start_time=series.last_open_time)
+                if len(klines) >= 1000:
+                    # Too far behind to catch up cheaply: start over from the latest window
+                    series = CandleSeries()
+                    klines = self._fetch_binance_klines(symbol, interval, limit=limit)
             else:
-                return None
+                klines = self._fetch_binance_klines(symbol, interval, limit=limit)
+            series.merge(klines)
+            self.candle_store.save(symbol, interval, series)
         except Exception:
-            return None
-        
-    def get_binance_klines(self, symbol="BTCUSDT", interval="1h", limit=100) -> list[dict]:
+            if not len(series):
+                raise
+        return series, limit
+
+    def _fetch_binance_klines(self, symbol, interval, limit=100, start_time=None) -> list:
+        """Raw kline rows from Binance, oldest first."""
         url = f"https://api.binance.com/api/v3/klines?symbol={symbol}&interval={interval}&limit={limit}"
-        data = requests.get(url).json()
-        candles = [
-            {
-                "time": k[0] // 1000,  # в секундах
-                "open": float(k[1]),
-                "high": float(k[2]),
-                "low": float(k[3]),
-                "close": float(k[4])
-            }
-            for k in data
-        ]
-        return candles
+        if start_time is not None:
+            url += f"&startTime={start_time}"
+        data = self.http.get(url).json()
+        if isinstance(data, dict):
+            raise ValueError(f"Binance error: {data.get('msg', data)}")
+        return data
     
-    def get_tron_balance(self, address):
-        url = f'https://api.trongrid.io/v1/accounts/{address}'
+    def _fetch_tron_balance(self, address):
+        return self.inflight.do(("balance", "tron", address), self.providers.balance, "tron", address)
+
+    def get_address_activity(self, currency, address):
+        """
+        Transaction count and balance of an address, uncached.
+        Returns {"tx_count", "balance"} or None if the query failed.
+        """
+        if currency not in self.providers.providers:
+            return None
+        return self.inflight.do(("activity", currency, address), self.providers.activity, currency, address)
+
+    def _load_providers(self) -> dict:
         try:
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                if 'data' in data and len(data['data']) > 0:
-                    return data['data'][0].get('balance', 0) / 1e6  # TRX has 6 decimals
-                else:
-                    return 0
+            return build_providers(self.load_config())
+        except (TypeError, ValueError) as e:
+            print(f"Invalid provider config, using the defaults: {e}")
+            return build_providers({"providers": DEFAULT_PROVIDERS})
+
+    def provider_status(self) -> list[dict]:
+        """Health, rate and counters of every balance provider."""
+        return self.providers.stats()
+
+    def coalescing_stats(self) -> dict:
+        """How many network queries were made and how many joined one already in flight."""
+        return self.inflight.stats()
+
+    def refresh_balances(self, wallets, max_workers: int = 8) -> dict:
+        """
+        Fetch balances for many wallets concurrently.
+        `wallets` is an iterable of wallet dicts (as returned by check_wallets)
+        or (address, currency) pairs. Requests run on pooled keep-alive
+        sessions with at most `max_workers` in flight, spread by the provider
+        router over every backend of the chain within its rate limit. The balance cache is
+        bypassed for the queries and updated with the fresh values.
+        Returns {(currency, address): balance}, with None where the query
+        failed; the same address under two currencies gets two entries.
+        """
+        fetchers = {
+            "btc": self._fetch_btc_balance,
+            "eth": self._fetch_eth_balance,
+            "tron": self._fetch_tron_balance,
+        }
+        jobs = {}
+        for wallet in wallets:
+            if isinstance(wallet, dict):
+                address = wallet.get("address")
+                currency = wallet.get("currency", "eth")
             else:
-                return None
-        except Exception:
-            return None
+                address, currency = wallet
+            if address:
+                jobs[(currency, address)] = fetchers.get(currency)
+
+        results = {key: None for key, fetch in jobs.items() if fetch is None}
+        jobs = {key: fetch for key, fetch in jobs.items() if fetch is not None}
+        if not jobs:
+            return results
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as executor:
+            futures = {executor.submit(fetch, key[1]): key for key, fetch in jobs.items()}
+            for future in as_completed(futures):
+                currency, address = key = futures[future]
+                results[key] = future.result()
+                self.balance_cache.put(currency, address, results[key])
+        self.balance_cache.flush()
+        return results
     
     def get_wallet_files(self):
-        """Returns a list of wallet files."""
-        if not self.eth_wallets_dir.exists():
-            return []
-        return list(self.eth_wallets_dir.glob("*.json"))
+        """Returns a list of wallet files of every currency."""
+        wallet_files = []
+        for wallet_dir in self.wallet_dirs.values():
+            if wallet_dir.exists():
+                wallet_files.extend(wallet_dir.glob("*.json"))
+        return wallet_files
 
     def check_wallets(self):
         """
         Check for existing wallets.
-        Returns a list of wallet information.
+        Returns the wallet metadata from the manifest (name, address,
+        currency, type, created_at, file_id); no private key is decrypted.
+        Use open_wallet(file_id) to read a wallet in full.
         """
         if not self.is_authenticated:
             raise PermissionError("Authentication required")
+        if self.vault is not None:
+            return self.vault.entries()
+        if not self.manifest.loaded:
+            self.rebuild_manifest()
+        return self.manifest.entries()
 
-        wallet_files = self.get_wallet_files()
-        wallets_info = []
-        
-        if not wallet_files:
-            return []
-        
-        for wallet_file in wallet_files:
-            try:
-                wallet_info = self.get_wallet_info(wallet_file)
-                if wallet_info:
-                    wallets_info.append(wallet_info)
-            except Exception:
-                wallets_info.append({'name': wallet_file.name, 'address': 'Read error', 'error': True})
-        return wallets_info
+    def existing_addresses(self, currency: str, addresses) -> set:
+        """The given addresses that `currency` wallets already use, by indexed lookup."""
+        if not self.is_authenticated:
+            raise PermissionError("Authentication required")
+        if self.vault is not None:
+            return self.vault.existing_addresses(currency, addresses)
+        if not self.manifest.loaded:
+            self.rebuild_manifest()
+        return self.manifest.existing_addresses(currency, addresses)
+
+    def _file_id(self, wallet_file) -> str:
+        return Path(wallet_file).relative_to(self.app_data_dir).as_posix()
+
+    def open_wallet(self, file_id: str):
+        """Decrypt one wallet by the file_id listed by check_wallets."""
+        if not self.is_authenticated:
+            raise PermissionError("Authentication required")
+        if self.vault is not None and file_id.startswith(RECORD_PREFIX):
+            return self.vault.get(file_id)
+        return self.get_wallet_info(self.app_data_dir / file_id)
+
+    def sign_message(self, file_id: str, message):
+        """
+        Sign a text message with a wallet's key, for proving ownership of
+        an address. Returns (is_success, message, signature).
+        """
+        if not self.is_authenticated:
+            return False, "Authentication required", None
+        try:
+            wallet_data = self.open_wallet(file_id)
+        except Exception as e:
+            return False, f"Error reading wallet: {e}", None
+        if not wallet_data.get("private_key"):
+            return False, "Watch-only wallets cannot sign", None
+        currency = wallet_data.get("currency", "eth")
+        try:
+            signature = sapphire_keygen.sign_message(
+                currency, wallet_data["private_key"], message, wallet_data.get("address")
+            )
+        except Exception as e:
+            return False, f"Error signing message: {e}", None
+        return True, "Message signed", signature
+
+    def scan_wallets(self, wallet_files=None, max_workers: int = None):
+        """
+        Decrypt many wallets in parallel, for operations that really need
+        every secret (export, audit, re-keying).
+        Reads and Fernet decrypts run in a thread pool (cryptography releases
+        the GIL). Yields (file_id, wallet_data, error) in completion order;
+        error is None on success, wallet_data is None on failure.
+        At most a few tasks per worker are in flight, so memory stays
+        bounded whatever the vault size.
+        """
+        if not self.is_authenticated:
+            raise PermissionError("Authentication required")
+        if wallet_files is None and self.vault is not None:
+            items = self.vault.iter_records()
+
+            def read(item):
+                file_id, encrypted_data = item
+                try:
+                    return file_id, json.loads(self.encryption_key.decrypt(encrypted_data).decode()), None
+                except Exception as e:
+                    return file_id, None, f"Error reading wallet {file_id}: {e!r}"
+        else:
+            items = self.get_wallet_files() if wallet_files is None else wallet_files
+
+            def read(wallet_file):
+                try:
+                    return self._file_id(wallet_file), self.get_wallet_info(wallet_file), None
+                except Exception as e:
+                    return self._file_id(wallet_file), None, str(e)
+
+        max_workers = max_workers or os.cpu_count() or 4
+        max_in_flight = max_workers * 4
+        files = iter(items)
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wallet-scan")
+        pending = set()
+        try:
+            while True:
+                for item in files:
+                    pending.add(executor.submit(read, item))
+                    if len(pending) >= max_in_flight:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            # Also reached when the consumer stops iterating early
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def migrate_to_sqlite(self, batch_size: int = 500):
+        """
+        Migration tool: copy every wallet file into the SQLite vault, in
+        transactional batches, then switch config.json to the SQLite backend.
+        Wallet files are left in place (still encrypted); setting
+        "vault_backend" back to "files" returns to them.
+        Returns (is_success, message).
+        """
+        if not self.is_authenticated:
+            return False, "Authentication required"
+        if self.vault is not None:
+            return False, "The vault already uses SQLite"
+
+        vault = SqliteVault(self.vault_file, self.encryption_key, self.index_key)
+        if vault.count():
+            vault.close()
+            return False, f"{self.vault_file} already contains wallets"
+
+        def discard():
+            vault.close()
+            # A half-filled vault would block the next attempt ("already contains wallets")
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                Path(f"{self.vault_file}{suffix}").unlink(missing_ok=True)
+
+        batch, errors, migrated = [], [], 0
+        try:
+            for file_id, wallet_data, error in self.scan_wallets():
+                if error is not None:
+                    errors.append(file_id)
+                    continue
+                batch.append(wallet_data)
+                if len(batch) >= batch_size:
+                    vault.put_many(batch)
+                    migrated += len(batch)
+                    batch = []
+            if batch:
+                vault.put_many(batch)
+                migrated += len(batch)
+            if not errors:
+                config = self.load_config()
+                config["vault_backend"] = "sqlite"
+                self.save_config(config)
+        except Exception as e:
+            discard()
+            return False, f"Migration failed: {e}"
+
+        if errors:
+            discard()
+            return False, f"Migration aborted, unreadable wallet files: {', '.join(errors)}"
+
+        self.vault = vault
+        return True, f"Migrated {migrated} wallets to {self.vault_file}"
+
+    def rebuild_manifest(self, full: bool = False):
+        """
+        Consistency check between the manifest and the wallet files.
+        Files missing from the manifest are decrypted and indexed, entries
+        whose file is gone are dropped. `full=True` re-reads every file.
+        Returns {"added": int, "removed": int, "errors": [file_id, ...]}.
+        """
+        if not self.is_authenticated:
+            raise PermissionError("Authentication required")
+        if full:
+            self.manifest.clear()
+        on_disk = {self._file_id(path): path for path in self.get_wallet_files()}
+        known = self.manifest.file_ids()
+        summary = {"added": 0, "removed": 0, "errors": []}
+
+        for file_id in known - on_disk.keys():
+            self.manifest.remove(file_id)
+            summary["removed"] += 1
+        missing = [on_disk[file_id] for file_id in on_disk.keys() - known]
+        for file_id, wallet_data, error in self.scan_wallets(missing):
+            if error is None:
+                self.manifest.add(file_id, wallet_data)
+                summary["added"] += 1
+            else:
+                summary["errors"].append(file_id)
+
+        self.manifest.save(self.encryption_key)
+        return summary
     #+++
     def  generate_eth_address(self):
-        account = Account.create()
+        account = CHAIN_BACKENDS["eth"].Account.create()
         private_key = account.key.hex()
         address = account.address
         return private_key, address
     #+++
     def generate_tron_address(self):
         # Создаем приватный ключ
-        priv_key = PrivateKey.random()
+        priv_key = CHAIN_BACKENDS["tron"].PrivateKey.random()
         # Получаем адрес
         address = priv_key.public_key.to_base58check_address()
         private_key = priv_key.hex()
@@ -194,23 +563,8 @@ class SapphireHood:
         - Публичный ключ
         - Bitcoin-адрес
         """
-        private_key = os.urandom(32)
-        private_key_hex = private_key.hex()
-
-        sk = SigningKey.from_string(private_key, curve=SECP256k1)
-        verifying_key = sk.get_verifying_key()
-        public_key_bytes = b'\x04' + verifying_key.to_string()  # некомпрессированный формат
-        public_key_hex = public_key_bytes.hex()
-
-        sha256_hash = hashlib.sha256(public_key_bytes).digest()
-        ripemd160_hash = hashlib.new('ripemd160', sha256_hash).digest()
-
-        network_payload = b'\x00' + ripemd160_hash  # префикс для основной сети
-        checksum = hashlib.sha256(hashlib.sha256(network_payload).digest()).digest()[:4]
-        full_payload = network_payload + checksum
-        address = base58.b58encode(full_payload).decode()
-
-        return private_key_hex, public_key_hex, address
+        keypair = sapphire_keygen.generate_keypair("btc")  # некомпрессированный публичный ключ
+        return keypair["private_key"], keypair["public_key"], keypair["address"]
     
     def create_new_wallet_tron(self, wallet_name: str):
         """Create a new Tron wallet"""
@@ -279,6 +633,84 @@ class SapphireHood:
         else:
             return False, "Error saving wallet", None
 
+    def create_wallets_bulk(self, currency: str, count: int, name_prefix: str,
+                            progress=None, cancel_event=None, max_workers: int = None):
+        """
+        Create `count` wallets at once, e.g. to provision deposit addresses.
+        Keys are generated across a process pool, records are encrypted in a
+        thread pool and everything is committed in one batched write.
+        `progress(done, total)` is called as key chunks complete; setting
+        `cancel_event` (a threading.Event) stops the run before anything
+        is written. Returns (is_success, message, stats).
+        """
+        if not self.is_authenticated:
+            return False, "Authentication required", None
+        if currency not in self.wallet_dirs:
+            return False, f"Unsupported currency: {currency}", None
+        if not name_prefix:
+            return False, "Name prefix cannot be empty", None
+        if count <= 0:
+            return False, "Count must be positive", None
+
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+
+        started = time.perf_counter()
+        chunks = [min(BULK_CHUNK_SIZE, count - i) for i in range(0, count, BULK_CHUNK_SIZE)]
+        keypairs = []
+        if len(chunks) == 1:
+            keypairs = sapphire_keygen.generate_batch(currency, count)
+            if progress:
+                progress(count, count)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(sapphire_keygen.generate_batch, currency, n) for n in chunks]
+                for future in as_completed(futures):
+                    if cancelled():
+                        for other in futures:
+                            other.cancel()
+                        return False, "Cancelled", None
+                    keypairs.extend(future.result())
+                    if progress:
+                        progress(len(keypairs), count)
+        if cancelled():
+            return False, "Cancelled", None
+
+        width = len(str(count))
+        created_at = datetime.now().isoformat()
+        wallets = []
+        for index, keypair in enumerate(keypairs, 1):
+            wallet_data = {
+                "name": f"{name_prefix}{index:0{width}d}",
+                "address": keypair["address"],
+                "private_key": keypair["private_key"],
+                "created_at": created_at,
+                "type": "generated",
+            }
+            if "public_key" in keypair:
+                wallet_data["public_key"] = keypair["public_key"]
+            wallet_data["currency"] = currency
+            wallet_data["network"] = "mainnet"
+            wallets.append(wallet_data)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            encrypted = list(executor.map(self._encrypt_wallet, wallets))
+        if cancelled():
+            return False, "Cancelled", None
+        try:
+            self._write_wallets_batch(wallets, encrypted)
+        except Exception as e:
+            return False, f"Error saving wallets: {e}", None
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            "count": len(wallets),
+            "seconds": elapsed,
+            "wallets_per_second": len(wallets) / elapsed if elapsed > 0 else None,
+            "addresses": [wallet_data["address"] for wallet_data in wallets],
+        }
+        return True, f"Created {len(wallets)} {currency} wallets in {elapsed:.2f}s", stats
+
     def import_private_key(self,  wallet_name: str):
         """Import wallet from private key"""
         if not self.is_authenticated:
@@ -304,30 +736,39 @@ class SapphireHood:
         else:
             return False, "Error saving wallet"
 
-    def import_mnemonic(self, mnemonic: str, wallet_name: str):
-        """Import wallet from mnemonic phrase"""
+    def import_mnemonic(self, mnemonic: str, wallet_name: str, currency: str = "eth",
+                        index: int = 0, passphrase: str = ""):
+        """Import wallet from mnemonic phrase (BIP44 address #index)"""
         if not self.is_authenticated:
             return False, "Authentication required"
 
         words = mnemonic.strip().split()
-        if len(words) not in [12, 24]:
-            return False, f"Invalid word count: {len(words)}. Must be 12 or 24"
+        if len(words) not in sapphire_hd.MNEMONIC_WORD_COUNTS:
+            return False, f"Invalid word count: {len(words)}. Must be 12, 15, 18, 21 or 24"
+        if not sapphire_hd.validate_mnemonic(mnemonic):
+            return False, "Invalid mnemonic: unknown word or bad checksum"
         if not wallet_name or len(wallet_name) == 0:
             return False, "Name cannot be empty"
+        if currency not in self.wallet_dirs:
+            return False, f"Unsupported currency: {currency}"
 
-        private_key, address = self.generate_eth_address()
+        keypair = self.hd_wallet(mnemonic, passphrase).derive(currency, index)
         
         wallet_data = {
             "name": wallet_name,
-            "address": address,
-            "private_key": private_key,
-            "mnemonic": mnemonic,
+            "address": keypair["address"],
+            "private_key": keypair["private_key"],
+            "mnemonic": sapphire_hd.normalize_mnemonic(mnemonic),
+            "derivation_path": keypair["derivation_path"],
             "created_at": datetime.now().isoformat(),
             "type": "mnemonic",
+            "currency": currency,
             "network": "mainnet"
         }
+        if "public_key" in keypair:
+            wallet_data["public_key"] = keypair["public_key"]
 
-        if self.save_wallet(wallet_data):
+        if self.save_wallet(self.wallet_dirs[currency], wallet_data):
             return True, f"Wallet '{wallet_name}' restored successfully!"
         else:
             return False, "Error saving wallet"
@@ -344,31 +785,141 @@ class SapphireHood:
         except ValueError:
             return False
         
-    def derive_private_key_from_mnemonic(self, mnemonic):
-        """Simplified private key derivation from mnemonic"""
-        mnemonic_hash = hashlib.sha256(mnemonic.encode()).hexdigest()
-        return mnemonic_hash
+    def hd_wallet(self, mnemonic: str, passphrase: str = ""):
+        """
+        Session-cached BIP32 keychain of a mnemonic: the seed PBKDF2 and
+        the account-level nodes are only computed the first time.
+        """
+        cache_key = hashlib.sha256(
+            f"{sapphire_hd.normalize_mnemonic(mnemonic)}\0{passphrase}".encode('utf-8')
+        ).digest()
+        wallet = self.hd_wallets.get(cache_key)
+        if wallet is None:
+            wallet = self.hd_wallets[cache_key] = sapphire_hd.HDWallet.from_mnemonic(mnemonic, passphrase)
+        return wallet
+
+    def derive_private_key_from_mnemonic(self, mnemonic, currency: str = "eth", index: int = 0,
+                                         passphrase: str = ""):
+        """BIP44 private key (hex) of address #index"""
+        return self.hd_wallet(mnemonic, passphrase).derive(currency, index)["private_key"]
+
+    def derive_addresses(self, mnemonic, currency: str, start: int = 0, count: int = 20,
+                         passphrase: str = "", account: int = 0):
+        """Keys and addresses start..start+count-1 of a mnemonic's account"""
+        return self.hd_wallet(mnemonic, passphrase).derive_range(currency, start, count, account)
+
+    def discover_addresses(self, mnemonic, currency: str, passphrase: str = "", account: int = 0,
+                           gap_limit: int = DEFAULT_GAP_LIMIT, progress=None, cancel_event=None):
+        """Used addresses of a mnemonic's account, scanned up to the gap limit"""
+        return AddressDiscovery(self, gap_limit=gap_limit).discover(
+            mnemonic, currency, passphrase, account, progress=progress, cancel_event=cancel_event
+        )
+
+    def restore_mnemonic(self, mnemonic: str, wallet_name: str, currency: str = "eth",
+                         passphrase: str = "", progress=None, cancel_event=None):
+        """
+        Restore a seed: discover its used addresses and save one wallet per
+        address ("<name> #<index>"). Falls back to address #0 if none is used.
+        Returns (is_success, message).
+        """
+        if not self.is_authenticated:
+            return False, "Authentication required"
+        if not sapphire_hd.validate_mnemonic(mnemonic):
+            return False, "Invalid mnemonic: unknown word or bad checksum"
+        if not wallet_name:
+            return False, "Name cannot be empty"
+        if currency not in self.wallet_dirs:
+            return False, f"Unsupported currency: {currency}"
+
+        result = self.discover_addresses(
+            mnemonic, currency, passphrase, progress=progress, cancel_event=cancel_event
+        )
+        if cancel_event is not None and cancel_event.is_set():
+            return False, "Cancelled"
+        found = result["used"] or [dict(self.hd_wallet(mnemonic, passphrase).derive(currency, 0), index=0)]
+
+        created_at = datetime.now().isoformat()
+        wallets = []
+        for keypair in found:
+            wallet_data = {
+                "name": f"{wallet_name} #{keypair['index']}",
+                "address": keypair["address"],
+                "private_key": keypair["private_key"],
+                "mnemonic": sapphire_hd.normalize_mnemonic(mnemonic),
+                "derivation_path": keypair["derivation_path"],
+                "created_at": created_at,
+                "type": "mnemonic",
+                "currency": currency,
+                "network": "mainnet"
+            }
+            if "public_key" in keypair:
+                wallet_data["public_key"] = keypair["public_key"]
+            wallets.append(wallet_data)
+        try:
+            self._write_wallets_batch(wallets, [self._encrypt_wallet(wallet_data) for wallet_data in wallets])
+        except Exception as e:
+            return False, f"Error saving wallets: {e}"
+
+        message = f"Restored {len(wallets)} {currency} address(es), {result['checked']} checked"
+        if not result["complete"] or result["failed"]:
+            message += " (some addresses could not be checked, try again later)"
+        return True, message
 
     def save_wallet(self, dir, wallet_data):
         """Save a wallet in encrypted form"""
         try:
-            safe_name = re.sub(r'[^\w\-_\.]', '_', wallet_data['name'])
-            filename = f"{safe_name}_{wallet_data['address'][:8]}.json"
-            filepath = dir / filename
-            
-            wallet_json = json.dumps(wallet_data, indent=2)
-            encrypted_wallet = self.encryption_key.encrypt(wallet_json.encode())
+            if self.vault is not None:
+                self.vault.put(wallet_data)
+                return True
+
+            filepath = self._wallet_path(dir, wallet_data)
+            encrypted_wallet = self._encrypt_wallet(wallet_data)
             
             with open(filepath, 'wb') as f:
                 f.write(encrypted_wallet)
             
             if os.name != 'nt':
                 os.chmod(filepath, 0o600)
-            
+
+            self.manifest.add(self._file_id(filepath), wallet_data)
+            self.manifest.save(self.encryption_key)
             return True
         except Exception:
             return False
 
+    def _wallet_path(self, dir, wallet_data) -> Path:
+        safe_name = re.sub(r'[^\w\-_\.]', '_', wallet_data['name'])
+        return dir / f"{safe_name}_{wallet_data['address'][:8]}.json"
+
+    def _encrypt_wallet(self, wallet_data) -> bytes:
+        return self.encryption_key.encrypt(json.dumps(wallet_data, indent=2).encode())
+
+    def _write_wallets_batch(self, wallets, encrypted):
+        """
+        Commit already encrypted wallets in one batch: a single transaction
+        for the SQLite vault, or the files plus a single manifest update.
+        """
+        if self.vault is not None:
+            self.vault.put_many(wallets, encrypted)
+            return
+        taken = set()
+        for wallet_data, encrypted_wallet in zip(wallets, encrypted):
+            currency = wallet_data.get("currency", "eth")
+            filepath = self._wallet_path(self.wallet_dirs[currency], wallet_data)
+            # Names and address prefixes can repeat across a large batch: never overwrite
+            suffix = 1
+            while filepath in taken or filepath.exists():
+                suffix += 1
+                base = self._wallet_path(self.wallet_dirs[currency], wallet_data)
+                filepath = base.with_name(f"{base.stem}_{suffix}{base.suffix}")
+            taken.add(filepath)
+            with open(filepath, 'wb') as f:
+                f.write(encrypted_wallet)
+            if os.name != 'nt':
+                os.chmod(filepath, 0o600)
+            self.manifest.add(self._file_id(filepath), wallet_data)
+        self.manifest.save(self.encryption_key)
+
     def get_wallet_info(self, wallet_file):
         """Get information about a wallet"""
         try:
@@ -383,29 +934,63 @@ class SapphireHood:
             # For a GUI, it's better to log or return an error than to print
             raise IOError(f"Error reading wallet {wallet_file.name}") from e
 
-    def create_wallet_backup(self, wallet_name):
-        """Create a backup of a wallet"""
+    def create_wallet_backup(self, wallet_name=None):
+        """
+        Back up the whole vault (every currency) as an incremental snapshot.
+        `wallet_name` is kept for compatibility: it is included like every other wallet.
+        """
         if not self.is_authenticated:
             return False, "Authentication required"
+        success, message, stats = self.create_snapshot()
+        return success, message
+
+    def create_snapshot(self):
+        """
+        Take an incremental, deduplicated snapshot of the data dir (and of
+        the SQLite vault records). Returns (is_success, message, stats).
+        """
+        if not self.is_authenticated:
+            return False, "Authentication required", None
         try:
-            wallet_files = list(self.eth_wallets_dir.glob(f"{wallet_name}*.json"))
-            if not wallet_files:
-                return False, "Wallet not found"
-            
-            wallet_file = wallet_files[0]
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_name = f"{wallet_name}_{timestamp}.backup"
-            backup_path = self.backups_dir / backup_name
-            
-            with open(wallet_file, 'rb') as src, open(backup_path, 'wb') as dst:
-                dst.write(src.read())
-            
-            if os.name != 'nt':
-                os.chmod(backup_path, 0o600)
-            
-            return True, f"Backup created: {backup_path}"
+            stats = self.snapshots.create(self.encryption_key, self.vault)
+        except Exception as e:
+            return False, f"Error creating snapshot: {e}", None
+        return True, (
+            f"Snapshot {stats['id']}: {stats['files']} items, {stats['new_objects']} new, "
+            f"{stats['bytes_written']} bytes in {stats['seconds'] * 1000:.0f} ms"
+        ), stats
+
+    def list_snapshots(self) -> list[str]:
+        """Snapshot ids, oldest first"""
+        return self.snapshots.snapshot_ids()
+
+    def restore_snapshot(self, snapshot_id: str):
+        """
+        Restore the data dir (and vault records) to a snapshot, in place.
+        Files written since the snapshot are removed; the password record
+        and retired keys stay current, and records of a snapshot taken
+        before a password change are re-encrypted under the current key.
+        Returns (is_success, message).
+        """
+        if not self.is_authenticated:
+            return False, "Authentication required"
+        if snapshot_id not in self.snapshots.snapshot_ids():
+            return False, f"Snapshot {snapshot_id} not found"
+        try:
+            result = self.snapshots.restore(snapshot_id, self.encryption_key)
+            if self.vault is not None:
+                wallets = [json.loads(self.encryption_key.decrypt(data).decode()) for data in result["records"]]
+                self.vault.put_many(wallets, result["records"], replace_all=True)
+            elif not self.manifest.load(self.encryption_key):
+                self.rebuild_manifest()
+            # A snapshot from before a password change holds records under a retired key
+            errors = self._reencrypt_to_current_key()[1] if self.retired_keys else []
         except Exception as e:
-            return False, f"Error creating backup: {e}"
+            return False, f"Error restoring snapshot: {e}"
+        message = f"Restored snapshot {snapshot_id}: {result['files']} files, {result['removed']} removed"
+        if errors:
+            message += f", {len(errors)} records still under an old key"
+        return True, message
 
     def list_wallets(self):
         """List all wallets"""
@@ -420,71 +1005,190 @@ class SapphireHood:
         if password != confirm_password:
             return False, "Passwords do not match"
         
-        self.save_password_hash(password)
-        self.encryption_key = self.derive_key(password)
+        data_key = Fernet.generate_key()
+        self.save_password_hash(password, data_key)
+        self._set_data_key(data_key)
         self.is_authenticated = True # <-- Set flag BEFORE creating directories
         self.ensure_directories_exist()
+        self._after_unlock()
         return True, "Setup complete!"
 
     def authenticate_user(self, password: str):
-        """Authenticate the user. Returns (bool, str)"""
+        """Authenticate the user with a single KDF run. Returns (bool, str)"""
         if not self.password_hash_file.exists():
             return False, "Password file not found. This might be the first launch."
         
-        if self.verify_password(password):
-            self.encryption_key = self.derive_key(password)
-            return True, "Authentication successful"
-        else:
+        try:
+            record = sapphire_kdf.load_record(self.password_hash_file)
+            data_key = sapphire_kdf.unlock(password, record)
+        except Exception:
+            return False, "Password file is damaged"
+        if data_key is None:
             return False, "Invalid password"
 
-    def save_password_hash(self, password):
-        """Save the password hash"""
-        salt = os.urandom(32)
-        password_hash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 100000)
-        hash_data = {
-            "salt": base64.b64encode(salt).decode('utf-8'),
-            "hash": base64.b64encode(password_hash).decode('utf-8'),
-            "iterations": 100000
-        }
+        if sapphire_kdf.is_legacy(record):
+            # One-time upgrade to the versioned format; wallets keep the same key
+            try:
+                self.save_password_hash(password, data_key)
+            except IOError:
+                pass
+        self._set_data_key(data_key, sapphire_kdf.load_retired_keys(self.retired_keys_file, data_key))
+        return True, "Authentication successful"
+
+    def save_password_hash(self, password, data_key: bytes):
+        """Save the password record wrapping `data_key`, with KDF cost calibrated for this machine"""
         try:
+            record = sapphire_kdf.create_record(password, data_key)
             self.app_data_dir.mkdir(parents=True, exist_ok=True)
-            with open(self.password_hash_file, 'w') as f:
-                json.dump(hash_data, f)
-            if os.name != 'nt':
-                os.chmod(self.password_hash_file, 0o600)
+            sapphire_kdf.save_record(self.password_hash_file, record)
         except Exception as e:
             raise IOError(f"Error saving password: {e}") from e
 
-    def verify_password(self, password):
-        """Verify the password"""
+    def change_password(self, old_password: str, new_password: str, confirm_password: str,
+                        rotate_key: bool = True, max_workers: int = None, progress=None):
+        """
+        Change the master password. With `rotate_key` the vault also moves
+        to a fresh data key: every record is re-encrypted in parallel while
+        both keys are accepted, and a journal lets an interrupted change
+        finish at the next unlock. The old key is retired, not forgotten,
+        so earlier snapshots stay readable; restoring one keeps the new
+        password and moves its records to the new key (restore_snapshot).
+        Returns (is_success, message).
+        """
+        if not self.is_authenticated:
+            return False, "Authentication required"
+        if len(new_password) < 8:
+            return False, "Password must be at least 8 characters long"
+        if new_password != confirm_password:
+            return False, "Passwords do not match"
+        if self.rekey_journal_file.exists():
+            return False, "A password change is still in progress, unlock again to finish it"
+        old_key = self._unlock_data_key(old_password)
+        if old_key is None or old_key != self.data_key:
+            return False, "Invalid password"
+
+        if not rotate_key:
+            # The data key is only wrapped by the password: re-wrapping it is enough
+            self.save_password_hash(new_password, old_key)
+            return True, "Password changed"
+
+        new_key = Fernet.generate_key()
+        journal = {
+            "version": 1,
+            "started_at": datetime.now().isoformat(),
+            "record": sapphire_kdf.create_record(new_password, new_key),
+            "retired": sapphire_kdf.wrap_retired_keys(new_key, [old_key] + self.retired_keys).decode('utf-8'),
+        }
         try:
-            with open(self.password_hash_file, 'r') as f:
-                hash_data = json.load(f)
-            salt = base64.b64decode(hash_data["salt"])
-            stored_hash = base64.b64decode(hash_data["hash"])
-            iterations = hash_data.get("iterations", 100000)
-            password_hash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
-            return password_hash == stored_hash
+            sapphire_kdf.save_record(self.rekey_journal_file, journal)
+            # Commit point: from here on only the new password unlocks the vault
+            sapphire_kdf.save_record(self.password_hash_file, journal["record"])
+        except Exception as e:
+            self.rekey_journal_file.unlink(missing_ok=True)
+            return False, f"Error saving password: {e}"
+        self._adopt_rekey_journal(new_key, journal)
+        return self._finish_password_change(max_workers, progress)
+
+    def _load_rekey_journal(self):
+        """
+        Journal of a password change interrupted by a crash, with its keys
+        adopted, or None if the change never got committed (it is dropped).
+        """
+        try:
+            journal = sapphire_kdf.load_record(self.rekey_journal_file)
+            committed = journal["record"] == sapphire_kdf.load_record(self.password_hash_file)
         except Exception:
-            return False
+            return None
+        if not committed:
+            # Crashed before the new password record was written: nothing changed
+            self.rekey_journal_file.unlink(missing_ok=True)
+            return None
+        self._adopt_rekey_journal(self.data_key, journal)
+        return journal
 
-    def derive_key(self, password):
-        """Derive encryption key from password"""
+    def _adopt_rekey_journal(self, new_key: bytes, journal: dict):
+        sapphire_kdf.save_retired_keys(self.retired_keys_file, journal["retired"].encode('utf-8'))
+        # Two-key transition: new writes use the new key, reads accept the old ones too
+        self._set_data_key(new_key, sapphire_kdf.load_retired_keys(self.retired_keys_file, new_key))
+
+    def _finish_password_change(self, max_workers: int = None, progress=None):
+        """Re-encrypt every record still under a retired key, then close the journal."""
+        done, errors = self._reencrypt_to_current_key(max_workers, progress)
+        if errors:
+            return False, f"Password changed, but {len(errors)} records could not be re-encrypted yet; unlock again to retry"
+        self.rekey_journal_file.unlink(missing_ok=True)
+        return True, f"Password changed, {done} records re-encrypted"
+
+    def _reencrypt_to_current_key(self, max_workers: int = None, progress=None):
+        """
+        Move every wallet file, backup, vault record, the manifest and the
+        balance cache that is still under a retired key to the current one.
+        Returns (records done, [file ids that failed]).
+        """
+        new_key, old_keys = self.data_key, self.retired_keys
+
+        paths = [str(path) for directory in self.wallet_dirs.values() for path in directory.glob("*.json")]
+        paths += [str(path) for path in self.backups_dir.glob("*.backup")]
+        errors = []
+        done = 0
+        total = len(paths) + (self.vault.count() if self.vault is not None else 0)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=sapphire_rekey.init_worker,
+                                 initargs=(new_key, old_keys)) as executor:
+            for path, error in executor.map(sapphire_rekey.reencrypt_file, paths, chunksize=32):
+                if error is not None:
+                    errors.append(path)
+                done += 1
+                if progress and done % 256 == 0:
+                    progress(done, total)
+
+            if self.vault is not None:
+                self.vault.fernet = self.encryption_key
+                self.vault.index_key = self.index_key
+                batch = []
+                for file_id, data in self.vault.iter_records():
+                    batch.append((file_id, data))
+                    if len(batch) >= 500:
+                        errors += self._rekey_vault_batch(executor, batch)
+                        done += len(batch)
+                        batch = []
+                        if progress:
+                            progress(done, total)
+                if batch:
+                    errors += self._rekey_vault_batch(executor, batch)
+                    done += len(batch)
+
+        if self.manifest.load(self.encryption_key):
+            self.manifest.save(self.encryption_key)
+        self.balance_cache.rekey(self.encryption_key)
+        if progress:
+            progress(done, total)
+        return done, errors
+
+    def _rekey_vault_batch(self, executor, batch):
+        updates, errors = [], []
+        for file_id, token, metadata, error in executor.map(sapphire_rekey.reencrypt_record, batch, chunksize=32):
+            if error is not None:
+                errors.append(file_id)
+            elif token is not None:
+                updates.append((file_id, metadata, token))
+        if updates:
+            self.vault.update_many(updates)
+        return errors
+
+    def _unlock_data_key(self, password):
         try:
-            with open(self.password_hash_file, 'r') as f:
-                hash_data = json.load(f)
-            salt = base64.b64decode(hash_data["salt"])
+            return sapphire_kdf.unlock(password, sapphire_kdf.load_record(self.password_hash_file))
         except Exception:
-            salt = os.urandom(16) # Fallback, should not happen in normal flow
-        
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-        return Fernet(key)
+            return None
+
+    def verify_password(self, password):
+        """Verify the password"""
+        return self._unlock_data_key(password) is not None
+
+    def derive_key(self, password):
+        """Return the encryption key protected by the password, or None if it is wrong"""
+        data_key = self._unlock_data_key(password)
+        return Fernet(data_key) if data_key is not None else None
 
     def ensure_directories_exist(self):
         """Check and create all necessary directories"""
@@ -556,12 +1260,14 @@ class SapphireHood:
         except Exception as e:
             return False, f"Error importing keystore: {e}"
 
-    def add_watch_only_wallet(self, address: str, wallet_name: str):
+    def add_watch_only_wallet(self, address: str, wallet_name: str, currency: str = "eth"):
         """Add a watch-only wallet"""
         if not self.is_authenticated:
             return False, "Authentication required"
-        if not self.validate_ethereum_address(address):
-            return False, "Invalid Ethereum address format"
+        if currency not in self.wallet_dirs:
+            return False, f"Unsupported currency: {currency}"
+        if not sapphire_validate.validate_address(address, currency):
+            return False, f"Invalid {currency.upper()} address format"
         if not wallet_name:
             return False, "Name cannot be empty"
 
@@ -570,32 +1276,46 @@ class SapphireHood:
             "address": address,
             "created_at": datetime.now().isoformat(),
             "type": "watch_only",
+            "currency": currency,
             "network": "mainnet",
         }
         
-        if self.save_wallet(wallet_data):
+        if self.save_wallet(self.wallet_dirs[currency], wallet_data):
             return True, f"Address '{wallet_name}' added for watching!"
         else:
             return False, "Error saving wallet"
 
-    def validate_ethereum_address(self, address):
-        """Validate an Ethereum address"""
-        if not isinstance(address, str) or not address.startswith('0x'):
-            return False
-        address_hex = address[2:]
-        if len(address_hex) != 40:
-            return False
+    def import_watch_only(self, path, currency: str = "eth", file_format: str = None,
+                          progress=None, on_error=None, cancel_event=None):
+        """
+        Bulk import watch-only addresses from a CSV or JSONL file, streamed
+        and written in batches. Returns (is_success, message, report).
+        """
+        if not self.is_authenticated:
+            return False, "Authentication required", None
         try:
-            int(address_hex, 16)
-            return True
-        except ValueError:
-            return False
+            report = WatchOnlyImporter(self, currency).run(
+                path, file_format, progress=progress, on_error=on_error, cancel_event=cancel_event
+            )
+        except OSError as e:
+            return False, f"Cannot read {path}: {e}", None
+        message = (
+            f"Imported {report['imported']} of {report['rows']} rows "
+            f"({report['duplicates']} duplicates, {report['invalid']} invalid, {report['failed']} failed)"
+        )
+        if report["cancelled"]:
+            message += ", cancelled"
+        return True, message, report
+
+    def validate_ethereum_address(self, address):
+        """Validate an Ethereum address (EIP-55 checksum when mixed case)"""
+        return sapphire_validate.is_valid_eth_address(address)
     def decrypt_wallet_file(self, hood, file_path: str):
         """
         Дешифрует и показывает содержимое wallet файла
         
-        Использование:
-        python sapphire_hood.py --decrypt "path/to/wallet.json"
+        Использование из консоли:
+        python sapphire_cli.py export --file-id "ethereum/eth_wallets/wallet.json"
         """
         try:
             with open(file_path, 'rb') as f:
@@ -609,111 +1329,59 @@ class SapphireHood:
             print(f"❌ Ошибка при чтении файла: {e}")
 
     def validated_btc_address(self, address: str) -> bool:
-        """Validate a Bitcoin address"""
-        if not isinstance(address, str):
-            return False
-        if re.match(r'^(1|3|bc1)[a-zA-Z0-9]{25,39}$', address):
-            return True
-        return False
+        """Validate a Bitcoin address (Base58Check or Bech32/Bech32m)"""
+        return sapphire_validate.is_valid_btc_address(address)
     def validated_tron_address(self, address: str) -> bool:
-        """Validate a Tron address"""
-        if not isinstance(address, str):
-            return False
-        if re.match(r'^(T)[a-zA-Z0-9]{33}$', address):
-            return True
-        return False
+        """Validate a Tron address (Base58Check)"""
+        return sapphire_validate.is_valid_tron_address(address)
+
+    def validate_addresses(self, addresses, currency: str) -> list[bool]:
+        """Validate a batch of addresses of one currency, one bool per address"""
+        return sapphire_validate.validate_many(addresses, currency)
     def information_for_qr(self, amount: float = None, currency: str = "eth", address: str = None) -> str:
         """Generate URI for QR code payment"""
-        if address is None: 
-            raise ValueError("Address cannot be None")
-        if currency == "eth":
-            uri = f"ethereum:{address}"
-        elif currency == "btc":
-            uri = f"bitcoin:{address}"
-        elif currency == "tron":
-            uri = f"tron:{address}"
-        else:
-            uri = f"{currency}:{address}"
-        
-        if amount is not None:
-            uri += f"?amount={amount}"
-        return uri
+        return sapphire_qr.payment_uri(address, currency, amount)
     
     def generate_payment_qrcode(self, wallet: str = None, currency: str = "eth", amount: float = None, logo_path: str = None) -> BytesIO:
-        """Generate QR code for payment"""
+        """Generate QR code for payment (rendered PNGs are cached per URI and logo)"""
         if not QR_AVAILABLE:
             raise ImportError("QR code libraries not available. Install with: pip install qrcode[pil] pillow")
         
         uri = self.information_for_qr(amount=amount, currency=currency, address=wallet)
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,  # High correction for logo
-            box_size=10, 
-            border=4
-        )
-        qr.add_data(uri)
-        qr.make(fit=True)
-        
-        # Create QR code
-        img = qr.make_image(
-            image_factory=StyledPilImage, 
-            module_drawer=VerticalBarsDrawer(horizontal_shrink=0.8)
-        )
-        
-        # Инвертируем цвета изображения (черное становится белым и наоборот)
-        from PIL import ImageOps
-        img = ImageOps.invert(img.convert('RGB'))
-        
-        # Add logo if file exists
-        if logo_path and os.path.exists(logo_path):
-            try:
-                # Open logo
-                logo = Image.open(logo_path)
-                
-                # Get QR code dimensions
-                qr_width, qr_height = img.size
-                
-                # Calculate logo size (20% of QR code size)
-                logo_size = min(qr_width, qr_height) // 3  # 33% of size
-
-                # Resize logo maintaining proportions
-                logo = logo.resize((logo_size, logo_size), Image.Resampling.LANCZOS)
-                
-                # White background for better QR code readability (after inversion)
-                if logo.mode != 'RGBA':
-                    # Create WHITE square slightly larger than logo
-                    background_size = logo_size + 10
-                    background = Image.new('RGB', (background_size, background_size), 'white')  # White background
-                    
-                    # Place logo in center of white background
-                    logo_bg_pos = ((background_size - logo_size) // 2, (background_size - logo_size) // 2)
-                    background.paste(logo, logo_bg_pos)
-                    logo = background
-                    logo_size = background_size
-                
-                # Calculate position to place logo exactly in center
-                logo_x = (qr_width - logo_size) // 2
-                logo_y = (qr_height - logo_size) // 2
-                
-                # Insert logo in center of QR code
-                if logo.mode == 'RGBA':
-                    img.paste(logo, (logo_x, logo_y), logo)  # With alpha channel
-                else:
-                    img.paste(logo, (logo_x, logo_y))  # Without alpha channel
-                    
-            except Exception as e:
-                print(f"Error adding logo: {e}")
-                # Continue without logo
-        
-        # Save image to BytesIO
-        buffer = BytesIO()
-        img.save(buffer, format="PNG")
-        buffer.seek(0)
-        return buffer
+        return BytesIO(sapphire_qr.payment_qr_png(uri, logo_path))
+
+    def render_qr_sheets(self, items, output_path, file_format: str = None, logo_path: str = None,
+                         columns: int = 3, rows: int = 4, progress=None, max_workers: int = None):
+        """
+        Print deposit QR codes for many wallets: `items` are (address,
+        currency, amount[, label]) tuples, rendered across cores onto a
+        multi-page PDF or numbered PNG sheets. Returns (is_success, message, paths).
+        """
+        if not QR_AVAILABLE:
+            return False, "QR code libraries not available. Install with: pip install qrcode[pil] pillow", None
+        items = list(items)
+        if not items:
+            return False, "Nothing to render", None
+        try:
+            paths = sapphire_qrsheet.render_sheets(
+                items, output_path, file_format, logo_path,
+                sapphire_qrsheet.SheetLayout(columns, rows), max_workers, progress
+            )
+        except Exception as e:
+            return False, f"Error rendering QR sheets: {e}", None
+        return True, f"Rendered {len(items)} QR codes to {len(paths)} file(s)", paths
+
     def delete_wallet(self, dir, wallet_name):
         """Delete a wallet by name"""
         if not self.is_authenticated:
             raise PermissionError("Authentication required")
+
+        if self.vault is not None:
+            currency = next((c for c, d in self.wallet_dirs.items() if d == dir), None)
+            matches = self.vault.find(name=wallet_name, currency=currency)
+            if not matches:
+                raise FileNotFoundError(f"Wallet '{wallet_name}' not found")
+            return self.vault.delete(matches[0]["file_id"])
         
         # Find wallet file by name
         wallet_files = list(dir.glob(f"*{wallet_name}*.json"))
@@ -724,6 +1392,8 @@ class SapphireHood:
         wallet_file = wallet_files[0]
         try:
             wallet_file.unlink()
+            self.manifest.remove(self._file_id(wallet_file))
+            self.manifest.save(self.encryption_key)
             return True
         except Exception as e:
             raise IOError(f"Failed to delete wallet file: {e}")
\ No newline at end of file
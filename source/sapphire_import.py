@@ -0,0 +1,192 @@
+"""
+Streaming bulk import of watch-only addresses.
+Reads CSV or JSONL one row at a time, validates each batch with
+sapphire_validate, skips addresses that are already in the vault (or
+earlier in the same file) and writes every batch in one go. Duplicates
+are found with one indexed lookup per batch (the vault's blind index or
+the manifest), and earlier batches are already written by then, so
+memory is one batch whatever the file or vault size.
+
+CSV: a header with an "address" column and optional "name" and
+"currency" columns, or no header and the columns in that order.
+JSONL: one object per line with the same keys, or a bare address string.
+"""
+
+import csv
+import json
+from datetime import datetime
+from pathlib import Path
+
+import sapphire_keygen
+import sapphire_validate
+
+DEFAULT_BATCH_SIZE = 500
+# Only the first errors are kept in the report; on_error sees all of them
+MAX_REPORTED_ERRORS = 1000
+CSV_COLUMNS = ("address", "name", "currency")
+
+
+def detect_format(path) -> str:
+    return "jsonl" if Path(path).suffix.lower() in (".jsonl", ".ndjson") else "csv"
+
+
+def _iter_csv(f):
+    reader = csv.reader(f)
+    header = None
+    for row in reader:
+        line_no = reader.line_num
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if header is None:
+            cells = [cell.strip().lower() for cell in row]
+            if "address" in cells:
+                header = cells
+                continue
+            header = list(CSV_COLUMNS)
+        yield line_no, {key: value.strip() for key, value in zip(header, row) if key}, None
+
+
+def _iter_jsonl(f):
+    for line_no, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"Invalid JSON: {e}"
+            continue
+        if isinstance(record, str):
+            record = {"address": record}
+        if not isinstance(record, dict):
+            yield line_no, None, "Expected an object or an address string"
+            continue
+        yield line_no, record, None
+
+
+def iter_rows(path, file_format: str = None):
+    """Yield (line number, row dict or None, error or None) without reading the whole file."""
+    file_format = file_format or detect_format(path)
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        rows = _iter_jsonl(f) if file_format == "jsonl" else _iter_csv(f)
+        yield from rows
+
+
+def address_key(currency: str, address: str) -> str:
+    """Comparison key: hex and Bech32 addresses are case-insensitive, Base58 is not."""
+    if currency == "eth" or address[:3].lower() == "bc1":
+        return f"{currency}:{address.lower()}"
+    return f"{currency}:{address}"
+
+
+def address_spellings(currency: str, address: str) -> set:
+    """The forms the same address may be stored under (see address_key)."""
+    if currency == "eth":
+        lower = address.lower()
+        return {address, lower, sapphire_keygen.checksum_address(bytes.fromhex(lower[2:]))}
+    if address[:3].lower() == "bc1":
+        return {address, address.lower(), address.upper()}
+    return {address}
+
+
+class WatchOnlyImporter:
+    """
+    Imports watch-only addresses through `hood` (its address lookups and
+    batched writer). `currency` applies to rows without their own.
+    """
+    def __init__(self, hood, currency: str = "eth", batch_size: int = DEFAULT_BATCH_SIZE,
+                 name_prefix: str = "Watch "):
+        self.hood = hood
+        self.currency = currency
+        self.batch_size = batch_size
+        self.name_prefix = name_prefix
+
+    def run(self, path, file_format: str = None, progress=None, on_error=None, cancel_event=None) -> dict:
+        """
+        Import every valid new address of the file. Returns
+            {"rows", "imported", "duplicates", "invalid", "failed",
+             "errors": [(line, message)], "cancelled"}
+        Bad rows are reported and skipped. `progress(rows, imported)` is
+        called after every batch; batches written before a cancellation stay.
+        """
+        report = {
+            "rows": 0, "imported": 0, "duplicates": 0, "invalid": 0, "failed": 0,
+            "errors": [], "cancelled": False,
+        }
+
+        def error(line_no, message, kind="invalid", count=1):
+            report[kind] += count
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append((line_no, message))
+            if on_error:
+                on_error(line_no, message)
+
+        batch = []
+        for line_no, row, message in iter_rows(path, file_format):
+            report["rows"] += 1
+            if message:
+                error(line_no, message)
+                continue
+            batch.append((line_no, row))
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch, report, error)
+                batch = []
+                if progress:
+                    progress(report["rows"], report["imported"])
+                if cancel_event is not None and cancel_event.is_set():
+                    report["cancelled"] = True
+                    return report
+        if batch:
+            self._import_batch(batch, report, error)
+            if progress:
+                progress(report["rows"], report["imported"])
+        return report
+
+    def _import_batch(self, batch, report, error):
+        by_currency = {}
+        for line_no, row in batch:
+            currency = (row.get("currency") or self.currency).lower()
+            address = str(row.get("address") or "").strip()
+            if currency not in sapphire_validate.VALIDATORS:
+                error(line_no, f"Unsupported currency: {currency}")
+            elif not address:
+                error(line_no, "Missing address")
+            else:
+                by_currency.setdefault(currency, []).append((line_no, address, row))
+
+        created_at = datetime.now().isoformat()
+        wallets = []
+        seen = set()
+        for currency, rows in by_currency.items():
+            results = sapphire_validate.validate_many([address for _, address, _ in rows], currency)
+            valid_rows = []
+            for (line_no, address, row), valid in zip(rows, results):
+                if valid:
+                    valid_rows.append((line_no, address, row))
+                else:
+                    error(line_no, f"Invalid {currency} address: {address}")
+            spellings = {address: address_spellings(currency, address) for _, address, _ in valid_rows}
+            existing = self.hood.existing_addresses(currency, set().union(*spellings.values()))
+            for line_no, address, row in valid_rows:
+                key = address_key(currency, address)
+                if key in seen or not existing.isdisjoint(spellings[address]):
+                    report["duplicates"] += 1
+                    continue
+                seen.add(key)
+                wallets.append({
+                    "name": row.get("name") or f"{self.name_prefix}{address}",
+                    "address": address,
+                    "created_at": created_at,
+                    "type": "watch_only",
+                    "currency": currency,
+                    "network": "mainnet",
+                })
+        if not wallets:
+            return
+        encrypted = [self.hood._encrypt_wallet(wallet_data) for wallet_data in wallets]
+        try:
+            self.hood._write_wallets_batch(wallets, encrypted)
+        except Exception as e:
+            error(batch[0][0], f"Could not save the batch starting here: {e}", "failed", len(wallets))
+            return
+        report["imported"] += len(wallets)
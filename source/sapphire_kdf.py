@@ -0,0 +1,193 @@
+"""
+Password key derivation for the Sapphire vault.
+A single KDF run per unlock yields both the password verifier and the
+key-encryption key (split with HKDF). The Fernet data key itself is
+random and stored wrapped by the key-encryption key, so KDF parameters
+can be recalibrated without re-encrypting any wallet.
+
+.password_hash format, version 2:
+    {
+        "version": 2,
+        "kdf": {"algorithm": "pbkdf2-sha256", "iterations": 600000}
+               or {"algorithm": "scrypt", "n": 65536, "r": 8, "p": 1},
+        "salt": base64,
+        "verifier": base64,
+        "wrapped_key": Fernet token of the data key
+    }
+Files without "version" are the original format (PBKDF2-SHA256, 100k
+iterations, the derived bytes being both the hash and the Fernet key);
+they are still accepted and upgraded on the next login.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDFExpand
+
+FORMAT_VERSION = 2
+LEGACY_ITERATIONS = 100000
+MIN_PBKDF2_ITERATIONS = LEGACY_ITERATIONS
+MAX_PBKDF2_ITERATIONS = 10_000_000
+MIN_SCRYPT_N = 2 ** 14
+MAX_SCRYPT_N = 2 ** 17  # 128 MiB with r=8
+DEFAULT_TARGET_SECONDS = 0.3
+SALT_SIZE = 32
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode('utf-8')
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text)
+
+
+def run_kdf(password: str, salt: bytes, params: dict) -> bytes:
+    """Run the configured KDF once; returns 32 bytes."""
+    algorithm = params["algorithm"]
+    if algorithm == "pbkdf2-sha256":
+        return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, params["iterations"])
+    if algorithm == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        return hashlib.scrypt(
+            password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+            maxmem=129 * r * (n + p + 2), dklen=32
+        )
+    raise ValueError(f"Unsupported KDF algorithm: {algorithm}")
+
+
+def split_master_key(master: bytes):
+    """Split KDF output into (verifier, key-encryption Fernet)."""
+    verifier = HKDFExpand(hashes.SHA256(), 32, b"sapphire password verifier").derive(master)
+    kek = HKDFExpand(hashes.SHA256(), 32, b"sapphire key encryption key").derive(master)
+    return verifier, Fernet(base64.urlsafe_b64encode(kek))
+
+
+def calibrate(target_seconds: float = DEFAULT_TARGET_SECONDS, algorithm: str = "pbkdf2-sha256") -> dict:
+    """
+    Pick KDF parameters that take about `target_seconds` on this machine.
+    Never goes below the original 100k PBKDF2 iterations.
+    """
+    salt = os.urandom(SALT_SIZE)
+    if algorithm == "pbkdf2-sha256":
+        probe = 20000
+        start = time.perf_counter()
+        run_kdf("calibration", salt, {"algorithm": algorithm, "iterations": probe})
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        iterations = int(probe * target_seconds / elapsed)
+        iterations = min(max(iterations, MIN_PBKDF2_ITERATIONS), MAX_PBKDF2_ITERATIONS)
+        return {"algorithm": algorithm, "iterations": iterations}
+    if algorithm == "scrypt":
+        params = {"algorithm": algorithm, "n": MIN_SCRYPT_N, "r": 8, "p": 1}
+        while params["n"] < MAX_SCRYPT_N:
+            start = time.perf_counter()
+            run_kdf("calibration", salt, params)
+            # Cost is linear in n: stop if doubling would overshoot the target
+            if (time.perf_counter() - start) * 2 > target_seconds:
+                break
+            params["n"] *= 2
+        return params
+    raise ValueError(f"Unsupported KDF algorithm: {algorithm}")
+
+
+def create_record(password: str, data_key: bytes, params: dict = None,
+                  target_seconds: float = DEFAULT_TARGET_SECONDS) -> dict:
+    """Build a version 2 record protecting `data_key` with `password`."""
+    params = params or calibrate(target_seconds)
+    salt = os.urandom(SALT_SIZE)
+    verifier, kek = split_master_key(run_kdf(password, salt, params))
+    return {
+        "version": FORMAT_VERSION,
+        "kdf": params,
+        "salt": _b64(salt),
+        "verifier": _b64(verifier),
+        "wrapped_key": kek.encrypt(data_key).decode('utf-8'),
+    }
+
+
+def is_legacy(record: dict) -> bool:
+    return "version" not in record
+
+
+def unlock(password: str, record: dict):
+    """
+    Check `password` against `record` with a single KDF run.
+    Returns the Fernet data key (bytes), or None if the password is wrong.
+    """
+    salt = _unb64(record["salt"])
+    if is_legacy(record):
+        iterations = record.get("iterations", LEGACY_ITERATIONS)
+        derived = run_kdf(password, salt, {"algorithm": "pbkdf2-sha256", "iterations": iterations})
+        if not hmac.compare_digest(derived, _unb64(record["hash"])):
+            return None
+        # The original format used the verifier bytes directly as the Fernet key
+        return base64.urlsafe_b64encode(derived)
+
+    verifier, kek = split_master_key(run_kdf(password, salt, record["kdf"]))
+    if not hmac.compare_digest(verifier, _unb64(record["verifier"])):
+        return None
+    try:
+        return kek.decrypt(record["wrapped_key"].encode('utf-8'))
+    except InvalidToken:
+        return None
+
+
+def load_record(path) -> dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def record_fingerprint(path) -> str:
+    """SHA-256 of the password record file; any password change gives a new one."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _write_private(path, data: bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    if os.name != 'nt':
+        os.chmod(tmp_path, 0o600)
+    os.replace(tmp_path, path)
+
+
+def save_record(path, record: dict):
+    """Atomically replace the password record file."""
+    _write_private(path, json.dumps(record).encode('utf-8'))
+
+
+def wrap_retired_keys(data_key: bytes, keys: list) -> bytes:
+    """Earlier data keys, encrypted under the current one."""
+    return Fernet(data_key).encrypt(json.dumps([key.decode('utf-8') for key in keys]).encode('utf-8'))
+
+
+def load_retired_keys(path, data_key: bytes) -> list:
+    """
+    Data keys replaced by password changes, kept so that snapshots and
+    backups made before stay readable. [] if missing or not under `data_key`.
+    """
+    try:
+        with open(path, 'rb') as f:
+            keys = json.loads(Fernet(data_key).decrypt(f.read()))
+    except (OSError, InvalidToken, ValueError):
+        return []
+    return [key.encode('utf-8') for key in keys]
+
+
+def save_retired_keys(path, token: bytes):
+    """Atomically replace the retired keys file with a wrap_retired_keys token."""
+    _write_private(path, token)
+
+
+def derive_subkey(data_key: bytes, purpose: bytes) -> bytes:
+    """Derive an independent 32-byte key from the data key, e.g. for blind indexes."""
+    return HKDFExpand(hashes.SHA256(), 32, b"sapphire " + purpose).derive(base64.urlsafe_b64decode(data_key))
@@ -0,0 +1,134 @@
+"""
+secp256k1 key generation and address encoding for SapphireHood.
+Public keys are computed by libsecp256k1 through `coincurve` instead of
+the pure-Python `ecdsa` package, which is far slower. Everything here is
+module-level so it can run in worker processes (see create_wallets_bulk).
+"""
+
+import base64
+import hashlib
+import os
+
+from sapphire_startup import lazy_import
+
+coincurve = lazy_import("coincurve")
+base58 = lazy_import("base58")
+# pycryptodome; hashlib's sha3_256 is not Keccak
+keccak = lazy_import("Crypto.Hash.keccak")
+
+SECP256K1_ORDER = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+
+def random_private_key() -> bytes:
+    """32 random bytes that form a valid secp256k1 private key."""
+    while True:
+        private_key = os.urandom(32)
+        if 0 < int.from_bytes(private_key, "big") < SECP256K1_ORDER:
+            return private_key
+
+
+def public_key(private_key: bytes, compressed: bool = False) -> bytes:
+    """SEC1 encoded public key of a 32-byte private key."""
+    return coincurve.PublicKey.from_secret(private_key).format(compressed=compressed)
+
+
+def btc_address(public_key_bytes: bytes) -> str:
+    """Mainnet P2PKH address of a public key."""
+    sha256_hash = hashlib.sha256(public_key_bytes).digest()
+    ripemd160_hash = hashlib.new('ripemd160', sha256_hash).digest()
+    return base58.b58encode_check(b'\x00' + ripemd160_hash).decode()
+
+
+def keccak256(data: bytes) -> bytes:
+    return keccak.new(digest_bits=256, data=data).digest()
+
+
+def checksum_address(address_bytes: bytes) -> str:
+    """EIP-55 mixed-case hex of a 20-byte address."""
+    hex_address = address_bytes.hex()
+    hashed = keccak256(hex_address.encode()).hex()
+    return "0x" + "".join(
+        char.upper() if nibble in "89abcdef" else char
+        for char, nibble in zip(hex_address, hashed)
+    )
+
+
+def eth_address(public_key_bytes: bytes) -> str:
+    """EIP-55 checksummed address of an uncompressed public key."""
+    return checksum_address(keccak256(public_key_bytes[1:])[-20:])
+
+
+def tron_address(public_key_bytes: bytes) -> str:
+    """Base58Check TRON address of an uncompressed public key."""
+    return base58.b58encode_check(b'\x41' + keccak256(public_key_bytes[1:])[-20:]).decode()
+
+
+def generate_keypair(currency: str) -> dict:
+    """
+    New random key for `currency` ("eth", "btc" or "tron").
+    Returns {"private_key", "address"} plus "public_key" for BTC, all
+    hex/text in the same format as the single-wallet generators.
+    """
+    private_key = random_private_key()
+    public_key_bytes = public_key(private_key)
+    if currency == "btc":
+        return {
+            "private_key": private_key.hex(),
+            "address": btc_address(public_key_bytes),
+            "public_key": public_key_bytes.hex(),
+        }
+    if currency == "eth":
+        return {"private_key": private_key.hex(), "address": eth_address(public_key_bytes)}
+    if currency == "tron":
+        return {"private_key": private_key.hex(), "address": tron_address(public_key_bytes)}
+    raise ValueError(f"Unsupported currency: {currency}")
+
+
+def generate_batch(currency: str, count: int) -> list[dict]:
+    """Generate `count` keypairs; entry point for worker processes."""
+    return [generate_keypair(currency) for _ in range(count)]
+
+
+def _varint(n: int) -> bytes:
+    if n < 0xFD:
+        return bytes([n])
+    if n <= 0xFFFF:
+        return b"\xfd" + n.to_bytes(2, "little")
+    if n <= 0xFFFFFFFF:
+        return b"\xfe" + n.to_bytes(4, "little")
+    return b"\xff" + n.to_bytes(8, "little")
+
+
+def message_digest(currency: str, message: bytes) -> bytes:
+    """
+    Digest signed for a text message: EIP-191 personal_sign for ETH, its
+    TRON counterpart (TIP-191) and the "Bitcoin Signed Message" format.
+    """
+    if currency == "eth":
+        return keccak256(b"\x19Ethereum Signed Message:\n" + str(len(message)).encode() + message)
+    if currency == "tron":
+        return keccak256(b"\x19TRON Signed Message:\n" + str(len(message)).encode() + message)
+    if currency == "btc":
+        prefix = b"Bitcoin Signed Message:\n"
+        data = _varint(len(prefix)) + prefix + _varint(len(message)) + message
+        return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+    raise ValueError(f"Unsupported currency: {currency}")
+
+
+def sign_message(currency: str, private_key_hex: str, message, address: str = None) -> str:
+    """
+    Recoverable signature of `message` (str or bytes).
+    ETH/TRON: 0x-hex r || s || v (v = 27/28), as wallets and explorers expect.
+    BTC: base64 compact signature; `address` tells whether the wallet uses
+    a compressed key (HD wallets do, generated wallets do not).
+    """
+    if isinstance(message, str):
+        message = message.encode('utf-8')
+    private_key = coincurve.PrivateKey(bytes.fromhex(private_key_hex.removeprefix("0x")))
+    signature = private_key.sign_recoverable(message_digest(currency, message), hasher=None)
+    r_s, recovery_id = signature[:64], signature[64]
+    if currency == "btc":
+        compressed = address is not None and address == btc_address(private_key.public_key.format(compressed=True))
+        header = 27 + recovery_id + (4 if compressed else 0)
+        return base64.b64encode(bytes([header]) + r_s).decode()
+    return "0x" + (r_s + bytes([27 + recovery_id])).hex()
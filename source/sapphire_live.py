@@ -0,0 +1,148 @@
+"""
+Live candle updates for the Sapphire chart.
+Subscribes to a kline stream (Binance websocket, or a local replay feed
+for offline work) and pushes only the changed or new candle into the
+already loaded chart page (see sapphire_chart.ChartPage), coalescing
+bursts to the display refresh rate.
+"""
+
+import json
+
+from PyQt6.QtCore import QObject, QTimer, QUrl, pyqtSignal
+from PyQt6.QtWebSockets import QWebSocket
+
+BINANCE_STREAM_URL = "wss://stream.binance.com:9443/ws/{symbol}@kline_{interval}"
+RECONNECT_DELAYS_MS = (1000, 2000, 5000, 10000, 30000)
+
+
+def parse_kline_message(message):
+    """
+    Convert a Binance kline event (str or dict) to a chart candle.
+    Returns None for anything that is not a kline event.
+    """
+    try:
+        event = json.loads(message) if isinstance(message, (str, bytes)) else message
+        k = event["k"]
+        return {
+            "time": int(k["t"]) // 1000,  # в секундах
+            "open": float(k["o"]),
+            "high": float(k["h"]),
+            "low": float(k["l"]),
+            "close": float(k["c"])
+        }
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class BinanceKlineStream(QObject):
+    """Binance kline websocket; reconnects with backoff until stopped."""
+    candle = pyqtSignal(dict)
+
+    def __init__(self, symbol: str, interval: str, parent=None):
+        super().__init__(parent)
+        self.url = QUrl(BINANCE_STREAM_URL.format(symbol=symbol.lower(), interval=interval))
+        self.socket = QWebSocket()
+        self.socket.textMessageReceived.connect(self._on_message)
+        self.socket.disconnected.connect(self._on_disconnected)
+        self.socket.connected.connect(self._on_connected)
+        self.running = False
+        self.attempt = 0
+
+    def start(self):
+        self.running = True
+        self.socket.open(self.url)
+
+    def stop(self):
+        self.running = False
+        self.socket.close()
+
+    def _on_connected(self):
+        self.attempt = 0
+
+    def _on_message(self, message: str):
+        candle = parse_kline_message(message)
+        if candle is not None:
+            self.candle.emit(candle)
+
+    def _on_disconnected(self):
+        if not self.running:
+            return
+        delay = RECONNECT_DELAYS_MS[min(self.attempt, len(RECONNECT_DELAYS_MS) - 1)]
+        self.attempt += 1
+        QTimer.singleShot(delay, self._reconnect)
+
+    def _reconnect(self):
+        if self.running:
+            self.socket.open(self.url)
+
+
+class ReplayKlineFeed(QObject):
+    """
+    Local stand-in for the Binance stream.
+    Replays Binance-format kline events (for example a recorded JSONL file)
+    at a fixed pace, so live mode can be exercised offline.
+    """
+    candle = pyqtSignal(dict)
+
+    def __init__(self, messages, interval_ms: int = 250, parent=None):
+        super().__init__(parent)
+        self.messages = iter(messages)
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self._next)
+
+    @classmethod
+    def from_jsonl(cls, path, interval_ms: int = 250, parent=None):
+        with open(path, 'r', encoding='utf-8') as f:
+            messages = [line for line in f if line.strip()]
+        return cls(messages, interval_ms=interval_ms, parent=parent)
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def _next(self):
+        for message in self.messages:
+            candle = parse_kline_message(message)
+            if candle is not None:
+                self.candle.emit(candle)
+                return
+        self.timer.stop()
+
+
+class ChartUpdateThrottle(QObject):
+    """
+    Coalesces candle updates and sends them to the chart page at most once
+    per display frame. Several updates of the same candle within a frame
+    collapse into the latest one.
+    """
+    def __init__(self, chart_page, parent=None):
+        super().__init__(parent)
+        self.chart_page = chart_page
+        self.pending = {}
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+        refresh_rate = 60.0
+        screen = chart_page.view.screen()
+        if screen is not None and screen.refreshRate() > 0:
+            refresh_rate = screen.refreshRate()
+        self.frame_ms = max(1, int(1000 / refresh_rate))
+
+    def push(self, candle: dict):
+        self.pending[candle["time"]] = candle
+        if not self.timer.isActive():
+            self.timer.start(self.frame_ms)
+
+    def clear(self):
+        self.pending.clear()
+        self.timer.stop()
+
+    def flush(self):
+        if not self.pending:
+            return
+        candles = [self.pending[t] for t in sorted(self.pending)]
+        self.pending.clear()
+        self.chart_page.update(candles)
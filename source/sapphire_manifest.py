@@ -0,0 +1,120 @@
+"""
+Encrypted wallet manifest for SapphireHood.
+Holds the non-secret metadata of every wallet (name, address, currency,
+type, created_at and the id of its file), so listing wallets costs one
+small decrypt instead of decrypting every wallet file. Private keys are
+only decrypted when a specific wallet is opened.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+
+MANIFEST_VERSION = 1
+METADATA_FIELDS = ("name", "address", "currency", "type", "created_at")
+
+
+def wallet_metadata(wallet_data: dict) -> dict:
+    """The non-secret part of a wallet record."""
+    metadata = {field: wallet_data.get(field) for field in METADATA_FIELDS}
+    # Wallets created before multi-currency support are Ethereum wallets
+    metadata["currency"] = metadata["currency"] or "eth"
+    return metadata
+
+
+class WalletManifest:
+    """
+    Index of wallet metadata keyed by file id (the wallet file path
+    relative to the app data dir). Stored Fernet-encrypted and replaced
+    atomically on every change. Concurrent saves are serialized, and a
+    save whose changes another save has already written returns at once,
+    so a burst of single-wallet saves costs a few rewrites, not one each.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.loaded = False
+        self._wallets = {}
+        self._lock = threading.Lock()
+        # (currency, address) of every wallet, built on the first lookup
+        self._addresses = None
+        # Held across serialize, write and replace; _lock only guards _wallets
+        self._save_lock = threading.Lock()
+        self._version = 0
+        self._saved_version = -1
+        self._saved_fernet = None
+
+    def load(self, fernet) -> bool:
+        """Read the manifest. Returns False if it is missing or unreadable."""
+        try:
+            with open(self.path, 'rb') as f:
+                data = json.loads(fernet.decrypt(f.read()).decode())
+        except Exception:
+            self.loaded = False
+            return False
+        with self._lock:
+            self._wallets = data.get("wallets", {})
+            self._addresses = None
+            self._version += 1
+            self.loaded = True
+        return True
+
+    def save(self, fernet):
+        """Atomically replace the manifest file."""
+        with self._lock:
+            wanted = self._version
+        with self._save_lock:
+            if self._saved_fernet is fernet and self._saved_version >= wanted:
+                # A concurrent save already wrote these changes
+                return
+            with self._lock:
+                payload = json.dumps({"version": MANIFEST_VERSION, "wallets": self._wallets}).encode()
+                version = self._version
+                self.loaded = True
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(fernet.encrypt(payload))
+                f.flush()
+                os.fsync(f.fileno())
+            if os.name != 'nt':
+                os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.path)
+            self._saved_version, self._saved_fernet = version, fernet
+
+    def entries(self) -> list[dict]:
+        """All wallets, each with its "file_id"."""
+        with self._lock:
+            return [dict(metadata, file_id=file_id) for file_id, metadata in self._wallets.items()]
+
+    def file_ids(self) -> set:
+        with self._lock:
+            return set(self._wallets)
+
+    def add(self, file_id: str, wallet_data: dict):
+        with self._lock:
+            metadata = self._wallets[file_id] = wallet_metadata(wallet_data)
+            if self._addresses is not None:
+                self._addresses.add((metadata["currency"], metadata["address"]))
+            self._version += 1
+
+    def remove(self, file_id: str):
+        with self._lock:
+            self._wallets.pop(file_id, None)
+            self._addresses = None
+            self._version += 1
+
+    def clear(self):
+        with self._lock:
+            self._wallets = {}
+            self._addresses = None
+            self._version += 1
+
+    def existing_addresses(self, currency: str, addresses) -> set:
+        """The given addresses that `currency` wallets already use."""
+        with self._lock:
+            if self._addresses is None:
+                self._addresses = {
+                    (metadata.get("currency") or "eth", metadata.get("address"))
+                    for metadata in self._wallets.values()
+                }
+            return {address for address in addresses if (currency, address) in self._addresses}
@@ -0,0 +1,119 @@
+"""
+Shared HTTP plumbing for SapphireHood.
+Keeps one keep-alive requests.Session per provider host, so repeated
+balance and market queries reuse their TCP+TLS connections instead of
+paying a fresh handshake on every call. SingleFlight lets concurrent
+identical queries (same endpoint and parameters) share one request.
+"""
+
+import threading
+from urllib.parse import urlsplit
+
+from sapphire_startup import lazy_import
+
+# requests (and urllib3/ssl behind it) is only needed once the first query runs
+requests = lazy_import("requests")
+
+DEFAULT_TIMEOUT = 10
+
+
+class SessionPool:
+    """
+    Keep-alive HTTP sessions, one per provider host.
+    Safe to share between worker threads.
+    """
+    def __init__(self, pool_maxsize: int = 16, timeout: float = DEFAULT_TIMEOUT):
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url: str):
+        """Return the session for the host of `url`, creating it on first use."""
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+            return session
+
+    def get(self, url: str, **kwargs):
+        """GET through the pooled session, with the default timeout applied."""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session_for(url).get(url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        """POST through the pooled session, with the default timeout applied."""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session_for(url).post(url, **kwargs)
+
+    def close(self):
+        """Close every pooled session."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Request coalescing: while a call for a key is running, further calls
+    with the same key wait for it and get its result (or its exception)
+    instead of starting their own. Nothing is cached once the call ends.
+    Results are shared between the callers, so treat them as read-only.
+    Safe to share between worker threads.
+    """
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executed = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """fn(*args, **kwargs), run once for all concurrent callers with `key`."""
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.executed += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn(*args, **kwargs)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self) -> dict:
+        """Calls made, upstream requests actually executed and the ones saved."""
+        with self._lock:
+            return {"calls": self.calls, "executed": self.executed, "coalesced": self.calls - self.executed}
@@ -0,0 +1,421 @@
+"""
+Balance providers for SapphireHood: several backends per chain behind
+one router, instead of one hardwired public API per chain.
+
+Each provider has:
+- a token bucket at its own request rate, halved on HTTP 429 and slowly
+  restored on success, so batch refreshes stay under the limits;
+- a circuit breaker: after FAILURE_THRESHOLD failures in a row (or a
+  429/503) it is skipped for an exponentially growing backoff (or the
+  server's Retry-After), then one probe request decides;
+- a health score, success rate (EWMA) / latency (EWMA) x weight, used to
+  pick among the providers that are up and have a token.
+A failed call moves on to the next provider, so one slow or banned API
+costs a retry, not a missing balance.
+
+Backends are configured per chain in config.json, e.g. a self-hosted node
+first with a public API as fallback:
+    "providers": {
+        "eth": [
+            {"type": "eth-jsonrpc", "url": "http://127.0.0.1:8545", "rate": 50, "weight": 4},
+            {"type": "ethplorer", "url": "https://api.ethplorer.io", "api_key": "freekey", "rate": 1.5}
+        ]
+    }
+A chain listed there replaces its defaults (DEFAULT_PROVIDERS).
+Types: esplora (mempool.space, blockstream.info, electrs), ethplorer,
+eth-jsonrpc (any Ethereum node), trongrid, tron-node (java-tron HTTP API).
+"""
+
+import random
+import threading
+import time
+
+FAILURE_THRESHOLD = 3
+BASE_BACKOFF = 2.0
+MAX_BACKOFF = 300.0
+EWMA_ALPHA = 0.2
+# How long a call may wait for a rate-limit token before giving up
+DEFAULT_MAX_WAIT = 10.0
+
+DEFAULT_PROVIDERS = {
+    "btc": [
+        {"type": "esplora", "name": "mempool.space", "url": "https://mempool.space/api", "rate": 5, "burst": 10},
+        {"type": "esplora", "name": "blockstream", "url": "https://blockstream.info/api", "rate": 5, "burst": 10},
+    ],
+    "eth": [
+        {"type": "ethplorer", "name": "ethplorer", "url": "https://api.ethplorer.io", "api_key": "freekey",
+         "rate": 1.5, "burst": 3},
+        {"type": "eth-jsonrpc", "name": "publicnode", "url": "https://ethereum-rpc.publicnode.com",
+         "rate": 10, "burst": 20},
+    ],
+    "tron": [
+        {"type": "trongrid", "name": "trongrid", "url": "https://api.trongrid.io", "rate": 3, "burst": 5},
+    ],
+}
+
+
+class ProviderError(Exception):
+    """A provider could not answer; `retry_after` (seconds) when it said so."""
+    def __init__(self, message: str, retry_after: float = None, rate_limited: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.rate_limited = rate_limited
+
+
+class TokenBucket:
+    """
+    Request budget of `rate` per second with bursts of `burst`. The rate
+    adapts: slow_down() halves it (down to an eighth), speed_up() wins
+    back a little of the configured rate at a time. Thread-safe.
+    """
+    def __init__(self, rate: float, burst: float = None):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> float:
+        """Take a token: 0.0 on success, otherwise the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return 0.0
+            return (1.0 - self.tokens) / self.rate
+
+    def give_back(self):
+        """Return a token taken for a request that was not made."""
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + 1.0)
+
+    def slow_down(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.max_rate / 8, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def speed_up(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class ProviderHealth:
+    """Circuit breaker and running success/latency averages of one provider."""
+    def __init__(self):
+        self.success_rate = 1.0
+        self.latency = 0.5
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.open_until > time.monotonic():
+            return "open"
+        return "half-open" if self.consecutive_failures >= FAILURE_THRESHOLD else "closed"
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until the breaker lets a request through (0 if it does now)."""
+        with self._lock:
+            if self.open_until > now:
+                return self.open_until - now
+            # Half-open: one probe at a time
+            return BASE_BACKOFF if self.probing else 0.0
+
+    def begin(self, now: float) -> bool:
+        """Claim a request slot; False if the breaker is open or a probe is running."""
+        with self._lock:
+            if self.open_until > now or self.probing:
+                return False
+            if self.consecutive_failures >= FAILURE_THRESHOLD:
+                self.probing = True
+            self.requests += 1
+            return True
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.success_rate += EWMA_ALPHA * (1.0 - self.success_rate)
+            self.latency += EWMA_ALPHA * (latency - self.latency)
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+            self.probing = False
+
+    def record_failure(self, retry_after: float = None, trip: bool = False):
+        with self._lock:
+            self.success_rate -= EWMA_ALPHA * self.success_rate
+            self.consecutive_failures += 1
+            self.failures += 1
+            self.probing = False
+            if trip or self.consecutive_failures >= FAILURE_THRESHOLD:
+                excess = max(0, self.consecutive_failures - FAILURE_THRESHOLD)
+                backoff = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** excess)
+                self.open_until = time.monotonic() + max(backoff, retry_after or 0.0)
+
+
+class Provider:
+    """One backend of one chain; subclasses implement balance() and activity()."""
+    currency = None
+
+    def __init__(self, url: str, name: str = None, rate: float = 2.0, burst: float = None,
+                 weight: float = 1.0, api_key: str = None, headers: dict = None, timeout: float = None):
+        self.url = url.rstrip("/")
+        self.name = name or self.url
+        self.weight = float(weight)
+        self.api_key = api_key
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst)
+        self.health = ProviderHealth()
+
+    def score(self) -> float:
+        return self.weight * max(self.health.success_rate, 0.01) / max(self.health.latency, 0.01)
+
+    def _check(self, response):
+        if response.status_code in (429, 503):
+            retry_after = response.headers.get("Retry-After")
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            raise ProviderError(f"{self.name}: HTTP {response.status_code}", retry_after, rate_limited=True)
+        if response.status_code != 200:
+            raise ProviderError(f"{self.name}: HTTP {response.status_code}")
+        return response.json()
+
+    def _get(self, http, path: str):
+        kwargs = {"headers": self.headers} if self.headers else {}
+        if self.timeout:
+            kwargs["timeout"] = self.timeout
+        return self._check(http.get(self.url + path, **kwargs))
+
+    def _post(self, http, path: str, payload):
+        kwargs = {"headers": self.headers} if self.headers else {}
+        if self.timeout:
+            kwargs["timeout"] = self.timeout
+        return self._check(http.post(self.url + path, json=payload, **kwargs))
+
+    def balance(self, http, address: str) -> float:
+        raise NotImplementedError
+
+    def activity(self, http, address: str) -> dict:
+        """{"tx_count", "balance"}"""
+        raise NotImplementedError
+
+
+class EsploraProvider(Provider):
+    """Esplora REST API: mempool.space, blockstream.info or a self-hosted electrs."""
+    currency = "btc"
+
+    def activity(self, http, address):
+        data = self._get(http, f"/address/{address}")
+        chain_stats = data.get("chain_stats", {})
+        mempool_stats = data.get("mempool_stats", {})
+        balance_sats = chain_stats.get("funded_txo_sum", 0) - chain_stats.get("spent_txo_sum", 0)
+        return {
+            "tx_count": chain_stats.get("tx_count", 0) + mempool_stats.get("tx_count", 0),
+            "balance": balance_sats / 1e8,
+        }
+
+    def balance(self, http, address):
+        return self.activity(http, address)["balance"]
+
+
+class EthplorerProvider(Provider):
+    currency = "eth"
+
+    def activity(self, http, address):
+        data = self._get(http, f"/getAddressInfo/{address}?apiKey={self.api_key or 'freekey'}")
+        if "error" in data:
+            raise ProviderError(f"{self.name}: {data['error'].get('message', data['error'])}")
+        return {"tx_count": data.get("countTxs", 0), "balance": data.get("ETH", {}).get("balance", 0)}
+
+    def balance(self, http, address):
+        return self.activity(http, address)["balance"]
+
+
+class EthJsonRpcProvider(Provider):
+    """Any Ethereum node or hosted endpoint speaking JSON-RPC (geth, erigon, nethermind...)."""
+    currency = "eth"
+
+    def _rpc(self, http, calls):
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(calls)
+        ]
+        responses = self._post(http, "", payload)
+        if not isinstance(responses, list):
+            raise ProviderError(f"{self.name}: unexpected response")
+        results = {}
+        for response in responses:
+            if "error" in response:
+                raise ProviderError(f"{self.name}: {response['error'].get('message', response['error'])}")
+            results[response.get("id")] = response.get("result")
+        return [int(results[i], 16) for i in range(len(calls))]
+
+    def balance(self, http, address):
+        (wei,) = self._rpc(http, [("eth_getBalance", [address, "latest"])])
+        return wei / 1e18
+
+    def activity(self, http, address):
+        # The nonce only counts sent transactions; received funds show in the balance
+        wei, nonce = self._rpc(http, [
+            ("eth_getBalance", [address, "latest"]),
+            ("eth_getTransactionCount", [address, "latest"]),
+        ])
+        return {"tx_count": nonce, "balance": wei / 1e18}
+
+
+class TronGridProvider(Provider):
+    currency = "tron"
+
+    def __init__(self, url: str, **kwargs):
+        super().__init__(url, **kwargs)
+        if self.api_key:
+            self.headers.setdefault("TRON-PRO-API-KEY", self.api_key)
+
+    def activity(self, http, address):
+        data = self._get(http, f"/v1/accounts/{address}").get("data", [])
+        # A TRON account only exists once it has received something
+        if not data:
+            return {"tx_count": 0, "balance": 0}
+        return {"tx_count": 1, "balance": data[0].get("balance", 0) / 1e6}  # TRX has 6 decimals
+
+    def balance(self, http, address):
+        return self.activity(http, address)["balance"]
+
+
+class TronNodeProvider(TronGridProvider):
+    """java-tron full node HTTP API (/wallet/getaccount)."""
+    def activity(self, http, address):
+        data = self._post(http, "/wallet/getaccount", {"address": address, "visible": True})
+        if not data:
+            return {"tx_count": 0, "balance": 0}
+        return {"tx_count": 1, "balance": data.get("balance", 0) / 1e6}
+
+
+PROVIDER_TYPES = {
+    "esplora": EsploraProvider,
+    "ethplorer": EthplorerProvider,
+    "eth-jsonrpc": EthJsonRpcProvider,
+    "trongrid": TronGridProvider,
+    "tron-node": TronNodeProvider,
+}
+
+
+def build_providers(config: dict = None) -> dict:
+    """{currency: [Provider]} from the "providers" section of config.json over the defaults."""
+    specs = dict(DEFAULT_PROVIDERS)
+    specs.update((config or {}).get("providers", {}))
+    providers = {}
+    for currency, entries in specs.items():
+        providers[currency] = []
+        for entry in entries:
+            options = dict(entry)
+            provider_type = PROVIDER_TYPES.get(options.pop("type", None))
+            if provider_type is None or provider_type.currency != currency:
+                raise ValueError(f"Unsupported {currency} provider type: {entry.get('type')}")
+            providers[currency].append(provider_type(**options))
+    return providers
+
+
+class ProviderRouter:
+    """
+    Routes balance and activity queries of each chain to its providers.
+    Safe to call from many threads at once: concurrent refreshes spread
+    over every provider that has budget left.
+    """
+    def __init__(self, http, providers: dict, max_wait: float = DEFAULT_MAX_WAIT):
+        self.http = http
+        self.providers = providers
+        self.max_wait = max_wait
+
+    def _choose(self, currency: str, tried: set):
+        """
+        (provider with a request slot, None), or (None, seconds until a
+        rate-limit token frees up), or (None, None) when no provider is up.
+        Open circuits are not waited for: callers get None at once.
+        """
+        now = time.monotonic()
+        ready = [
+            provider for provider in self.providers.get(currency, ())
+            if provider not in tried and provider.health.wait_time(now) == 0
+        ]
+        waits = []
+        while ready:
+            # Health-weighted pick, then make sure it has budget
+            provider = random.choices(ready, weights=[p.score() for p in ready])[0]
+            token_wait = provider.bucket.try_take()
+            if token_wait == 0.0:
+                if provider.health.begin(now):
+                    return provider, None
+                # A probe got there first: keep the token for later calls
+                provider.bucket.give_back()
+            ready.remove(provider)
+            if token_wait:
+                waits.append(token_wait)
+        return None, min(waits, default=None)
+
+    def call(self, currency: str, operation: str, address: str):
+        """
+        Result of `operation` ("balance" or "activity") for `address` from
+        the best provider, failing over to the others. None if every
+        provider failed or is tripped, or none had budget within max_wait seconds.
+        """
+        tried = set()
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            provider, wait = self._choose(currency, tried)
+            if provider is None:
+                if wait is None or time.monotonic() + wait > deadline:
+                    return None
+                time.sleep(wait)
+                continue
+            started = time.monotonic()
+            try:
+                result = getattr(provider, operation)(self.http, address)
+            except ProviderError as e:
+                if e.rate_limited:
+                    provider.bucket.slow_down()
+                provider.health.record_failure(e.retry_after, trip=e.rate_limited)
+                tried.add(provider)
+                continue
+            except Exception:
+                provider.health.record_failure()
+                tried.add(provider)
+                continue
+            provider.health.record_success(time.monotonic() - started)
+            provider.bucket.speed_up()
+            return result
+
+    def balance(self, currency: str, address: str):
+        return self.call(currency, "balance", address)
+
+    def activity(self, currency: str, address: str):
+        return self.call(currency, "activity", address)
+
+    def stats(self) -> list[dict]:
+        """State of every provider, for diagnostics."""
+        return [
+            {
+                "currency": currency,
+                "name": provider.name,
+                "state": provider.health.state,
+                "rate": round(provider.bucket.rate, 3),
+                "success_rate": round(provider.health.success_rate, 3),
+                "latency_ms": round(provider.health.latency * 1000, 1),
+                "requests": provider.health.requests,
+                "failures": provider.health.failures,
+            }
+            for currency, providers in self.providers.items()
+            for provider in providers
+        ]
@@ -0,0 +1,121 @@
+"""
+Payment QR rendering for SapphireHood.
+Rendering a styled QR (build, invert, paste the logo, PNG-encode) takes
+hundreds of milliseconds, so finished PNG bytes are kept in an LRU cache
+keyed by URI, style and logo, and the scaled logo has its own cache
+keyed by path, mtime and size. Redrawing the same receive screen is then
+a dictionary hit.
+"""
+
+import importlib.util
+import os
+from io import BytesIO
+
+from sapphire_cache import LRUCache
+from sapphire_startup import lazy_import
+
+qrcode = lazy_import("qrcode")
+qrcode_styledpil = lazy_import("qrcode.image.styledpil")
+qrcode_drawers = lazy_import("qrcode.image.styles.moduledrawers")
+Image = lazy_import("PIL.Image")
+ImageOps = lazy_import("PIL.ImageOps")
+QR_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ("qrcode", "PIL"))
+
+DEFAULT_BOX_SIZE = 10
+DEFAULT_BORDER = 4
+LOGO_PADDING = 10
+URI_SCHEMES = {"eth": "ethereum", "btc": "bitcoin", "tron": "tron"}
+
+png_cache = LRUCache(max_entries=64)
+logo_cache = LRUCache(max_entries=8)
+
+
+def payment_uri(address: str, currency: str = "eth", amount: float = None) -> str:
+    """Payment URI encoded in the QR, e.g. "ethereum:0x...?amount=1.5"."""
+    if address is None:
+        raise ValueError("Address cannot be None")
+    uri = f"{URI_SCHEMES.get(currency, currency)}:{address}"
+    if amount is not None:
+        uri += f"?amount={amount}"
+    return uri
+
+
+def logo_key(logo_path):
+    """(path, mtime, size) of a logo file, or None if there is none."""
+    if not logo_path:
+        return None
+    try:
+        stat = os.stat(logo_path)
+    except OSError:
+        return None
+    return os.path.abspath(logo_path), stat.st_mtime_ns, stat.st_size
+
+
+def scaled_logo(logo_path, logo_size: int):
+    """
+    The logo resized to `logo_size`, on a white square unless it has
+    alpha. Cached until the file changes.
+    """
+    key = logo_key(logo_path)
+    if key is None:
+        return None
+
+    def build():
+        logo = Image.open(logo_path)
+        logo = logo.resize((logo_size, logo_size), Image.Resampling.LANCZOS)
+        # White background for better QR code readability (after inversion)
+        if logo.mode != 'RGBA':
+            background_size = logo_size + LOGO_PADDING
+            background = Image.new('RGB', (background_size, background_size), 'white')
+            offset = (background_size - logo_size) // 2
+            background.paste(logo, (offset, offset))
+            logo = background
+        return logo
+
+    return logo_cache.get_or_create(key + (logo_size,), build)
+
+
+def render_payment_qr(uri: str, logo_path: str = None, box_size: int = DEFAULT_BOX_SIZE,
+                      border: int = DEFAULT_BORDER) -> bytes:
+    """PNG bytes of the styled, inverted payment QR for `uri` (uncached)."""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,  # High correction for logo
+        box_size=box_size,
+        border=border
+    )
+    qr.add_data(uri)
+    qr.make(fit=True)
+
+    img = qr.make_image(
+        image_factory=qrcode_styledpil.StyledPilImage,
+        module_drawer=qrcode_drawers.VerticalBarsDrawer(horizontal_shrink=0.8)
+    )
+    # Инвертируем цвета изображения (черное становится белым и наоборот)
+    img = ImageOps.invert(img.convert('RGB'))
+
+    if logo_path:
+        try:
+            qr_width, qr_height = img.size
+            logo = scaled_logo(logo_path, min(qr_width, qr_height) // 3)  # 33% of size
+            if logo is not None:
+                logo_x = (qr_width - logo.width) // 2
+                logo_y = (qr_height - logo.height) // 2
+                if logo.mode == 'RGBA':
+                    img.paste(logo, (logo_x, logo_y), logo)  # With alpha channel
+                else:
+                    img.paste(logo, (logo_x, logo_y))
+        except Exception as e:
+            print(f"Error adding logo: {e}")
+            # Continue without logo
+
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def payment_qr_png(uri: str, logo_path: str = None, box_size: int = DEFAULT_BOX_SIZE,
+                   border: int = DEFAULT_BORDER) -> bytes:
+    """Cached render_payment_qr; a changed logo file is a different key."""
+    key = (uri, box_size, border, logo_key(logo_path))
+    return png_cache.get_or_create(key, lambda: render_payment_qr(uri, logo_path, box_size, border))
@@ -0,0 +1,228 @@
+"""
+Batch rendering of labelled payment QR codes onto printable sheets.
+Items are rendered in a process pool with the same styling as
+generate_payment_qrcode (sapphire_qr), laid out in a grid and written a
+page at a time, either as a multi-page PDF or as numbered PNG pages.
+Only a bounded window of rendered codes and one page image are held in
+memory, whatever the number of items.
+"""
+
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+import sapphire_qr
+from sapphire_startup import lazy_import
+
+Image = lazy_import("PIL.Image")
+ImageDraw = lazy_import("PIL.ImageDraw")
+ImageFont = lazy_import("PIL.ImageFont")
+
+# A4 at 150 dpi
+PAGE_SIZE = (1240, 1754)
+PAGE_DPI = 150
+PAGE_MARGIN = 60
+DEFAULT_COLUMNS = 3
+DEFAULT_ROWS = 4
+LABEL_HEIGHT = 60
+
+
+def _render_item(item, logo_path):
+    """Worker entry point: PNG bytes of one (address, currency, amount[, label]) item."""
+    address, currency, amount = item[:3]
+    return sapphire_qr.render_payment_qr(sapphire_qr.payment_uri(address, currency, amount), logo_path)
+
+
+def item_label(item) -> list[str]:
+    """Label lines printed under a code."""
+    address, currency, amount = item[:3]
+    lines = [item[3]] if len(item) > 3 and item[3] else []
+    if len(address) > 34:
+        address = f"{address[:16]}…{address[-16:]}"
+    lines.append(address)
+    if amount is not None:
+        lines.append(f"{amount} {currency.upper()}")
+    return lines
+
+
+class PdfStreamWriter:
+    """
+    Minimal PDF writer that appends each page as soon as it is ready.
+    Every page is one Flate-compressed RGB image scaled to the media box.
+    """
+    def __init__(self, path, dpi: int = PAGE_DPI):
+        self.path = Path(path)
+        self.dpi = dpi
+        self._f = open(self.path, 'wb')
+        self._offsets = {}
+        self._pages = []
+        self._next_id = 3  # 1 is the catalog, 2 the page tree, both written on close
+        self._f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write_object(self, object_id: int, body: bytes, stream: bytes = None):
+        self._offsets[object_id] = self._f.tell()
+        self._f.write(f"{object_id} 0 obj\n".encode() + body)
+        if stream is not None:
+            self._f.write(b"\nstream\n" + stream + b"\nendstream")
+        self._f.write(b"\nendobj\n")
+
+    def _allocate(self) -> int:
+        self._next_id += 1
+        return self._next_id - 1
+
+    def add_page(self, image):
+        width, height = image.size
+        width_pt, height_pt = width * 72 / self.dpi, height * 72 / self.dpi
+        image_id, content_id, page_id = self._allocate(), self._allocate(), self._allocate()
+
+        pixels = zlib.compress(image.convert('RGB').tobytes())
+        self._write_object(image_id, (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode /Length {len(pixels)} >>"
+        ).encode(), pixels)
+        content = f"q {width_pt:.2f} 0 0 {height_pt:.2f} 0 0 cm /Im0 Do Q".encode()
+        self._write_object(content_id, f"<< /Length {len(content)} >>".encode(), content)
+        self._write_object(page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width_pt:.2f} {height_pt:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode())
+        self._pages.append(page_id)
+
+    def close(self):
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._pages)
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>".encode())
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref_offset = self._f.tell()
+        self._f.write(f"xref\n0 {self._next_id}\n0000000000 65535 f \n".encode())
+        for object_id in range(1, self._next_id):
+            self._f.write(f"{self._offsets[object_id]:010d} 00000 n \n".encode())
+        self._f.write((
+            f"trailer\n<< /Size {self._next_id} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n"
+        ).encode())
+        self._f.close()
+
+    def abort(self):
+        """Close the file and delete the partial document."""
+        self._f.close()
+        self.path.unlink(missing_ok=True)
+
+
+class PngPageWriter:
+    """Writes pages as <stem>-001.png, <stem>-002.png, ... next to `path`."""
+    def __init__(self, path, dpi: int = PAGE_DPI):
+        self.path = Path(path)
+        self.dpi = dpi
+        self.paths = []
+
+    def add_page(self, image):
+        page_path = self.path.with_name(f"{self.path.stem}-{len(self.paths) + 1:03d}.png")
+        image.save(page_path, format="PNG", dpi=(self.dpi, self.dpi))
+        self.paths.append(page_path)
+
+    def close(self):
+        pass
+
+    def abort(self):
+        """Delete the pages written so far."""
+        for page_path in self.paths:
+            page_path.unlink(missing_ok=True)
+        self.paths = []
+
+
+class SheetLayout:
+    """Grid of labelled cells on a page."""
+    def __init__(self, columns: int = DEFAULT_COLUMNS, rows: int = DEFAULT_ROWS,
+                 page_size=PAGE_SIZE, margin: int = PAGE_MARGIN):
+        self.columns = columns
+        self.rows = rows
+        self.page_size = page_size
+        self.margin = margin
+        self.cell_width = (page_size[0] - 2 * margin) // columns
+        self.cell_height = (page_size[1] - 2 * margin) // rows
+        self.qr_size = min(self.cell_width, self.cell_height - LABEL_HEIGHT) - 20
+        try:
+            self.font = ImageFont.load_default(size=18)
+        except TypeError:
+            # Pillow without FreeType only has the fixed bitmap font
+            self.font = ImageFont.load_default()
+
+    @property
+    def per_page(self) -> int:
+        return self.columns * self.rows
+
+    def new_page(self):
+        return Image.new('RGB', self.page_size, 'white')
+
+    def place(self, page, slot: int, png: bytes, label_lines):
+        column, row = slot % self.columns, slot // self.columns
+        left = self.margin + column * self.cell_width
+        top = self.margin + row * self.cell_height
+        with Image.open(BytesIO(png)) as qr:
+            qr = qr.convert('RGB').resize((self.qr_size, self.qr_size), Image.Resampling.LANCZOS)
+        page.paste(qr, (left + (self.cell_width - self.qr_size) // 2, top))
+        draw = ImageDraw.Draw(page)
+        y = top + self.qr_size + 6
+        for line in label_lines:
+            text_width = draw.textlength(line, font=self.font)
+            draw.text((left + (self.cell_width - text_width) / 2, y), line, fill='black', font=self.font)
+            y += 20
+
+
+def detect_format(path) -> str:
+    return "png" if Path(path).suffix.lower() == ".png" else "pdf"
+
+
+def render_sheets(items, output_path, file_format: str = None, logo_path: str = None,
+                  layout: SheetLayout = None, max_workers: int = None, progress=None) -> list:
+    """
+    Render `items` ((address, currency, amount) tuples, optionally with a
+    fourth label element) onto sheets at `output_path`.
+    Codes render in worker processes; pages are written in item order as
+    soon as they fill up. `progress(done, total)` follows rendered codes.
+    Returns the written file paths.
+    """
+    items = list(items)
+    layout = layout or SheetLayout()
+    file_format = file_format or detect_format(output_path)
+    writer = PngPageWriter(output_path) if file_format == "png" else PdfStreamWriter(output_path)
+    workers = max_workers or os.cpu_count() or 1
+    # Enough look-ahead to keep every worker busy while a page is composed
+    max_in_flight = max(layout.per_page, workers * 4)
+
+    page, slot, done = None, 0, 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            queued = iter(items)
+            for item in queued:
+                pending.append((item, executor.submit(_render_item, item, logo_path)))
+                if len(pending) >= max_in_flight:
+                    break
+            while pending:
+                item, future = pending.popleft()
+                png = future.result()
+                next_item = next(queued, None)
+                if next_item is not None:
+                    pending.append((next_item, executor.submit(_render_item, next_item, logo_path)))
+
+                if page is None:
+                    page = layout.new_page()
+                layout.place(page, slot, png, item_label(item))
+                slot += 1
+                done += 1
+                if slot == layout.per_page:
+                    writer.add_page(page)
+                    page, slot = None, 0
+                if progress:
+                    progress(done, len(items))
+        if page is not None:
+            writer.add_page(page)
+    except BaseException:
+        # close() would fail on a half-written page and hide the error
+        writer.abort()
+        raise
+    writer.close()
+    return writer.paths if file_format == "png" else [writer.path]
@@ -0,0 +1,65 @@
+"""
+Re-encryption of wallet records under a new data key, for
+SapphireHood.change_password. Runs in worker processes: each worker
+holds the new key and the old ones, decrypts one record at a time and
+writes it back atomically, so no more than one plaintext per worker is
+in memory. Records already under the new key are left alone, which
+makes an interrupted run safe to repeat.
+"""
+
+import json
+import os
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+from sapphire_manifest import wallet_metadata
+
+_new_fernet = None
+_old_fernet = None
+
+
+def init_worker(new_key: bytes, old_keys: list):
+    global _new_fernet, _old_fernet
+    _new_fernet = Fernet(new_key)
+    _old_fernet = MultiFernet([Fernet(key) for key in old_keys])
+
+
+def reencrypt_token(token: bytes):
+    """(new token or None if already current, plaintext)."""
+    try:
+        return None, _new_fernet.decrypt(token)
+    except InvalidToken:
+        plaintext = _old_fernet.decrypt(token)
+        return _new_fernet.encrypt(plaintext), plaintext
+
+
+def reencrypt_file(path: str):
+    """Rotate one encrypted file in place. Returns (path, error or None)."""
+    try:
+        with open(path, 'rb') as f:
+            token, _ = reencrypt_token(f.read())
+        if token is not None:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(token)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.name != 'nt':
+                os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, path)
+        return path, None
+    except Exception as e:
+        return path, str(e) or type(e).__name__
+
+
+def reencrypt_record(item):
+    """
+    Rotate one SQLite vault record given as (file_id, token).
+    Returns (file_id, new token or None, metadata for the blind indexes, error).
+    """
+    file_id, token = item
+    try:
+        new_token, plaintext = reencrypt_token(bytes(token))
+        return file_id, new_token, wallet_metadata(json.loads(plaintext)), None
+    except Exception as e:
+        return file_id, None, None, str(e) or type(e).__name__
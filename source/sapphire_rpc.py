@@ -0,0 +1,511 @@
+"""
+Local JSON-RPC 2.0 service over one unlocked SapphireHood, so payout
+scripts and other processes on the box share a single unlock, one set
+of keep-alive HTTP sessions and the balance and QR caches.
+
+    python sapphire_rpc.py                       # Unix socket ~/.sapphire.data/rpc.sock
+    python sapphire_rpc.py --port 8765           # 127.0.0.1:8765, token in ~/.sapphire.data/rpc.token
+
+Framing is one JSON message per line. A connection may pipeline up to
+MAX_IN_FLIGHT requests; responses come back as they finish, matched by
+"id". A JSON array is a batch and gets one array back. Backend calls run
+in a shared thread pool; calls that write to the vault are serialized.
+
+The Unix socket is owner-only. Over TCP the first message on every
+connection must be {"method": "rpc.auth", "params": [token]}. The token
+file is owner-only too. Private keys never leave the service; wallets
+can sign messages through "wallet.sign_message".
+
+Methods:
+    status()
+    wallets.list(currency=None)
+    wallets.create(currency, name)
+    wallets.create_bulk(currency, count, name_prefix)
+    balance.get(address, currency="eth")           cached, refreshed in the background
+    balance.refresh(wallets=None, currency=None)   [[address, currency], ...] or every wallet;
+                                                   [{address, currency, balance}, ...]
+    qr.payment(address, currency="eth", amount=None)   base64 PNG
+    address.validate(addresses, currency)
+    wallet.sign_message(file_id, message)
+"""
+
+import argparse
+import asyncio
+import base64
+import hmac
+import inspect
+import ipaddress
+import itertools
+import json
+import os
+import secrets
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import sapphire_qr
+
+SOCKET_NAME = "rpc.sock"
+TOKEN_NAME = "rpc.token"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 16
+MAX_IN_FLIGHT = 64
+MAX_BATCH = 1000
+MAX_LINE = 4 * 1024 * 1024
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+SERVER_ERROR = -32000
+UNAUTHORIZED = -32001
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def error_response(request_id, code: int, message: str) -> dict:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+def _encode(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode('utf-8') + b"\n"
+
+
+class RpcServer:
+    """JSON-RPC front end of `hood` (already unlocked)."""
+    def __init__(self, hood, token: str = None, max_workers: int = DEFAULT_WORKERS,
+                 max_in_flight: int = MAX_IN_FLIGHT):
+        self.hood = hood
+        self.token = token
+        self.max_in_flight = max_in_flight
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rpc")
+        self.started_at = time.monotonic()
+        self.stats = {"connections": 0, "requests": 0, "errors": 0}
+        self._write_lock = threading.Lock()
+        # name -> (handler, writes to the vault)
+        self.methods = {
+            "status": (self.status, False),
+            "wallets.list": (self.list_wallets, False),
+            "wallets.create": (self.create_wallet, True),
+            "wallets.create_bulk": (self.create_wallets, True),
+            "balance.get": (self.get_balance, False),
+            "balance.refresh": (self.refresh_balances, False),
+            "qr.payment": (self.payment_qr, False),
+            "address.validate": (self.validate_addresses, False),
+            "wallet.sign_message": (self.sign_message, False),
+        }
+
+    # Methods; they run in the worker pool
+
+    def status(self):
+        return dict(
+            self.stats,
+            uptime=round(time.monotonic() - self.started_at, 3),
+            qr_cache={"entries": len(sapphire_qr.png_cache), "hits": sapphire_qr.png_cache.hits},
+            providers=self.hood.provider_status(),
+            coalescing=self.hood.coalescing_stats(),
+        )
+
+    def list_wallets(self, currency: str = None):
+        wallets = self.hood.check_wallets()
+        if currency:
+            wallets = [wallet for wallet in wallets if wallet.get("currency", "eth") == currency]
+        return wallets
+
+    def create_wallet(self, currency: str, name: str):
+        create = {
+            "eth": self.hood.create_new_wallet_eth,
+            "btc": self.hood.create_new_wallet_btc,
+            "tron": self.hood.create_new_wallet_tron,
+        }.get(currency)
+        if create is None:
+            raise RpcError(INVALID_PARAMS, f"Unsupported currency: {currency}")
+        success, message, wallet = create(name)
+        if not success:
+            raise RpcError(SERVER_ERROR, message)
+        return {"name": name, "currency": currency, "address": wallet["address"]}
+
+    def create_wallets(self, currency: str, count: int, name_prefix: str):
+        success, message, stats = self.hood.create_wallets_bulk(currency, count, name_prefix)
+        if not success:
+            raise RpcError(SERVER_ERROR, message)
+        return stats
+
+    def get_balance(self, address: str, currency: str = "eth"):
+        getter = {
+            "eth": self.hood.get_eth_balance,
+            "btc": self.hood.get_btc_balance,
+            "tron": self.hood.get_tron_balance,
+        }.get(currency)
+        if getter is None:
+            raise RpcError(INVALID_PARAMS, f"Unsupported currency: {currency}")
+        return getter(address)
+
+    def refresh_balances(self, wallets: list = None, currency: str = None):
+        if wallets is None:
+            wallets = self.list_wallets(currency)
+        else:
+            wallets = [tuple(wallet) for wallet in wallets]
+        balances = self.hood.refresh_balances(wallets)
+        return [
+            {"address": address, "currency": currency, "balance": balance}
+            for (currency, address), balance in balances.items()
+        ]
+
+    def payment_qr(self, address: str, currency: str = "eth", amount: float = None):
+        png = self.hood.generate_payment_qrcode(wallet=address, currency=currency, amount=amount)
+        return {
+            "uri": sapphire_qr.payment_uri(address, currency, amount),
+            "png": base64.b64encode(png.getvalue()).decode('ascii'),
+        }
+
+    def validate_addresses(self, addresses: list, currency: str):
+        return self.hood.validate_addresses(addresses, currency)
+
+    def sign_message(self, file_id: str, message: str):
+        success, text, signature = self.hood.sign_message(file_id, message)
+        if not success:
+            raise RpcError(SERVER_ERROR, text)
+        return {"signature": signature}
+
+    # Protocol
+
+    def _run(self, handler, writes: bool, bound):
+        if writes:
+            with self._write_lock:
+                return handler(*bound.args, **bound.kwargs)
+        return handler(*bound.args, **bound.kwargs)
+
+    async def call(self, message):
+        """Response to one request object, or None for a notification."""
+        response = await self._call(message)
+        is_notification = isinstance(message, dict) and "id" not in message
+        if is_notification and response.get("error", {}).get("code") != INVALID_REQUEST:
+            return None
+        return response
+
+    async def _call(self, message):
+        if not isinstance(message, dict):
+            return error_response(None, INVALID_REQUEST, "Invalid request")
+        request_id = message.get("id")
+        method = message.get("method")
+        if message.get("jsonrpc") != "2.0" or not isinstance(method, str):
+            return error_response(request_id, INVALID_REQUEST, "Invalid request")
+        self.stats["requests"] += 1
+        entry = self.methods.get(method)
+        if entry is None:
+            self.stats["errors"] += 1
+            return error_response(request_id, METHOD_NOT_FOUND, f"Method not found: {method}")
+        handler, writes = entry
+
+        params = message.get("params", [])
+        try:
+            if isinstance(params, dict):
+                bound = inspect.signature(handler).bind(**params)
+            elif isinstance(params, list):
+                bound = inspect.signature(handler).bind(*params)
+            else:
+                raise TypeError("params must be an array or an object")
+        except TypeError as e:
+            self.stats["errors"] += 1
+            return error_response(request_id, INVALID_PARAMS, str(e))
+
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self._run, handler, writes, bound
+            )
+        except RpcError as e:
+            self.stats["errors"] += 1
+            return error_response(request_id, e.code, e.message)
+        except Exception as e:
+            self.stats["errors"] += 1
+            return error_response(request_id, INTERNAL_ERROR, str(e) or type(e).__name__)
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    async def handle_payload(self, raw: bytes):
+        """Response to one line: an object, an array for a batch, or None."""
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return error_response(None, PARSE_ERROR, "Parse error")
+        if not isinstance(message, list):
+            return await self.call(message)
+        if not message or len(message) > MAX_BATCH:
+            return error_response(None, INVALID_REQUEST, f"A batch holds 1 to {MAX_BATCH} requests")
+        responses = await asyncio.gather(*(self.call(item) for item in message))
+        return [response for response in responses if response is not None] or None
+
+    def _authenticate(self, raw: bytes) -> dict:
+        try:
+            message = json.loads(raw)
+            token = message["params"][0] if isinstance(message.get("params"), list) else message["params"]["token"]
+            valid = message.get("method") == "rpc.auth" and hmac.compare_digest(str(token), self.token)
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            return error_response(None, UNAUTHORIZED, "Authenticate first with rpc.auth")
+        if not valid:
+            return error_response(message.get("id"), UNAUTHORIZED, "Invalid token")
+        return {"jsonrpc": "2.0", "id": message.get("id"), "result": True}
+
+    async def handle_connection(self, reader, writer, require_token: bool = False):
+        self.stats["connections"] += 1
+        send_lock = asyncio.Lock()
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+
+        async def send(payload):
+            async with send_lock:
+                writer.write(_encode(payload))
+                await writer.drain()
+
+        async def respond(raw):
+            try:
+                response = await self.handle_payload(raw)
+                if response is not None:
+                    await send(response)
+            except ConnectionError:
+                pass
+            finally:
+                in_flight.release()
+
+        authenticated = not require_token
+        try:
+            while True:
+                try:
+                    raw = await reader.readline()
+                except ValueError:
+                    await send(error_response(None, PARSE_ERROR, f"Message longer than {MAX_LINE} bytes"))
+                    break
+                if not raw:
+                    break
+                if not raw.strip():
+                    continue
+                if not authenticated:
+                    response = self._authenticate(raw)
+                    await send(response)
+                    if "error" in response:
+                        break
+                    authenticated = True
+                    continue
+                # Backpressure: a client cannot queue more than max_in_flight calls
+                await in_flight.acquire()
+                task = asyncio.create_task(respond(raw))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve_unix(self, path):
+        path = Path(path)
+        path.unlink(missing_ok=True)
+        old_umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self.handle_connection, path=str(path), limit=MAX_LINE)
+        finally:
+            os.umask(old_umask)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            path.unlink(missing_ok=True)
+
+    async def serve_tcp(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+        if self.token is None:
+            raise ValueError("A token is required over TCP")
+        server = await asyncio.start_server(
+            lambda reader, writer: self.handle_connection(reader, writer, require_token=True),
+            host=host, port=port, limit=MAX_LINE,
+        )
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.hood.balance_cache.flush()
+        self.hood.http.close()
+
+
+class RpcClient:
+    """
+    Asyncio client with pipelining: any number of calls may be awaited
+    concurrently on one connection.
+        client = await RpcClient.connect(unix_path=...)
+        wallets = await client.call("wallets.list", "eth")
+        balances = await client.batch([("balance.get", [a, "eth"]) for a in addresses])
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._reader_task = asyncio.create_task(self._read_responses())
+
+    @classmethod
+    async def connect(cls, unix_path=None, host: str = "127.0.0.1", port: int = DEFAULT_PORT, token: str = None):
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(str(unix_path), limit=MAX_LINE)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+        client = cls(reader, writer)
+        if token is not None:
+            await client.call("rpc.auth", token)
+        return client
+
+    async def _read_responses(self):
+        try:
+            while True:
+                raw = await self.reader.readline()
+                if not raw:
+                    break
+                payload = json.loads(raw)
+                for response in payload if isinstance(payload, list) else [payload]:
+                    future = self._pending.pop(response.get("id"), None)
+                    if future is None or future.done():
+                        continue
+                    if "error" in response:
+                        future.set_exception(RpcError(response["error"]["code"], response["error"]["message"]))
+                    else:
+                        future.set_result(response.get("result"))
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection closed"))
+            self._pending.clear()
+
+    def _request(self, method: str, params):
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        return {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}, future
+
+    async def call(self, method: str, *params, **named):
+        request, future = self._request(method, named if named else list(params))
+        self.writer.write(_encode(request))
+        await self.writer.drain()
+        return await future
+
+    async def batch(self, calls):
+        """Send (method, params) pairs as one batch; results in order (errors as RpcError)."""
+        requests, futures = zip(*(self._request(method, params) for method, params in calls))
+        self.writer.write(_encode(list(requests)))
+        await self.writer.drain()
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        self._reader_task.cancel()
+
+
+async def serve_until_stopped(serving):
+    """Run a serve_* coroutine until SIGTERM/SIGINT, then let it clean up."""
+    task = asyncio.ensure_future(serving)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, task.cancel)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C still raises KeyboardInterrupt
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def write_token(path) -> str:
+    """Fresh random token, saved owner-only for local clients."""
+    token = secrets.token_urlsafe(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(token)
+    return token
+
+
+def read_token(path=None) -> str:
+    with open(path or Path.home() / ".sapphire.data" / TOKEN_NAME, 'r') as f:
+        return f.read().strip()
+
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sapphire local JSON-RPC service")
+    parser.add_argument("--unix", help=f"Unix socket path (default ~/.sapphire.data/{SOCKET_NAME})")
+    parser.add_argument("--port", type=int, help="serve on TCP instead, token-protected")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP loopback address (default 127.0.0.1)")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="allow a non-loopback --host; the token is then all that guards the vault")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="backend worker threads")
+    parser.add_argument("--password-stdin", action="store_true", help="read the password from the first line of stdin")
+    parser.add_argument("--password-env", default="SAPPHIRE_PASSWORD", help="environment variable with the password")
+    parser.add_argument("--no-agent", action="store_true", help="do not use the CLI session agent's cached key")
+    args = parser.parse_args(argv)
+    if not is_loopback(args.host):
+        if not args.allow_remote:
+            parser.error(f"--host {args.host} is not a loopback address; the service is meant for this machine "
+                         "only (use --allow-remote to override)")
+        print(json.dumps({"warning": f"serving wallet RPC on {args.host}, reachable from the network, "
+                                     "guarded only by the token and without TLS"}), file=sys.stderr)
+    return args
+
+
+def main(argv=None) -> int:
+    import sapphire_cli
+
+    args = parse_args(argv)
+    try:
+        hood = sapphire_cli.open_hood(args)
+    except sapphire_cli.CliError as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        return e.exit_code
+    data_dir = hood.app_data_dir
+    use_tcp = args.port is not None or not hasattr(asyncio, "start_unix_server")
+    token_path = data_dir / TOKEN_NAME
+    server = RpcServer(hood, token=write_token(token_path) if use_tcp else None, max_workers=args.workers)
+    if use_tcp:
+        port = args.port or DEFAULT_PORT
+        print(json.dumps({"listening": f"{args.host}:{port}", "token_file": str(token_path)}), file=sys.stderr)
+        serving = server.serve_tcp(args.host, port)
+    else:
+        path = Path(args.unix) if args.unix else data_dir / SOCKET_NAME
+        print(json.dumps({"listening": str(path)}), file=sys.stderr)
+        serving = server.serve_unix(path)
+    try:
+        asyncio.run(serve_until_stopped(serving))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if use_tcp:
+            token_path.unlink(missing_ok=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Load test for the local JSON-RPC service (sapphire_rpc).
+Opens several connections, keeps `depth` pipelined calls in flight on
+each for the given duration and prints sustained requests per second
+and latency percentiles as JSON.
+
+    python sapphire_rpc.py &
+    python sapphire_rpc_bench.py --method balance.get --params '["0x...", "eth"]'
+    python sapphire_rpc_bench.py --connections 8 --depth 32 --batch 10
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import sapphire_rpc
+
+
+async def _worker(client, method, params, depth, batch, deadline, latencies, counters):
+    async def one():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if batch > 1:
+                    results = await client.batch([(method, params)] * batch)
+                    counters["errors"] += sum(isinstance(result, Exception) for result in results)
+                else:
+                    await client.call(method, *params) if isinstance(params, list) else await client.call(method, **params)
+            except sapphire_rpc.RpcError:
+                counters["errors"] += batch
+            latencies.append(time.perf_counter() - started)
+            counters["requests"] += batch
+
+    await asyncio.gather(*(one() for _ in range(depth)))
+
+
+async def run(args) -> dict:
+    if args.port is not None:
+        token = args.token or sapphire_rpc.read_token()
+        connect = lambda: sapphire_rpc.RpcClient.connect(host=args.host, port=args.port, token=token)
+    else:
+        path = args.unix or Path.home() / ".sapphire.data" / sapphire_rpc.SOCKET_NAME
+        connect = lambda: sapphire_rpc.RpcClient.connect(unix_path=path)
+    clients = [await connect() for _ in range(args.connections)]
+    params = json.loads(args.params)
+
+    # Warm-up: first calls pay for imports, sessions and cold caches
+    await asyncio.gather(*(client.call(args.method, *params) if isinstance(params, list)
+                           else client.call(args.method, **params) for client in clients))
+
+    latencies, counters = [], {"requests": 0, "errors": 0}
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(
+        _worker(client, args.method, params, args.depth, args.batch, deadline, latencies, counters)
+        for client in clients
+    ))
+    elapsed = time.perf_counter() - started
+    for client in clients:
+        await client.close()
+
+    latencies.sort()
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3) if latencies else None
+
+    return {
+        "method": args.method,
+        "connections": args.connections,
+        "depth": args.depth,
+        "batch": args.batch,
+        "seconds": round(elapsed, 3),
+        "requests": counters["requests"],
+        "errors": counters["errors"],
+        "requests_per_second": round(counters["requests"] / elapsed, 1),
+        "latency_ms": {"p50": percentile(0.5), "p90": percentile(0.9), "p99": percentile(0.99)},
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sapphire JSON-RPC load test")
+    parser.add_argument("--unix", help="Unix socket of the service (default ~/.sapphire.data/rpc.sock)")
+    parser.add_argument("--port", type=int, help="use TCP on this port instead")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--token", help="TCP token (default: read ~/.sapphire.data/rpc.token)")
+    parser.add_argument("--method", default="status")
+    parser.add_argument("--params", default="[]", help="JSON array or object")
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=16, help="pipelined calls in flight per connection")
+    parser.add_argument("--batch", type=int, default=1, help="calls per batch message")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    result = asyncio.run(run(parse_args(argv)))
+    print(json.dumps(result))
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+Incremental, content-addressed snapshots of the Sapphire data directory.
+Every file (and, with the SQLite backend, every vault record) is stored
+once by the SHA-256 of its bytes. A snapshot only writes the objects the
+previous snapshots do not have, zlib-compressed into one new pack file,
+plus its own manifest. Files whose size and mtime match the previous
+snapshot are not even read, so a nightly snapshot of a large, mostly
+unchanged vault costs a directory scan and a few kilobytes.
+
+Layout under the snapshot root:
+    packs/<snapshot id>.pack   compressed objects, appended back to back
+    <snapshot id>.snap         Fernet(zlib(JSON manifest))
+A manifest maps each path to {"hash", "size", "mtime_ns", "pack",
+"offset", "length"}. To keep unchanged nights at a few kilobytes, most
+manifests only hold the paths changed or removed since the previous
+snapshot ("base"); every FULL_MANIFEST_EVERY-th one is complete, which
+bounds the chain a restore has to read.
+"""
+
+import hashlib
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = ".snap"
+PACK_SUFFIX = ".pack"
+# Rebuildable or live state that does not belong in a snapshot
+EXCLUDED_DIRS = {"snapshots", "candles"}
+EXCLUDED_FILES = {
+    "balance_cache.bin", ".locked", ".rekey_journal", "rpc.token",
+    "vault.sqlite", "vault.sqlite-wal", "vault.sqlite-shm", "vault.sqlite-journal",
+}
+# Key material: snapshotted for disaster recovery, but an in-place restore
+# must not roll back the password record or drop keys retired since
+KEY_FILES = {".password_hash", ".retired_keys"}
+VAULT_PREFIX = "vault:"
+FULL_MANIFEST_EVERY = 16
+
+
+def iter_source_files(source_dir: Path, relative: str = ""):
+    """Yield (relative posix path, os.DirEntry) of every file to snapshot."""
+    try:
+        entries = list(os.scandir(source_dir / relative if relative else source_dir))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        path = f"{relative}/{entry.name}" if relative else entry.name
+        if entry.is_dir(follow_symlinks=False):
+            if not (not relative and entry.name in EXCLUDED_DIRS):
+                yield from iter_source_files(source_dir, path)
+        elif entry.is_file(follow_symlinks=False):
+            if entry.name not in EXCLUDED_FILES and not entry.name.endswith(".tmp"):
+                yield path, entry
+
+
+def _write_private(path: Path, data: bytes):
+    """Atomic write readable by the owner only."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    if os.name != 'nt':
+        os.chmod(tmp_path, 0o600)
+    os.replace(tmp_path, path)
+
+
+class SnapshotStore:
+    """Snapshots of `source_dir` kept under `root`."""
+    def __init__(self, root, source_dir):
+        self.root = Path(root)
+        self.source_dir = Path(source_dir)
+        self.packs_dir = self.root / "packs"
+
+    def snapshot_ids(self) -> list[str]:
+        """Snapshot ids, oldest first."""
+        if not self.root.exists():
+            return []
+        return sorted(path.stem for path in self.root.glob(f"*{SNAPSHOT_SUFFIX}"))
+
+    def _read_manifest(self, snapshot_id: str, fernet) -> dict:
+        with open(self.root / f"{snapshot_id}{SNAPSHOT_SUFFIX}", 'rb') as f:
+            return json.loads(zlib.decompress(fernet.decrypt(f.read())))
+
+    def load(self, snapshot_id: str, fernet) -> dict:
+        """Manifest of a snapshot with its full "files" map (deltas resolved)."""
+        chain = [self._read_manifest(snapshot_id, fernet)]
+        while chain[-1].get("base"):
+            chain.append(self._read_manifest(chain[-1]["base"], fernet))
+        files = {}
+        for manifest in reversed(chain):
+            for path in manifest.get("removed", ()):
+                files.pop(path, None)
+            files.update(manifest["files"])
+        return dict(chain[0], files=files)
+
+    def create(self, fernet, vault=None) -> dict:
+        """
+        Take a snapshot; `vault` (a SqliteVault) adds its records.
+        Returns {"id", "files", "new_objects", "bytes_written", "seconds"}.
+        """
+        started = time.perf_counter()
+        ids = self.snapshot_ids()
+        parent = self.load(ids[-1], fernet) if ids else None
+        previous = parent["files"] if parent else {}
+        known = {entry["hash"]: entry for entry in previous.values()}
+
+        snapshot_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        pack_name = f"{snapshot_id}{PACK_SUFFIX}"
+        pack_path = self.packs_dir / pack_name
+        self.packs_dir.mkdir(parents=True, exist_ok=True)
+        files, new_objects = {}, 0
+
+        with open(pack_path.with_name(pack_name + ".tmp"), 'wb') as pack:
+            def store(path, data, stat=None):
+                nonlocal new_objects
+                digest = hashlib.sha256(data).hexdigest()
+                location = known.get(digest)
+                if location is None:
+                    compressed = zlib.compress(data)
+                    location = {"pack": pack_name, "offset": pack.tell(), "length": len(compressed)}
+                    pack.write(compressed)
+                    known[digest] = dict(location, hash=digest)
+                    new_objects += 1
+                entry = {"hash": digest, "pack": location["pack"],
+                         "offset": location["offset"], "length": location["length"]}
+                if stat is not None:
+                    entry["size"], entry["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+                files[path] = entry
+
+            for path, dir_entry in iter_source_files(self.source_dir):
+                stat = dir_entry.stat(follow_symlinks=False)
+                cached = previous.get(path)
+                if cached and cached.get("size") == stat.st_size and cached.get("mtime_ns") == stat.st_mtime_ns:
+                    files[path] = cached
+                    continue
+                with open(dir_entry.path, 'rb') as f:
+                    store(path, f.read(), stat)
+            if vault is not None:
+                for file_id, data in vault.iter_records():
+                    store(file_id, bytes(data))
+            pack_size = pack.tell()
+            pack.flush()
+            os.fsync(pack.fileno())
+
+        if new_objects:
+            os.replace(pack_path.with_name(pack_name + ".tmp"), pack_path)
+            if os.name != 'nt':
+                os.chmod(pack_path, 0o600)
+        else:
+            os.remove(pack_path.with_name(pack_name + ".tmp"))
+
+        manifest = {
+            "version": SNAPSHOT_VERSION,
+            "id": snapshot_id,
+            "created_at": datetime.now().isoformat(),
+        }
+        depth = parent.get("depth", 0) + 1 if parent else 0
+        if parent is None or depth >= FULL_MANIFEST_EVERY:
+            manifest.update(base=None, depth=0, files=files)
+        else:
+            manifest.update(
+                base=parent["id"], depth=depth,
+                files={path: entry for path, entry in files.items() if previous.get(path) != entry},
+                removed=[path for path in previous if path not in files],
+            )
+        encrypted = fernet.encrypt(zlib.compress(json.dumps(manifest, separators=(",", ":")).encode()))
+        # The manifest is the commit point: without it the new pack is just unused bytes
+        _write_private(self.root / f"{snapshot_id}{SNAPSHOT_SUFFIX}", encrypted)
+        return {
+            "id": snapshot_id,
+            "files": len(files),
+            "new_objects": new_objects,
+            "bytes_written": pack_size + len(encrypted),
+            "seconds": time.perf_counter() - started,
+        }
+
+    def read_objects(self, entries):
+        """Yield (path, bytes) for manifest entries, checking every hash."""
+        handles = {}
+        try:
+            for path, entry in entries:
+                pack = handles.get(entry["pack"])
+                if pack is None:
+                    pack = handles[entry["pack"]] = open(self.packs_dir / entry["pack"], 'rb')
+                pack.seek(entry["offset"])
+                data = zlib.decompress(pack.read(entry["length"]))
+                if hashlib.sha256(data).hexdigest() != entry["hash"]:
+                    raise ValueError(f"Snapshot object for {path} is corrupted")
+                yield path, data
+        finally:
+            for pack in handles.values():
+                pack.close()
+
+    def restore(self, snapshot_id: str, fernet, target_dir=None, keep=KEY_FILES) -> dict:
+        """
+        Write the files of a snapshot into `target_dir` (the source dir by
+        default) and remove snapshotted kinds of files that it does not
+        contain. Paths in `keep` are neither written nor removed; pass an
+        empty set to recover the key files into a fresh directory.
+        Vault records are returned, not written:
+            {"files": count, "removed": count, "records": [encrypted record bytes]}
+        """
+        target_dir = Path(target_dir) if target_dir else self.source_dir
+        files = self.load(snapshot_id, fernet)["files"]
+        file_entries = [
+            (path, entry) for path, entry in files.items()
+            if not path.startswith(VAULT_PREFIX) and path not in keep
+        ]
+        record_entries = [(path, entry) for path, entry in files.items() if path.startswith(VAULT_PREFIX)]
+
+        written = 0
+        for path, data in self.read_objects(file_entries):
+            destination = target_dir / path
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            _write_private(destination, data)
+            written += 1
+        removed = 0
+        for path, dir_entry in list(iter_source_files(target_dir)):
+            if path not in files and path not in keep:
+                os.remove(dir_entry.path)
+                removed += 1
+        records = [data for _, data in self.read_objects(record_entries)]
+        return {"files": written, "removed": removed, "records": records}
+
+    def prune(self, fernet, keep: int) -> int:
+        """
+        Delete all but the newest `keep` snapshots (and the manifests they
+        are built on) and the packs none of them use. Returns how many went.
+        """
+        ids = self.snapshot_ids()
+        kept = ids[-keep:] if keep > 0 else []
+        # Deltas need their bases: keep every manifest a kept snapshot is built on
+        needed = set()
+        for snapshot_id in kept:
+            while snapshot_id and snapshot_id not in needed:
+                needed.add(snapshot_id)
+                snapshot_id = self._read_manifest(snapshot_id, fernet).get("base")
+        doomed = [snapshot_id for snapshot_id in ids if snapshot_id not in needed]
+        for snapshot_id in doomed:
+            os.remove(self.root / f"{snapshot_id}{SNAPSHOT_SUFFIX}")
+        # Bases stay listed and restorable, so their packs stay too
+        used = {
+            entry["pack"]
+            for snapshot_id in needed
+            for entry in self.load(snapshot_id, fernet)["files"].values()
+        }
+        if self.packs_dir.exists():
+            for pack_path in self.packs_dir.glob(f"*{PACK_SUFFIX}"):
+                if pack_path.name not in used:
+                    pack_path.unlink()
+        return len(doomed)
@@ -0,0 +1,151 @@
+"""
+Startup helpers for Sapphire.
+- lazy_import: defers a heavy dependency until its first attribute access
+- StartupProfiler: built-in cold-start report (import times, similar to
+  `python -X importtime`, plus named milestones), enabled with
+  SAPPHIRE_STARTUP_REPORT=1
+"""
+
+import importlib
+import os
+import sys
+import threading
+import time
+
+# Target for "login window on screen", in seconds
+STARTUP_BUDGET_SECONDS = 1.0
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access."""
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Return a proxy for module `name` that is imported on first use."""
+    return LazyModule(name)
+
+
+class _TimedLoader:
+    """Wraps a loader to time module creation and execution; hands the module back its real loader."""
+    def __init__(self, loader, profiler, name):
+        self.loader = loader
+        self.profiler = profiler
+        self.name = name
+        self.started = None
+
+    def create_module(self, spec):
+        # Extension modules (e.g. PyQt6) do most of their work here
+        self.profiler._enter()
+        self.started = time.perf_counter()
+        try:
+            return self.loader.create_module(spec)
+        except BaseException:
+            self.profiler._leave(self.name, time.perf_counter() - self.started)
+            raise
+
+    def exec_module(self, module):
+        module.__loader__ = self.loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self.loader
+        if self.started is None:
+            self.profiler._enter()
+            self.started = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.profiler._leave(self.name, time.perf_counter() - self.started)
+
+    def __getattr__(self, attr):
+        return getattr(self.loader, attr)
+
+
+class _TimingFinder:
+    """Meta path finder that delegates to the real finders and wraps their loaders."""
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self.profiler, name)
+                return spec
+        return None
+
+
+class StartupProfiler:
+    """
+    Collects import times and startup milestones.
+    Does nothing unless enabled.
+    """
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.started_at = time.perf_counter()
+        self.marks = []
+        self.imports = []  # (name, self_seconds, cumulative_seconds)
+        self._children = [0.0]
+        self._finder = None
+        if enabled:
+            self._finder = _TimingFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    @classmethod
+    def from_env(cls):
+        return cls(enabled=os.environ.get("SAPPHIRE_STARTUP_REPORT") == "1")
+
+    def _enter(self):
+        self._children.append(0.0)
+
+    def _leave(self, name, elapsed):
+        children = self._children.pop()
+        self._children[-1] += elapsed
+        self.imports.append((name, elapsed - children, elapsed))
+
+    def mark(self, label: str):
+        """Record a milestone, measured from when the profiler was created."""
+        if self.enabled:
+            self.marks.append((label, time.perf_counter() - self.started_at))
+
+    def stop(self):
+        """Stop timing imports."""
+        if self._finder is not None and self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+        self._finder = None
+
+    def report(self, stream=None, top: int = 15, budget: float = STARTUP_BUDGET_SECONDS):
+        """Print the slowest imports and the milestones; warn when over budget."""
+        if not self.enabled:
+            return
+        stream = stream or sys.stderr
+        print("Sapphire startup report", file=stream)
+        print(f"{'self [ms]':>10} | {'cumulative [ms]':>15} | module", file=stream)
+        for name, self_time, cumulative in sorted(self.imports, key=lambda i: i[2], reverse=True)[:top]:
+            print(f"{self_time * 1000:10.1f} | {cumulative * 1000:15.1f} | {name}", file=stream)
+        for label, elapsed in self.marks:
+            print(f"{elapsed * 1000:10.1f} ms  {label}", file=stream)
+        if self.marks and self.marks[-1][1] > budget:
+            print(f"WARNING: startup took {self.marks[-1][1]:.2f}s, budget is {budget:.2f}s", file=stream)
+
+
+startup_profiler = StartupProfiler.from_env()
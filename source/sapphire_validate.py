@@ -0,0 +1,180 @@
+"""
+Address validation with full checksum verification.
+    BTC   Base58Check P2PKH/P2SH, Bech32 (witness v0) and Bech32m (v1+)
+    ETH   0x + 40 hex digits, EIP-55 checksum when mixed case
+    TRON  Base58Check with the 0x41 prefix
+Character tables and checksum constants are built once at import, and
+validate_many binds the per-currency validator once for a whole batch,
+so large imports pay only for the checksums themselves.
+"""
+
+import hashlib
+
+import sapphire_keygen
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+BECH32_CONST = 1
+BECH32M_CONST = 0x2BC830A3
+BECH32_GENERATOR = (0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3)
+
+BTC_BASE58_VERSIONS = (0x00, 0x05)  # P2PKH, P2SH
+BTC_BECH32_HRP = "bc"
+TRON_VERSION = 0x41
+
+# ord(char) -> digit value, -1 outside the alphabet
+_BASE58_VALUES = [-1] * 128
+for _i, _c in enumerate(BASE58_ALPHABET):
+    _BASE58_VALUES[ord(_c)] = _i
+_BECH32_VALUES = [-1] * 128
+for _i, _c in enumerate(BECH32_CHARSET):
+    _BECH32_VALUES[ord(_c)] = _i
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+
+
+def base58check_decode(text: str):
+    """Payload (version byte included) of a Base58Check string, or None if invalid."""
+    number = 0
+    for char in text:
+        code = ord(char)
+        value = _BASE58_VALUES[code] if code < 128 else -1
+        if value < 0:
+            return None
+        number = number * 58 + value
+    leading_zeros = len(text) - len(text.lstrip("1"))
+    body = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    raw = b"\x00" * leading_zeros + body
+    if len(raw) < 5:
+        return None
+    payload, checksum = raw[:-4], raw[-4:]
+    if hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] != checksum:
+        return None
+    return payload
+
+
+def _bech32_polymod(values) -> int:
+    checksum = 1
+    for value in values:
+        top = checksum >> 25
+        checksum = (checksum & 0x1FFFFFF) << 5 ^ value
+        for i in range(5):
+            if (top >> i) & 1:
+                checksum ^= BECH32_GENERATOR[i]
+    return checksum
+
+
+def bech32_decode(text: str):
+    """(hrp, data values, checksum constant) of a Bech32/Bech32m string, or None."""
+    if len(text) > 90 or (text.lower() != text and text.upper() != text):
+        return None
+    text = text.lower()
+    separator = text.rfind("1")
+    if separator < 1 or separator + 7 > len(text):
+        return None
+    hrp = text[:separator]
+    if any(not 33 <= ord(char) <= 126 for char in hrp):
+        return None
+    data = []
+    for char in text[separator + 1:]:
+        code = ord(char)
+        value = _BECH32_VALUES[code] if code < 128 else -1
+        if value < 0:
+            return None
+        data.append(value)
+    expanded = [ord(char) >> 5 for char in hrp] + [0] + [ord(char) & 31 for char in hrp]
+    const = _bech32_polymod(expanded + data)
+    if const not in (BECH32_CONST, BECH32M_CONST):
+        return None
+    return hrp, data[:-6], const
+
+
+def _convert_bits(values, from_bits: int, to_bits: int):
+    """Regroup 5-bit words into bytes without padding (BIP173), or None."""
+    accumulator = bits = 0
+    result = []
+    max_value = (1 << to_bits) - 1
+    for value in values:
+        accumulator = (accumulator << from_bits) | value
+        bits += from_bits
+        while bits >= to_bits:
+            bits -= to_bits
+            result.append((accumulator >> bits) & max_value)
+    if bits >= from_bits or (accumulator << (to_bits - bits)) & max_value:
+        return None
+    return bytes(result)
+
+
+def is_valid_segwit_address(address: str, hrp: str = BTC_BECH32_HRP) -> bool:
+    """BIP173/BIP350: v0 must use Bech32 with a 20 or 32 byte program, v1+ Bech32m."""
+    decoded = bech32_decode(address)
+    if decoded is None or decoded[0] != hrp or not decoded[1]:
+        return False
+    _, data, const = decoded
+    version = data[0]
+    if version > 16:
+        return False
+    program = _convert_bits(data[1:], 5, 8)
+    if program is None or not 2 <= len(program) <= 40:
+        return False
+    if version == 0:
+        return const == BECH32_CONST and len(program) in (20, 32)
+    return const == BECH32M_CONST
+
+
+def is_valid_btc_address(address) -> bool:
+    if not isinstance(address, str) or not address:
+        return False
+    if address[:3].lower() == BTC_BECH32_HRP + "1":
+        return is_valid_segwit_address(address)
+    payload = base58check_decode(address)
+    return payload is not None and len(payload) == 21 and payload[0] in BTC_BASE58_VERSIONS
+
+
+def is_valid_tron_address(address) -> bool:
+    if not isinstance(address, str) or len(address) != 34:
+        return False
+    payload = base58check_decode(address)
+    return payload is not None and len(payload) == 21 and payload[0] == TRON_VERSION
+
+
+def is_valid_eth_address(address) -> bool:
+    """All-lowercase and all-uppercase addresses carry no checksum; mixed case must match EIP-55."""
+    if not isinstance(address, str) or len(address) != 42 or not address.startswith("0x"):
+        return False
+    digits = address[2:]
+    if not _HEX_DIGITS.issuperset(digits):
+        return False
+    if digits.islower() or digits.isupper() or digits.isdigit():
+        return True
+    return sapphire_keygen.checksum_address(bytes.fromhex(digits)) == address
+
+
+VALIDATORS = {
+    "btc": is_valid_btc_address,
+    "eth": is_valid_eth_address,
+    "tron": is_valid_tron_address,
+}
+
+
+def validate_address(address, currency: str) -> bool:
+    validator = VALIDATORS.get(currency)
+    if validator is None:
+        raise ValueError(f"Unsupported currency: {currency}")
+    return validator(address)
+
+
+def iter_validate(addresses, currency: str):
+    """
+    Yield a bool per address of any iterable, e.g. a file being streamed.
+    Surrounding whitespace such as line endings is ignored.
+    """
+    validator = VALIDATORS.get(currency)
+    if validator is None:
+        raise ValueError(f"Unsupported currency: {currency}")
+    for address in addresses:
+        yield validator(address.strip() if isinstance(address, str) else address)
+
+
+def validate_many(addresses, currency: str) -> list[bool]:
+    """Validate a batch of addresses; returns one bool per address, in order."""
+    return list(iter_validate(addresses, currency))
@@ -0,0 +1,231 @@
+"""
+Single-file SQLite vault backend for SapphireHood.
+An optional alternative to one Fernet file per wallet: every wallet is a
+row holding its own Fernet token, lookups by name, address and currency
+go through indexes, and batch writes are one transaction (one fsync).
+
+Names and addresses are not stored in clear: their index columns hold a
+keyed HMAC (blind index) and the listing metadata is a separate small
+Fernet token, so the database file reveals no more than the wallet files.
+
+Migration from the directory layout:
+    python sapphire_vault.py migrate
+"""
+
+import hashlib
+import hmac
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+from sapphire_manifest import wallet_metadata
+
+RECORD_PREFIX = "vault:"
+# Bound parameters per IN (...) lookup, under SQLite's historical limit of 999
+LOOKUP_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS wallets (
+    id INTEGER PRIMARY KEY,
+    currency TEXT NOT NULL,
+    name_index BLOB NOT NULL,
+    address_index BLOB NOT NULL,
+    meta BLOB NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS wallets_currency ON wallets (currency);
+CREATE INDEX IF NOT EXISTS wallets_name ON wallets (name_index);
+CREATE INDEX IF NOT EXISTS wallets_address ON wallets (address_index);
+"""
+
+
+def record_id(file_id: str) -> int:
+    """Row id from a "vault:<id>" file id."""
+    return int(file_id[len(RECORD_PREFIX):])
+
+
+class SqliteVault:
+    """
+    Wallet records in one SQLite database.
+    `fernet` encrypts the records, `index_key` keys the blind indexes.
+    """
+    def __init__(self, path, fernet, index_key: bytes):
+        self.path = Path(path)
+        self.fernet = fernet
+        self.index_key = index_key
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _blind_index(self, value: str) -> bytes:
+        return hmac.new(self.index_key, value.encode('utf-8'), hashlib.sha256).digest()[:16]
+
+    def _row(self, wallet_data: dict, data: bytes = None):
+        metadata = wallet_metadata(wallet_data)
+        if data is None:
+            data = self.fernet.encrypt(json.dumps(wallet_data).encode())
+        return (
+            metadata["currency"],
+            self._blind_index(metadata["name"] or ""),
+            self._blind_index(metadata["address"] or ""),
+            self.fernet.encrypt(json.dumps(metadata).encode()),
+            data,
+        )
+
+    def put_many(self, wallets, encrypted: list = None, replace_all: bool = False) -> list[str]:
+        """
+        Insert wallets in a single transaction.
+        `encrypted` may hold the already encrypted records, in the same order.
+        `replace_all` deletes every existing record in the same transaction.
+        Returns their file ids.
+        """
+        wallets = list(wallets)
+        rows = [
+            self._row(wallet_data, encrypted[i] if encrypted else None)
+            for i, wallet_data in enumerate(wallets)
+        ]
+        ids = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if replace_all:
+                    self._conn.execute("DELETE FROM wallets")
+                for row in rows:
+                    cursor = self._conn.execute(
+                        "INSERT INTO wallets (currency, name_index, address_index, meta, data) "
+                        "VALUES (?, ?, ?, ?, ?)", row
+                    )
+                    ids.append(f"{RECORD_PREFIX}{cursor.lastrowid}")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return ids
+
+    def update_many(self, records):
+        """
+        Rewrite records in a single transaction; `records` holds
+        (file_id, wallet_data, encrypted data) with the current keys.
+        """
+        rows = [self._row(wallet_data, data) + (record_id(file_id),) for file_id, wallet_data, data in records]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "UPDATE wallets SET currency = ?, name_index = ?, address_index = ?, meta = ?, data = ? "
+                    "WHERE id = ?", rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def put(self, wallet_data: dict) -> str:
+        return self.put_many([wallet_data])[0]
+
+    def get(self, file_id: str) -> dict:
+        """Decrypt one wallet record."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM wallets WHERE id = ?", (record_id(file_id),)
+            ).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"Wallet record {file_id} not found")
+        return json.loads(self.fernet.decrypt(row[0]).decode())
+
+    def find(self, name: str = None, address: str = None, currency: str = None) -> list[dict]:
+        """Metadata of the wallets matching every given criterion (indexed lookups)."""
+        clauses, params = [], []
+        if name is not None:
+            clauses.append("name_index = ?")
+            params.append(self._blind_index(name))
+        if address is not None:
+            clauses.append("address_index = ?")
+            params.append(self._blind_index(address))
+        if currency is not None:
+            clauses.append("currency = ?")
+            params.append(currency)
+        query = "SELECT id, meta FROM wallets"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY id", params).fetchall()
+        return [
+            dict(json.loads(self.fernet.decrypt(meta).decode()), file_id=f"{RECORD_PREFIX}{row_id}")
+            for row_id, meta in rows
+        ]
+
+    def existing_addresses(self, currency: str, addresses) -> set:
+        """The given addresses that `currency` wallets already use (blind index lookups)."""
+        by_index = {self._blind_index(address): address for address in addresses}
+        indexes = list(by_index)
+        found = set()
+        with self._lock:
+            for start in range(0, len(indexes), LOOKUP_CHUNK):
+                chunk = indexes[start:start + LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    "SELECT address_index FROM wallets WHERE currency = ? AND address_index IN "
+                    f"({', '.join('?' * len(chunk))})", [currency, *chunk]
+                ).fetchall()
+                found.update(by_index[row[0]] for row in rows)
+        return found
+
+    def entries(self) -> list[dict]:
+        """Metadata of every wallet."""
+        return self.find()
+
+    def delete(self, file_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM wallets WHERE id = ?", (record_id(file_id),))
+        return cursor.rowcount > 0
+
+    def iter_records(self, batch_size: int = 500):
+        """Yield (file_id, encrypted_data) for every record, a batch at a time."""
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, data FROM wallets WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row_id, data in rows:
+                yield f"{RECORD_PREFIX}{row_id}", data
+            last_id = rows[-1][0]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM wallets").fetchone()[0]
+
+
+def main():
+    """Migration tool: copy the directory layout into the SQLite vault."""
+    import argparse
+    import getpass
+    from sapphire_hood import SapphireHood
+
+    parser = argparse.ArgumentParser(description="Sapphire vault tools")
+    parser.add_argument("command", choices=["migrate"])
+    args = parser.parse_args()
+
+    hood = SapphireHood()
+    success, message = hood.initialize(getpass.getpass("Password: "))
+    if not success:
+        print(f"❌ {message}")
+        return 1
+    if args.command == "migrate":
+        success, message = hood.migrate_to_sqlite()
+        print(("✅ " if success else "❌ ") + message)
+        return 0 if success else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
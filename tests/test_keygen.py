@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "source"))
+
+import coincurve
+import pytest
+
+import sapphire_keygen
+
+# Order n of the secp256k1 base point, SEC 2 v2 section 2.4.1
+SEC2_SECP256K1_ORDER = int(
+    "FFFFFFFF FFFFFFFF FFFFFFFF FFFFFFFE BAAEDCE6 AF48A03B BFD25E8C D0364141".replace(" ", ""), 16
+)
+
+
+def test_order_matches_sec2():
+    assert sapphire_keygen.SECP256K1_ORDER == SEC2_SECP256K1_ORDER
+    assert sapphire_keygen.SECP256K1_ORDER.bit_length() == 256
+
+
+def test_order_is_libsecp256k1_limit():
+    largest = (sapphire_keygen.SECP256K1_ORDER - 1).to_bytes(32, "big")
+    coincurve.PrivateKey(largest)
+    with pytest.raises(ValueError):
+        coincurve.PrivateKey(sapphire_keygen.SECP256K1_ORDER.to_bytes(32, "big"))
+
+
+def test_random_keys_use_full_range(monkeypatch):
+    # A 2^252 bound would reject this key
+    key = (2 ** 255).to_bytes(32, "big")
+    monkeypatch.setattr(sapphire_keygen.os, "urandom", lambda size: key)
+    assert sapphire_keygen.random_private_key() == key
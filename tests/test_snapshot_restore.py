@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "source"))
+
+import pytest
+from cryptography.fernet import Fernet
+
+import sapphire_hood
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    return tmp_path
+
+
+def test_restore_after_password_change_keeps_new_password(home):
+    hood = sapphire_hood.SapphireHood()
+    assert hood.setup_new_installation("password1", "password1")[0]
+    for i in range(3):
+        assert hood.create_new_wallet_eth(f"before-{i}")[0]
+    assert hood.create_snapshot()[0]
+    snapshot_id = hood.list_snapshots()[-1]
+    assert hood.change_password("password1", "password2", "password2")[0]
+
+    hood = sapphire_hood.SapphireHood()
+    assert hood.initialize("password2")[0]
+    assert hood.restore_snapshot(snapshot_id)[0]
+    assert hood.create_new_wallet_eth("after-restore")[0]
+
+    assert not sapphire_hood.SapphireHood().initialize("password1")[0]
+    hood = sapphire_hood.SapphireHood()
+    assert hood.initialize("password2")[0]
+    errors = [file_id for file_id, _, error in hood.scan_wallets() if error is not None]
+    assert errors == []
+    names = sorted(wallet["name"] for wallet in hood.check_wallets())
+    assert names == ["after-restore", "before-0", "before-1", "before-2"]
+
+
+@pytest.mark.parametrize("backend", ["files", "sqlite"])
+def test_restore_after_rotation_moves_records_to_current_key(home, backend):
+    hood = sapphire_hood.SapphireHood()
+    assert hood.setup_new_installation("password1", "password1")[0]
+    for i in range(3):
+        assert hood.create_new_wallet_btc(f"before-{i}")[0]
+    if backend == "sqlite":
+        assert hood.migrate_to_sqlite()[0]
+    assert hood.create_snapshot()[0]
+    snapshot_id = hood.list_snapshots()[-1]
+    old_key = hood.data_key
+    assert hood.change_password("password1", "password2", "password2")[0]
+    assert hood.data_key != old_key
+
+    assert hood.restore_snapshot(snapshot_id)[0]
+    current = Fernet(hood.data_key)
+    if backend == "sqlite":
+        tokens = [data for _, data in hood.vault.iter_records()]
+    else:
+        tokens = [path.read_bytes() for directory in hood.wallet_dirs.values() for path in directory.glob("*.json")]
+        tokens.append(hood.manifest_file.read_bytes())
+    assert len(tokens) >= 3
+    for token in tokens:
+        current.decrypt(token)
+
+    hood = sapphire_hood.SapphireHood()
+    assert hood.initialize("password2")[0]
+    assert sorted(wallet["name"] for wallet in hood.check_wallets()) == ["before-0", "before-1", "before-2"]